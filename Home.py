@@ -1,8 +1,8 @@
 import streamlit as st
-import requests
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from src.utils.api_client import ApiError, get_json
+from src.utils.paged_table import paged_table
 
 st.set_page_config(page_title="EzRollout - Overview", layout="wide")
 
@@ -13,49 +13,11 @@ st.write("### Latest Applications")
 
 def get_latest_applications():
     try:
-        response = requests.get("http://localhost:8000/api/device-status")
-        if response.status_code == 200:
-            devices = response.json()
-            if isinstance(devices, list) and devices:
-                # Samla alla unika applikationer och deras installationsstatus
-                all_apps = {}
-                for device in devices:
-                    for app in device['installedApplications']:
-                        app_id = app['id']
-                        if app_id not in all_apps:
-                            # Räkna installationsstatus för denna app över alla enheter
-                            status_counts = {'Installed': 0, 'Failed': 0, 'N/A': 0}
-                            total_installs = 0
-                            for d in devices:
-                                for a in d['installedApplications']:
-                                    if a['id'] == app_id:
-                                        total_installs += 1
-                                        if a['installState'] == 'Installed':
-                                            status_counts['Installed'] += 1
-                                        elif a['installState'] in ['Failed', 'Error', 'Uninstall Failed']:
-                                            status_counts['Failed'] += 1
-                                        else:
-                                            status_counts['N/A'] += 1
-                            
-                            # Beräkna procentandelar
-                            status_percentages = {
-                                k: (v / total_installs * 100) if total_installs > 0 else 0 
-                                for k, v in status_counts.items()
-                            }
-                            
-                            all_apps[app_id] = {
-                                'name': app['displayName'],
-                                'status_percentages': status_percentages,
-                                'appId': app['id'],
-                                'entraGroups': app.get('entraGroups', []),
-                                'addedDate': app.get('addedDate', datetime.now().isoformat())
-                            }
-                
-                # Sortera efter addedDate och ta de 5 senaste
-                sorted_apps = sorted(all_apps.values(), 
-                                  key=lambda x: x['addedDate'], 
-                                  reverse=True)[:5]
-                return sorted_apps
+        # Servern räknar ut status per app, vi hämtar bara de 5 senast tillagda
+        apps, _ = get_json("/api/applications/summary", {"sort": "addedDate", "order": "desc", "limit": 5})
+        return apps if isinstance(apps, list) else []
+    except ApiError:
+        return []
     except Exception as e:
         st.error(f"Error fetching latest applications: {str(e)}")
         return []
@@ -91,23 +53,44 @@ st.markdown("## System Overview")
 # Fetch deployment analysis
 def fetch_deployment_analysis():
     try:
-        response = requests.get("http://localhost:8000/api/analyze-deployment")
-        if response.status_code == 200:
-            return response.json()
-        return {"error": f"API Error: {response.status_code}"}
+        analysis, _ = get_json("/api/analyze-deployment")
+        return analysis
+    except ApiError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"error": f"Connection Error: {str(e)}"}
+
+# Fält som tabellerna nedan visar
+TABLE_FIELDS = "deviceName,userDisplayName,department,osVersion,complianceState,lastSyncDateTime"
+
+# Fördelningarna räknas på servern, sidan hämtar bara antalen
+def fetch_device_stats():
+    try:
+        stats, _ = get_json("/api/stats/devices")
+        return stats
+    except ApiError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Connection Error: {str(e)}"}
 
-# Fetch device status
-def fetch_device_status():
+def fetch_sync_timeline(bucket, days):
     try:
-        response = requests.get("http://localhost:8000/api/device-status")
-        if response.status_code == 200:
-            return response.json()
-        return {"error": f"API Error: {response.status_code}"}
+        timeline, _ = get_json("/api/stats/sync-timeline", {"bucket": bucket, "days": days})
+        return timeline
+    except ApiError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Connection Error: {str(e)}"}
 
+def device_rows(items):
+    # Tabellerna visar inte det interna enhets-ID:t
+    return [{key: value for key, value in item.items() if key != "id"} for item in items]
+
+def distribution_chart(counts, title, kind="pie"):
+    if kind == "pie":
+        return px.pie(values=list(counts.values()), names=list(counts.keys()), title=title)
+    return px.bar(x=list(counts.keys()), y=list(counts.values()), title=title)
+
 # Dashboard layout
 col1, col2 = st.columns(2)
 
@@ -122,32 +105,27 @@ with col1:
 
 with col2:
     st.subheader("Device Status")
-    devices = fetch_device_status()
-    if isinstance(devices, list) and devices:
-        try:
-            df = pd.DataFrame(devices)
-            if 'complianceState' in df.columns:
-                fig = px.pie(df, names='complianceState', title='Device Compliance Status')
-                st.plotly_chart(fig)
-            else:
-                st.warning("No compliance data available in device data")
-        except Exception as e:
-            st.error(f"Could not create chart: {str(e)}")
+    stats = fetch_device_stats()
+    if "error" not in stats and stats.get("total"):
+        compliance = stats["distributions"]["complianceState"]
+        if compliance:
+            st.plotly_chart(distribution_chart(compliance, 'Device Compliance Status'))
+        else:
+            st.warning("No compliance data available in device data")
     else:
-        error_msg = devices.get('error', 'No device data available') if isinstance(devices, dict) else 'No device data available'
-        st.error(f"Failed to fetch device data: {error_msg}")
+        st.error(f"Failed to fetch device data: {stats.get('error', 'No device data available')}")
 
 # Detaljerad statistik sektion
 st.write("### Detailed Statistics")
-if isinstance(devices, list) and devices:
-    df = pd.DataFrame(devices)
+if "error" not in stats and stats.get("total"):
+    distributions = stats["distributions"]
     col_stats1, col_stats2, col_stats3 = st.columns(3)
     
     with col_stats1:
         st.subheader("Device Statistics")
-        total_devices = len(df)
-        compliant_devices = len(df[df['complianceState'] == 'compliant'])
-        noncompliant_devices = len(df[df['complianceState'] == 'noncompliant'])
+        total_devices = stats["total"]
+        compliant_devices = distributions["complianceState"].get("compliant", 0)
+        noncompliant_devices = distributions["complianceState"].get("noncompliant", 0)
         
         st.metric("Total Devices", total_devices)
         st.metric("Compliant Devices", compliant_devices)
@@ -157,35 +135,47 @@ if isinstance(devices, list) and devices:
 
     with col_stats2:
         st.subheader("OS Distribution")
-        os_dist = df['operatingSystem'].value_counts()
-        fig_os = px.pie(values=os_dist.values, names=os_dist.index, title='OS Distribution')
-        st.plotly_chart(fig_os, use_container_width=True)
+        st.plotly_chart(distribution_chart(distributions["operatingSystem"], 'OS Distribution'), use_container_width=True)
         
         # OS Version breakdown
-        os_version_dist = df['osVersion'].value_counts()
-        fig_version = px.bar(x=os_version_dist.index, y=os_version_dist.values, 
-                           title='OS Version Distribution')
-        st.plotly_chart(fig_version, use_container_width=True)
+        st.plotly_chart(distribution_chart(distributions["osVersion"], 'OS Version Distribution', kind="bar"),
+                        use_container_width=True)
 
     with col_stats3:
         st.subheader("Department Analysis")
-        dept_dist = df['department'].value_counts()
-        fig_dept = px.pie(values=dept_dist.values, names=dept_dist.index, 
-                         title='Department Distribution')
-        st.plotly_chart(fig_dept, use_container_width=True)
+        st.plotly_chart(distribution_chart(distributions["department"], 'Department Distribution'), use_container_width=True)
 
-    # Tidslinje för senaste synkronisering
+    # Tidslinje för senaste synkronisering, antal enheter per intervall räknas på servern
     st.subheader("Device Sync Timeline")
-    df['lastSyncDateTime'] = pd.to_datetime(df['lastSyncDateTime'])
-    fig_timeline = px.scatter(df, 
-                            x='lastSyncDateTime', 
-                            y='deviceName',
-                            color='complianceState',
-                            title='Last Device Sync Timeline')
-    st.plotly_chart(fig_timeline, use_container_width=True)
-
-    # Detaljerad enhetstabell
+    col_bucket, col_days = st.columns(2)
+    with col_bucket:
+        bucket = st.selectbox("Bucket", ["1h", "6h", "12h", "1d"], index=1)
+    with col_days:
+        days = st.selectbox("Period (days)", [1, 7, 30, 90], index=1)
+    timeline = fetch_sync_timeline(bucket, days)
+    if "error" not in timeline and timeline["buckets"]:
+        df_timeline = pd.DataFrame([
+            {"Last Sync": entry["start"], "Compliance State": state, "Devices": count}
+            for entry in timeline["buckets"]
+            for state, count in entry["counts"].items()
+        ])
+        fig_timeline = px.bar(df_timeline,
+                              x='Last Sync',
+                              y='Devices',
+                              color='Compliance State',
+                              title='Last Device Sync Timeline')
+        st.plotly_chart(fig_timeline, use_container_width=True)
+        if timeline["never_synced"]:
+            st.caption(f"{timeline['never_synced']} devices have never synced")
+    elif "error" in timeline:
+        st.error(f"Failed to fetch sync timeline: {timeline['error']}")
+
+    # Enheter som inte synkat på länge, äldst först
+    st.subheader("Stale Devices")
+    stale_hours = st.number_input("Not synced in (hours)", min_value=1, value=24, step=1)
+    paged_table("home_stale", "/api/stale-devices", {"hours": stale_hours, "fields": TABLE_FIELDS},
+                to_rows=device_rows, page_size=25)
+
+    # Detaljerad enhetstabell, en sida i taget
     st.subheader("Detailed Device Information")
-    columns_to_display = ['deviceName', 'userDisplayName', 'department', 
-                         'osVersion', 'complianceState', 'lastSyncDateTime']
-    st.dataframe(df[columns_to_display]) 
\ No newline at end of file
+    paged_table("home_devices", "/api/device-status", {"fields": TABLE_FIELDS}, to_rows=device_rows)
@@ -9,8 +9,19 @@ import schedule
 import time
 from threading import Thread
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
-from src.api.routes import router
+from src.api.routes import router, async_intune_service, inventory, report_catalog, report_jobs, scan_archive
+from src.core.config import settings
+from src.services.intune_service import GraphError
+from src.services.intune_service import IntuneService
+from src.services.graph_query import DeviceQuery, ProjectionCache
+
+# Brotli komprimerar JSON-listorna bättre än gzip men är valfritt, gzip används annars
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
 # Kontrollera att nödvändiga paket är installerade
 try:
@@ -29,11 +40,9 @@ app = FastAPI(title="EzRollout")
 
 # Microsoft Graph API-konfiguration
 load_dotenv()
-TENANT_ID = os.getenv("TENANT_ID")
-CLIENT_ID = os.getenv("CLIENT_ID")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET")
-SCOPE = "https://graph.microsoft.com/.default"
-TOKEN_URL = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
+legacy_intune_service = IntuneService()
+# Resultat per fråga, fält och filter från anroparen skickas till Graph som $select/$filter
+legacy_device_queries = ProjectionCache(legacy_intune_service, max_age=settings.INVENTORY_MAX_AGE)
 
 # Lägg till i app-konfigurationen
 app.add_middleware(
@@ -42,37 +51,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Sidinformationen i enhetslistorna ska gå att läsa från webbläsaren
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
-
-# Funktion för att autentisera med Graph API
-def get_access_token():
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "scope": SCOPE
-    }
-    response = requests.post(TOKEN_URL, data=data)
-    if response.status_code == 200:
-        return response.json().get("access_token")
-    else:
-        return None
+# Komprimera svar över 1 kB, enhetslistorna krymper till en bråkdel
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=1024, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Hämta enhetsstatus från Intune
 @app.get("/device-status")
-def get_device_status():
-    access_token = get_access_token()
-    if not access_token:
-        return {"error": "Misslyckades med att autentisera"}
-    
-    headers = {"Authorization": f"Bearer {access_token}"}
-    url = "https://graph.microsoft.com/v1.0/deviceManagement/managedDevices"
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json().get("value", [])
-    else:
-        return {"error": "Misslyckades med att hämta enhetsstatus", "details": response.text}
+def get_device_status(fields: str = None, department: str = None, complianceState: str = None):
+    # Följer @odata.nextLink så att alla sidor kommer med. fields och filtren skickas som
+    # $select/$filter, så Graph levererar bara de enheter och fält som efterfrågas.
+    filters = {key: value for key, value in (("department", department), ("complianceState", complianceState)) if value}
+    query = DeviceQuery(fields.split(",") if fields else None, filters)
+    try:
+        return legacy_device_queries.get(query)
+    except GraphError as e:
+        return e.to_dict()
 
 # Generera en Excel-rapport
 @app.get("/generate-report")
@@ -106,8 +104,8 @@ async def root():
 
 # Ny funktion för att analysera deployment success rate
 @app.get("/analyze-deployment")
-async def analyze_deployment():
-    devices = get_device_status()
+def analyze_deployment():
+    devices = get_device_status(fields=",".join(DeviceQuery.view("compliance").select))
     if "error" in devices:
         return devices
     
@@ -127,9 +125,28 @@ def scheduled_report_generation():
     response = requests.get("http://localhost:8000/api/generate-report")
     print(f"Report generated at {datetime.now()}: {response.status_code}")
 
+# Delta-synk av inventariet via den synkrona IntuneService
+def scheduled_inventory_sync():
+    try:
+        snapshot = inventory.sync()
+        print(f"Inventory synced at {datetime.now()}: version {snapshot.version}, {len(snapshot)} devices")
+    except GraphError as e:
+        print(f"Inventory sync failed at {datetime.now()}: {e.message}")
+
+# Importera nya skanningar från SCAN_IMPORT_DIR, redan importerade filer hoppas över
+def scheduled_scan_import():
+    result = scan_archive.import_directory(settings.SCAN_IMPORT_DIR)
+    print(f"Scans imported at {datetime.now()}: {result['imported']} new, {len(result['failed'])} failed")
+
 # Starta schemalagd rapportgenerering
 def start_scheduler():
     schedule.every().day.at("00:00").do(scheduled_report_generation)
+    schedule.every(settings.INVENTORY_SYNC_INTERVAL).minutes.do(scheduled_inventory_sync)
+    # Rensa gamla och överskjutande rapporter även när inga nya skapas
+    schedule.every().hour.do(report_catalog.evict)
+    if settings.SCAN_IMPORT_DIR:
+        scheduled_scan_import()
+        schedule.every().hour.do(scheduled_scan_import)
     while True:
         schedule.run_pending()
         time.sleep(60)
@@ -139,5 +156,11 @@ def start_scheduler():
 async def startup_event():
     Thread(target=start_scheduler, daemon=True).start()
 
+# Stäng den delade Graph-klienten och dess anslutningar
+@app.on_event("shutdown")
+async def shutdown_event():
+    await async_intune_service.aclose()
+    report_jobs.shutdown()
+
 # Inkludera routes
 app.include_router(router, prefix="/api")
@@ -3,22 +3,73 @@ import requests
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
+from src.utils.api_client import ApiError, get_json, get_page
+from src.utils.paged_table import paged_table
+from src.utils.rollout_views import rollout_trend, version_scan
 
 st.set_page_config(page_title="EzRollout - Application Search", layout="wide")
 
 st.title("Application Search")
 
+# Kolumnerna som sidan visar, matchedApplications är bara de sökta apparna på varje enhet
+SEARCH_FIELDS = "deviceName,userDisplayName,userPrincipalName,department,osVersion,osDescription,matchedApplications"
+
+NO_DEVICES = "No devices found with specified application"
+
+def fetch_install_stats(params):
+    # Status totalt och per avdelning räknas på servern, bara antalen skickas
+    try:
+        stats, _ = get_json("/api/stats/install-status", {**params, "by": "department"})
+        return stats
+    except ApiError as e:
+        return {"error": str(e)}
+
+def install_rows(devices):
+    # En rad per sökt app på varje enhet i den aktuella sidan
+    rows = [
+        {
+            'Device': device['deviceName'],
+            'Status': app['installState'],
+            'User': device['userDisplayName'],
+            'Primary User Email': device['userPrincipalName'],
+            'Department': device['department'],
+            'OS Version': device['osVersion'],
+            'Windows Version': device['osDescription'],
+            'Application Name': app['displayName'],
+            'Application Version': app['version']
+        }
+        for device in devices
+        for app in device['matchedApplications']
+    ]
+    return pd.DataFrame(rows, columns=[
+        'Device',
+        'Status',
+        'User',
+        'Primary User Email',
+        'Department',
+        'OS Version',
+        'Windows Version',
+        'Application Name',
+        'Application Version'
+    ])
+
 # Application Search Section
 col_search1, col_search2 = st.columns(2)
 
-# Kolla om vi har ett selected_app_id från Home page
+def clear_selected_app():
+    st.session_state.pop('search_app_id', None)
+
+# Kolla om vi har ett selected_app_id från Home page. Det flyttas till sidans egen nyckel,
+# så att appen finns kvar när sidan körs om, t.ex. vid byte av sida i tabellen.
 if 'selected_app_id' in st.session_state:
-    app_id = st.session_state['selected_app_id']
-    # Dölj sökfälten när vi kommer från Home
+    st.session_state['search_app_id'] = st.session_state.pop('selected_app_id')
+
+if 'search_app_id' in st.session_state:
+    app_id = st.session_state['search_app_id']
+    # Dölj sökfälten när vi kommer från Home, tills användaren vill söka på nytt
     st.write(f"**Showing details for application ID: {app_id}**")
     app_name = None
-    # Rensa session state så att det inte finns kvar vid manuell sökning
-    del st.session_state['selected_app_id']
+    st.button("New search", on_click=clear_selected_app)
 else:
     # Visa sökfälten endast när vi kommer direkt till sidan
     with col_search1:
@@ -34,140 +85,109 @@ if app_id or app_name:
         if app_name:
             params['app_name'] = app_name
             
-        response = requests.get("http://localhost:8000/api/search-applications", params=params)
-        if response.status_code == 200:
-            results = response.json()
-            if results:
-                # Filtrera resultaten för att bara visa den specifika appen
-                filtered_results = []
-                for device in results:
-                    matching_apps = [
-                        app for app in device['installedApplications']
-                        if (app_id and app['id'] == app_id) or 
-                           (app_name and app_name.lower() in app['name'].lower())
-                    ]
-                    if matching_apps:
-                        device_copy = device.copy()
-                        device_copy['installedApplications'] = matching_apps
-                        filtered_results.append(device_copy)
+        stats = fetch_install_stats(params)
+        if "error" not in stats and stats.get("total"):
+            st.write("### Application Deployment Status")
+            
+            # Visa applikationsinformation från första träffen
+            first_page, _, _ = get_page("/api/search-applications", {**params, "fields": "matchedApplications"}, limit=1)
+            target_app = first_page[0]['matchedApplications'][0]
+            col_app1, col_app2 = st.columns(2)
+            
+            with col_app1:
+                st.subheader("Application Details")
+                st.info(f"""
+                **Name:** {target_app['displayName']}
+                **Version:** {target_app['version']}
+                **Publisher:** {target_app['publisher']}
+                """)
+            
+            with col_app2:
+                st.subheader("Deployment Overview")
+                total_devices = stats["total"]
+                installed_devices = stats["status"].get("Installed", 0)
                 
-                if filtered_results:
-                    st.write("### Application Deployment Status")
-                    df_results = pd.DataFrame(filtered_results)
-                    
-                    # Visa applikationsinformation
-                    target_app = filtered_results[0]['installedApplications'][0]
-                    col_app1, col_app2 = st.columns(2)
-                    
-                    with col_app1:
-                        st.subheader("Application Details")
-                        st.info(f"""
-                        **Name:** {target_app['displayName']}
-                        **Version:** {target_app['version']}
-                        **Publisher:** {target_app['publisher']}
-                        """)
-                    
-                    with col_app2:
-                        st.subheader("Deployment Overview")
-                        total_devices = len(df_results)
-                        installed_devices = len([d for d in results if any(
-                            app['installState'] == 'Installed' 
-                            for app in d['installedApplications'] 
-                            if (app_id and app['id'] == app_id) or (app_name and app_name.lower() in app['name'].lower())
-                        )])
-                        
-                        deployment_rate = (installed_devices / total_devices * 100) if total_devices > 0 else 0
-                        
-                        st.metric("Total Target Devices", total_devices)
-                        st.metric("Successfully Installed", installed_devices)
-                        st.metric("Deployment Rate", f"{deployment_rate:.1f}%")
-
-                    # Installation Status Breakdown
-                    st.subheader("Installation Status")
-                    install_status = []
-                    for device in results:
-                        for app in device['installedApplications']:
-                            if (app_id and app['id'] == app_id) or (app_name and app_name.lower() in app['name'].lower()):
-                                install_status.append({
-                                    'Device': device['deviceName'],
-                                    'Status': app['installState'],
-                                    'User': device['userDisplayName'],
-                                    'Primary User Email': device['userPrincipalName'],
-                                    'Department': device['department'],
-                                    'OS Version': device['osVersion'],
-                                    'Windows Version': device['osDescription'],
-                                    'Application Name': app['displayName'],
-                                    'Application Version': app['version']
-                                })
-                    
-                    df_status = pd.DataFrame(install_status)
-                    # Ändra ordningen på kolumnerna för bättre läsbarhet
-                    columns_order = [
-                        'Device',
-                        'Status',
-                        'User',
-                        'Primary User Email',
-                        'Department',
-                        'OS Version',
-                        'Windows Version',
-                        'Application Name',
-                        'Application Version'
-                    ]
-                    df_status = df_status[columns_order]
-                    col_stat1, col_stat2 = st.columns(2)
-                    
-                    with col_stat1:
-                        status_counts = df_status['Status'].value_counts()
-                        fig_status = px.pie(values=status_counts.values, 
-                                          names=status_counts.index, 
-                                          title='Installation Status Distribution')
-                        st.plotly_chart(fig_status, use_container_width=True)
-                    
-                    with col_stat2:
-                        dept_status = df_status.groupby('Department')['Status'].value_counts().unstack()
-                        fig_dept = px.bar(dept_status, 
-                                        title='Installation Status by Department',
-                                        labels={'value': 'Number of Devices', 'Department': 'Department'})
-                        st.plotly_chart(fig_dept, use_container_width=True)
-
-                    # Detaljerad installationstabell
-                    st.subheader("Detailed Installation Status")
-                    st.dataframe(df_status)
-
-                    # Lägg till knapp för rapportgenerering
-                    st.subheader("Generate Report")
-                    if st.button("Generate Application Deployment Report"):
-                        try:
-                            params = {}
-                            if app_id:
-                                params['app_id'] = app_id
-                            if app_name:
-                                params['app_name'] = app_name
-                                
-                            response = requests.get("http://localhost:8000/api/generate-report", params=params)
-                            if response.status_code == 200:
-                                st.success("New report generated successfully!")
-                                # Hämta nedladdningslänk
-                                download_response = requests.get("http://localhost:8000/api/download-report")
-                                if download_response.status_code == 200:
-                                    # Skapa nedladdningslänk
-                                    content = download_response.content
-                                    st.download_button(
-                                        label="Download Excel Report",
-                                        data=content,
-                                        file_name=f"app_deployment_report_{app_id or app_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                    )
-                            else:
-                                st.error(f"Could not generate report: {response.text}")
-                        except Exception as e:
-                            st.error(f"Error generating report: {str(e)}")
-
-                else:
-                    st.warning("No devices found with the specified application")
-            else:
-                st.error("Failed to fetch deployment status")
+                deployment_rate = (installed_devices / total_devices * 100) if total_devices > 0 else 0
+                
+                st.metric("Total Target Devices", total_devices)
+                st.metric("Successfully Installed", installed_devices)
+                st.metric("Deployment Rate", f"{deployment_rate:.1f}%")
+
+            # Installation Status Breakdown
+            st.subheader("Installation Status")
+            col_stat1, col_stat2 = st.columns(2)
+            
+            with col_stat1:
+                fig_status = px.pie(values=list(stats["status"].values()), 
+                                  names=list(stats["status"].keys()), 
+                                  title='Installation Status Distribution')
+                st.plotly_chart(fig_status, use_container_width=True)
+            
+            with col_stat2:
+                dept_status = pd.DataFrame.from_dict(stats["groups"], orient="index").fillna(0)
+                dept_status.index.name = 'Department'
+                fig_dept = px.bar(dept_status, 
+                                title='Installation Status by Department',
+                                labels={'value': 'Number of Devices', 'Department': 'Department'})
+                st.plotly_chart(fig_dept, use_container_width=True)
+
+            rollout_trend(target_app['id'])
+
+            # Detaljerad installationstabell, en sida i taget
+            st.subheader("Detailed Installation Status")
+            paged_table("search_installs", "/api/search-applications", {**params, "fields": SEARCH_FIELDS},
+                        to_rows=install_rows)
+
+            # Versionsfördelning i samma uppställning som de manuella skanningarna
+            version_scan(target_app['id'])
+
+            # Lägg till knapp för rapportgenerering
+            st.subheader("Generate Report")
+            if st.button("Generate Application Deployment Report"):
+                try:
+                    params = {}
+                    if app_id:
+                        params['app_id'] = app_id
+                    if app_name:
+                        params['app_name'] = app_name
+
+                    response = requests.get("http://localhost:8000/api/generate-report", params=params)
+                    report = response.json() if response.status_code in (200, 202) else {}
+                    # Stora rapporter genereras i bakgrunden, vänta tills jobbet är klart
+                    with st.spinner("Generating report..."):
+                        while "job_id" in report:
+                            job = requests.get(
+                                f"http://localhost:8000/api/report-jobs/{report['job_id']}",
+                                params={"wait": 30}
+                            ).json()
+                            if job.get("status") == "done":
+                                report = {"report_id": job["report"]["id"]}
+                            elif job.get("status") not in ("queued", "running"):
+                                report = {"error": job.get("error", "Report job failed")}
+                    if "report_id" in report:
+                        if report.get("cached"):
+                            st.success("Report is up to date with the current inventory, reusing it")
+                        else:
+                            st.success("New report generated successfully!")
+                        # Hämta just den här rapporten via dess ID
+                        download_response = requests.get(f"http://localhost:8000/api/reports/{report['report_id']}/download")
+                        if download_response.status_code == 200:
+                            # Skapa nedladdningslänk
+                            content = download_response.content
+                            st.download_button(
+                                label="Download Excel Report",
+                                data=content,
+                                file_name=f"app_deployment_report_{app_id or app_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
+                    else:
+                        st.error(f"Could not generate report: {response.text}")
+                except Exception as e:
+                    st.error(f"Error generating report: {str(e)}")
+
+        elif stats.get("error") == NO_DEVICES or "error" not in stats:
+            st.warning("No devices found with the specified application")
         else:
             st.error("Failed to fetch deployment status")
     except Exception as e:
-        st.error(f"Error analyzing deployment: {str(e)}") 
\ No newline at end of file
+        st.error(f"Error analyzing deployment: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,142 @@
+import threading
+import pandas as pd
+
+# Enhetsfält som tas med i enhetstabellen, kategoriska där värdena upprepas
+DEVICE_FIELDS = [
+    "deviceName", "userDisplayName", "userPrincipalName", "department", "operatingSystem",
+    "osVersion", "osDescription", "platform", "complianceState", "lastSyncDateTime",
+]
+DEVICE_CATEGORIES = ["department", "operatingSystem", "osVersion", "osDescription", "platform", "complianceState"]
+
+APP_FIELDS = ["name", "displayName", "publisher", "shortVersion", "applicationKey", "addedDate", "entraGroups"]
+
+
+class FleetFrame:
+    """Kolumnär vy av en inventariesnapshot.
+
+    devices har en rad per enhet, installs en rad per (enhet, app) och apps
+    en rad per app i katalogen. Status, avdelning och OS lagras som
+    kategorier så att filtrering och gruppering blir vektoriserade.
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.key = snapshot.key
+
+        device_ids = []
+        columns = {field: [] for field in DEVICE_FIELDS}
+        install_device, install_app, install_state, install_version = [], [], [], []
+        apps = {}
+        for device in snapshot:
+            device_ids.append(device["id"])
+            for field in DEVICE_FIELDS:
+                columns[field].append(device.get(field))
+            for app in device.get("installedApplications", []):
+                install_device.append(device["id"])
+                install_app.append(app["id"])
+                install_state.append(app.get("installState"))
+                install_version.append(app.get("version"))
+                if app["id"] not in apps:
+                    apps[app["id"]] = [app.get(field) for field in APP_FIELDS]
+
+        self.devices = pd.DataFrame(columns, index=pd.Index(device_ids, name="device_id"))
+        for field in DEVICE_CATEGORIES:
+            self.devices[field] = self.devices[field].astype("category")
+        # Graph skickar UTC med Z, demodata saknar tidszon. Allt lagras som UTC utan tidszon.
+        self.devices["lastSyncDateTime"] = pd.to_datetime(
+            self.devices["lastSyncDateTime"], errors="coerce", utc=True
+        ).dt.tz_localize(None)
+
+        self.installs = pd.DataFrame({
+            "device_id": pd.Categorical(install_device, categories=device_ids),
+            "app_id": pd.Categorical(install_app),
+            "installState": pd.Categorical(install_state),
+            "version": pd.Categorical(install_version),
+        })
+        self.apps = pd.DataFrame.from_dict(apps, orient="index", columns=APP_FIELDS)
+        self.apps.index.name = "app_id"
+
+    def __len__(self):
+        return len(self.devices)
+
+    def compliance_counts(self):
+        total = len(self.devices)
+        compliant = int((self.devices["complianceState"] == "compliant").sum())
+        return total, compliant
+
+    def value_counts(self, field):
+        # {värde: antal enheter}, störst först. Enheter utan värde räknas inte.
+        counts = self.devices[field].value_counts(sort=True)
+        return {str(value): int(count) for value, count in counts.items() if count}
+
+    def sync_timeline(self, width, since=None, by="complianceState"):
+        """Antal enheter per tidsintervall för senaste synk, uppdelat på by.
+
+        width är intervallets längd (Timedelta). Returnerar en DataFrame med
+        intervallstart som index och en kolumn per värde av by.
+        """
+        synced = self.devices.loc[self.devices["lastSyncDateTime"].notna(), ["lastSyncDateTime", by]]
+        if since is not None:
+            synced = synced[synced["lastSyncDateTime"] >= since]
+        buckets = synced["lastSyncDateTime"].dt.floor(width).rename("bucket")
+        return synced.groupby([buckets, synced[by]], observed=True).size().unstack(fill_value=0)
+
+    def never_synced(self):
+        return int(self.devices["lastSyncDateTime"].isna().sum())
+
+    def sync_index(self):
+        # (sekunder sedan epoch, enhets-ID) sorterat äldst först, enheter som aldrig synkat först
+        seconds = (self.devices["lastSyncDateTime"] - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+        return sorted(zip(seconds.fillna(float("-inf")).tolist(), self.devices.index.tolist()))
+
+    def matching_installs(self, app_ids):
+        # Första matchande app per enhet, i samma ordning som apparna ligger på enheten
+        installs = self.installs[self.installs["app_id"].isin(app_ids)]
+        return installs.drop_duplicates("device_id", keep="first")
+
+    def device_ids(self, app_ids):
+        return self.matching_installs(app_ids)["device_id"].astype(str).tolist()
+
+    def deployment_table(self, app_ids):
+        # En rad per enhet med enhets- och appfält, underlag för rapporter och statusvyer
+        installs = self.matching_installs(app_ids)
+        table = installs.join(self.apps, on="app_id").join(self.devices, on="device_id")
+        return table.reset_index(drop=True)
+
+    def install_counts(self, by=None):
+        # Antal installationer per (app, [by,] status) för alla appar, bara kombinationer som finns
+        installs = self.installs
+        keys = ["app_id", "installState"]
+        if by is not None:
+            installs = installs.join(self.devices[[by]], on="device_id")
+            keys = ["app_id", by, "installState"]
+        counts = installs.groupby(keys, observed=True).size()
+        return counts[counts > 0]
+
+    def install_status_counts(self, app_ids, by=None):
+        table = self.deployment_table(app_ids)
+        if by is None:
+            return table["installState"].value_counts()
+        return table.groupby(by, observed=True)["installState"].value_counts().unstack(fill_value=0)
+
+
+class FleetAnalytics:
+    """Håller en FleetFrame per snapshot-version och bygger om den vid behov."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame = None
+
+    def apply_changes(self, snapshot, changes):
+        # Bygg den nya vyn direkt efter synken så att första anropet inte behöver vänta
+        self.frame(snapshot)
+
+    def frame(self, snapshot):
+        frame = self._frame
+        if frame is not None and frame.key == snapshot.key:
+            return frame
+        with self._lock:
+            # En annan tråd kan ha byggt ramen medan vi väntade
+            if self._frame is None or self._frame.key != snapshot.key:
+                self._frame = FleetFrame(snapshot)
+            return self._frame
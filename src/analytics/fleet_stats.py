@@ -0,0 +1,145 @@
+import bisect
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from .fleet_frame import DEVICE_CATEGORIES
+
+# Fördelningarna som startsidan visar
+DEVICE_STAT_FIELDS = ["complianceState", "operatingSystem", "osVersion", "department"]
+# Fält som installationsstatus kan grupperas på
+GROUP_FIELDS = ["department", "operatingSystem", "osVersion", "platform", "complianceState"]
+# Högst så här många olika appfrågor sparas per snapshot
+MAX_CACHED_RESULTS = 256
+# Intervallbredd för synk-tidslinjen, t.ex. 30m, 1h, 6h eller 1d
+BUCKET_PATTERN = re.compile(r"^(\d+)([mhd])$")
+BUCKET_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+MIN_BUCKET = timedelta(minutes=5)
+MAX_BUCKETS = 2000
+
+
+def parse_bucket(value):
+    match = BUCKET_PATTERN.match(value or "")
+    if not match:
+        raise ValueError(f"Invalid bucket '{value}', use e.g. 30m, 1h, 6h or 1d")
+    width = timedelta(**{BUCKET_UNITS[match.group(2)]: int(match.group(1))})
+    if width < MIN_BUCKET:
+        raise ValueError("Bucket must be at least 5 minutes")
+    return width
+
+
+def utc_minute():
+    # Aktuell minut i UTC utan tidszon, samma form som lastSyncDateTime i FleetFrame
+    return datetime.now(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+
+
+def epoch_seconds(moment):
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+class FleetStats:
+    """Färdigräknade fördelningar för dashboardens diagram.
+
+    Räknas ur FleetFrame och sparas tills snapshot-versionen ändras, så att
+    diagrammen bara behöver några kilobyte i stället för hela flottan.
+    """
+
+    def __init__(self, analytics):
+        self.analytics = analytics
+        self._lock = threading.Lock()
+        self._key = None
+        self._results = {}
+
+    def apply_changes(self, snapshot, changes):
+        # Räkna startsidans fördelningar direkt efter synken
+        self.devices(snapshot)
+
+    def devices(self, snapshot, fields=None):
+        fields = tuple(fields or DEVICE_STAT_FIELDS)
+        unknown = [field for field in fields if field not in DEVICE_CATEGORIES]
+        if unknown:
+            return {"error": f"Unknown field '{unknown[0]}', use one of: {', '.join(DEVICE_CATEGORIES)}"}
+
+        def compute(frame):
+            return {
+                "total": len(frame),
+                "version": snapshot.version,
+                "distributions": {field: frame.value_counts(field) for field in fields},
+            }
+        return self._cached(snapshot, ("devices", fields), compute)
+
+    def install_status(self, snapshot, app_ids, by="department"):
+        if by is not None and by not in GROUP_FIELDS:
+            return {"error": f"Unknown group '{by}', use one of: {', '.join(GROUP_FIELDS)}"}
+
+        def compute(frame):
+            table = frame.deployment_table(app_ids)
+            status = table["installState"].value_counts()
+            result = {
+                "total": len(table),
+                "version": snapshot.version,
+                "status": {str(state): int(count) for state, count in status.items() if count},
+            }
+            if by is not None:
+                groups = table.groupby(by, observed=True)["installState"].value_counts().unstack(fill_value=0)
+                result["by"] = by
+                result["groups"] = {
+                    str(group): {str(state): int(count) for state, count in row.items() if count}
+                    for group, row in groups.iterrows()
+                }
+            return result
+        return self._cached(snapshot, ("install_status", tuple(app_ids), by), compute)
+
+    def sync_timeline(self, snapshot, bucket="1h", days=7, now=None):
+        try:
+            width = parse_bucket(bucket)
+        except ValueError as e:
+            return {"error": str(e)}
+        window = timedelta(days=days)
+        if window / width > MAX_BUCKETS:
+            return {"error": f"Too many buckets, use a wider bucket or fewer days (max {MAX_BUCKETS})"}
+        # Fönstret börjar på en intervallgräns så att resultatet kan återanvändas inom intervallet
+        since = pd.Timestamp((now or utc_minute()) - window).floor(width)
+
+        def compute(frame):
+            counts = frame.sync_timeline(width, since)
+            return {
+                "bucket": bucket,
+                "since": since.isoformat(),
+                "version": snapshot.version,
+                "states": [str(state) for state in counts.columns],
+                "buckets": [
+                    {
+                        "start": start.isoformat(),
+                        "total": int(row.sum()),
+                        "counts": {str(state): int(count) for state, count in row.items() if count},
+                    }
+                    for start, row in counts.iterrows()
+                ],
+                "never_synced": frame.never_synced(),
+            }
+        return self._cached(snapshot, ("sync_timeline", bucket, since), compute)
+
+    def stale_devices(self, snapshot, older_than):
+        """Index över enheter sorterat på senaste synk och antalet som synkade före older_than.
+
+        Indexet byggs en gång per snapshot, varje fråga är sedan en binärsökning.
+        De första count nycklarna i indexet är de inaktuella enheterna, äldst först.
+        """
+        index = self._cached(snapshot, ("sync_index",), lambda frame: frame.sync_index())
+        return index, bisect.bisect_left(index, (epoch_seconds(older_than),))
+
+    def _cached(self, snapshot, name, compute):
+        with self._lock:
+            if self._key != snapshot.key:
+                self._key, self._results = snapshot.key, {}
+            result = self._results.get(name)
+        if result is not None:
+            return result
+        result = compute(self.analytics.frame(snapshot))
+        with self._lock:
+            if self._key == snapshot.key:
+                if len(self._results) >= MAX_CACHED_RESULTS:
+                    self._results.clear()
+                self._results[name] = result
+        return result
@@ -0,0 +1,146 @@
+import re
+import threading
+from functools import lru_cache
+
+# Installationer som räknas som att versionen finns på enheten
+COUNTED_STATES = ("Installed",)
+MANUAL_INSTALL = "Manual Install"
+# Releasenamn per produkt när de inte skrivs som major.minor, t.ex. Citrix Workspace 2402 för 24.2.x
+RELEASE_FORMATS = {
+    "citrix workspace": "{0}{1:02d}",
+}
+# Bara versioner med punkt eller v-prefix tas bort, "Microsoft 365" och "Office 2019" är produktnamn
+_TRAILING_VERSION = re.compile(r"\s+(?:v\d+(?:\.\d+)*|\d+(?:\.\d+)+)$", re.IGNORECASE)
+# Releasenummer utan punkt, t.ex. 2402, tas bara bort för produkterna i RELEASE_FORMATS
+_TRAILING_RELEASE = re.compile(r"\s+\d+$")
+_VERSION_PART = re.compile(r"\d+|[^\d.\-_+ ]+")
+
+
+@lru_cache(maxsize=65536)
+def version_key(version):
+    """Sorteringsnyckel för en versionssträng, 24.2.1000.1016 -> ((0, 24), (0, 2), (0, 1000), (0, 1016)).
+
+    Numeriska delar jämförs som tal och övriga som text efter talen, så att
+    19.12 hamnar efter 19.9. Nycklarna cachas eftersom samma versioner
+    förekommer på tusentals enheter.
+    """
+    if not version:
+        return ()
+    return tuple((0, int(part)) if part.isdigit() else (1, part.lower()) for part in _VERSION_PART.findall(str(version)))
+
+
+@lru_cache(maxsize=4096)
+def product_name(name):
+    # "Citrix Workspace 2402" och "Citrix Workspace 25.2" hör till produkten "Citrix Workspace"
+    name = (name or "").strip()
+    product = _TRAILING_VERSION.sub("", name)
+    release = _TRAILING_RELEASE.sub("", product)
+    if release.lower() in RELEASE_FORMATS:
+        product = release
+    return product or name
+
+
+def release_label(product, version):
+    numbers = [value for kind, value in version_key(version) if kind == 0][:2]
+    if not numbers:
+        return product
+    numbers += [0] * (2 - len(numbers))
+    template = RELEASE_FORMATS.get(product.lower(), "{0}.{1}")
+    return f"{product} {template.format(*numbers)}"
+
+
+def build_distribution(frame, states=COUNTED_STATES):
+    """Versionsfördelning per produkt för en FleetFrame, i ett svep över installationerna.
+
+    Versionen som flest enheter har per APPID räknas som den APPID:t rullar
+    ut, övriga versioner av produkten som manuella installationer. Returnerar
+    {produkt: fördelning} sorterat på produktnamn.
+    """
+    installs = frame.installs
+    if states:
+        installs = installs[installs["installState"].isin(states)]
+    counts = installs.groupby(["app_id", "version"], observed=True).size()
+
+    products = {}
+    for (app_id, version), devices in counts.items():
+        if not devices:
+            continue
+        app = frame.apps.loc[app_id]
+        product = product_name(app["name"] or app["displayName"])
+        entry = products.setdefault(product, {"applications": {}, "versions": {}})
+        application = entry["applications"].setdefault(app_id, {
+            "app_id": str(app_id),
+            "name": app["displayName"] or app["name"],
+            "entraGroups": list(app.get("entraGroups") or []),
+            "version": None,
+            "devices": 0,
+        })
+        application["devices"] += int(devices)
+        if application["version"] is None or devices > application["_top"]:
+            application["version"], application["_top"] = version, devices
+        entry["versions"][version] = entry["versions"].get(version, 0) + int(devices)
+
+    return {product: _product_distribution(product, entry) for product, entry in sorted(products.items())}
+
+
+def _product_distribution(product, entry):
+    packaged = {}
+    for application in entry["applications"].values():
+        application.pop("_top", None)
+        packaged.setdefault(application["version"], application["app_id"])
+
+    sections = {}
+    for version in sorted(entry["versions"], key=version_key):
+        release = release_label(product, version)
+        section = sections.setdefault(release, {"release": release, "devices": 0, "versions": []})
+        app_id = packaged.get(version)
+        section["versions"].append({
+            "version": version,
+            "devices": entry["versions"][version],
+            "source": f"APPID:{app_id}" if app_id else MANUAL_INSTALL,
+        })
+        section["devices"] += entry["versions"][version]
+
+    applications = sorted(entry["applications"].values(), key=lambda app: version_key(app["version"]))
+    return {
+        "product": product,
+        # Senaste releasen med APPID är den som rullas ut nu
+        "target": applications[-1] if applications else None,
+        "applications": applications,
+        "sections": list(sections.values()),
+        "grand_total": sum(entry["versions"].values()),
+    }
+
+
+class VersionDistributions:
+    """Versionsfördelning för alla produkter, räknas om en gång per snapshot-version."""
+
+    def __init__(self, analytics, states=COUNTED_STATES):
+        self.analytics = analytics
+        self.states = states
+        self._lock = threading.Lock()
+        self._key = None
+        self._products = None
+
+    def apply_changes(self, snapshot, changes):
+        # Räkna alla produkter direkt efter synken
+        self.products(snapshot)
+
+    def products(self, snapshot):
+        with self._lock:
+            if self._key == snapshot.key:
+                return self._products
+        products = build_distribution(self.analytics.frame(snapshot), self.states)
+        with self._lock:
+            self._key, self._products = snapshot.key, products
+        return products
+
+    def find(self, snapshot, product=None, app_id=None):
+        # Produkten med namnet product (skiftlägesokänsligt) eller den som APPID:t hör till
+        products = self.products(snapshot)
+        for name, distribution in products.items():
+            if product and name.lower() == product.strip().lower():
+                return distribution
+            if app_id and any(app["app_id"] == str(app_id) for app in distribution["applications"]):
+                return distribution
+        return None
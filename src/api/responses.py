@@ -0,0 +1,179 @@
+import base64
+import binascii
+import bisect
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+# orjson är betydligt snabbare än json-modulen för stora enhetslistor, men valfritt
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Största sidstorlek för paginerade enhetslistor
+MAX_PAGE_LIMIT = 5000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+class FastJSONResponse(JSONResponse):
+    # Serialiserar med orjson när det finns installerat, annars som JSONResponse
+    def render(self, content):
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_fields(fields):
+    # "deviceName,complianceState" -> ["id", "deviceName", "complianceState"], None betyder alla fält
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return ["id"] + [name for name in names if name != "id"]
+
+
+def project(device, fields, computed=None):
+    """Dict med bara de begärda fälten ur en DeviceRecord.
+
+    computed är {fältnamn: funktion(device)} för fält som räknas fram per
+    anrop, t.ex. matchedApplications i sökningen, och tas bara med när de
+    begärs. installedApplications byggs bara när det efterfrågas.
+    """
+    if fields is None:
+        return device.to_dict()
+    computed = computed or {}
+    result = {}
+    for name in fields:
+        if name in computed:
+            result[name] = computed[name](device)
+        elif name in device:
+            result[name] = device[name]
+    return result
+
+
+def encode_cursor(key):
+    # key är ett enhets-ID eller en tuple, t.ex. (senaste synk, enhets-ID)
+    data = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        key = json.loads(data.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    return tuple(key) if isinstance(key, list) else key
+
+
+def page_ids(keys, cursor=None, limit=None, end=None):
+    """Sidan efter cursor ur en sorterad nyckellista och cursor till nästa sida.
+
+    Cursorn är den sista nyckeln på föregående sida, så sidorna håller även
+    om inventariet ändras mellan anropen. end begränsar listan till de
+    första end nycklarna.
+    """
+    end = len(keys) if end is None else end
+    try:
+        start = bisect.bisect_right(keys, decode_cursor(cursor), 0, end) if cursor else 0
+    except TypeError:
+        # Cursorn kommer från en annan lista
+        raise ValueError("Invalid cursor")
+    stop = end if limit is None else min(end, start + limit)
+    page = keys[start:stop]
+    next_cursor = encode_cursor(page[-1]) if page and stop < end else None
+    return page, next_cursor
+
+
+class ResultCache:
+    """Sorterade enhets-ID per (snapshot, fråga) så att följande sidor inte räknas om.
+
+    Allt från tidigare snapshots kastas när en ny version dyker upp.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._snapshot_key = None
+        self._entries = OrderedDict()
+
+    def get(self, snapshot_key, query_key, compute):
+        with self._lock:
+            if snapshot_key != self._snapshot_key:
+                self._snapshot_key = snapshot_key
+                self._entries.clear()
+            ids = self._entries.get(query_key)
+            if ids is not None:
+                self._entries.move_to_end(query_key)
+                return ids
+        ids = sorted(compute())
+        with self._lock:
+            if snapshot_key == self._snapshot_key:
+                self._entries[query_key] = ids
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return ids
+
+
+def device_page_response(snapshot, keys, fields=None, cursor=None, limit=None, computed=None, end=None, device_id=None):
+    """Listan som svar, sidinformation i headers så att svaret ser ut som tidigare utan limit.
+
+    keys är sorterade enhets-ID, eller andra sorterade nycklar där device_id
+    plockar ut enhetens ID ur nyckeln.
+    """
+    try:
+        page, next_cursor = page_ids(keys, cursor, limit, end)
+    except ValueError as e:
+        return FastJSONResponse({"error": str(e)}, status_code=400)
+    fields = parse_fields(fields)
+    if device_id is not None:
+        page = [device_id(key) for key in page]
+    content = [project(snapshot.get(key), fields, computed) for key in page]
+    headers = {TOTAL_COUNT_HEADER: str(len(keys) if end is None else end)}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return FastJSONResponse(content, headers=headers)
+
+
+def snapshot_etag(snapshot, request, extra=""):
+    # Svaret beror bara på snapshot-versionen, sökvägen och frågeparametrarna.
+    # extra är för svar som även beror på tiden, t.ex. aktuell minut.
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{snapshot.key}|{request.url.path}|{query}|{extra}".encode("utf-8")).hexdigest()[:24]
+    # Svag ETag eftersom samma innehåll kan skickas gzip-, brotli- eller okomprimerat
+    return f'W/"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match jämförs svagt, W/ spelar ingen roll
+    tags = {tag.strip().replace("W/", "", 1) for tag in header.split(",")}
+    return etag.replace("W/", "", 1) in tags
+
+
+def cache_headers(etag):
+    # no-cache betyder att klienten får spara svaret men ska fråga med If-None-Match innan det används
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def with_etag(content, etag):
+    """Svar med ETag. Felsvar får ingen ETag så att de aldrig cachas."""
+    if not isinstance(content, Response):
+        if isinstance(content, dict) and "error" in content:
+            return content
+        content = FastJSONResponse(content)
+    if content.status_code == 200:
+        content.headers.update(cache_headers(etag))
+    return content
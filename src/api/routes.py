@@ -1,112 +1,535 @@
-from fastapi import APIRouter, Response, Query
-from fastapi.responses import FileResponse
-from ..services.intune_service import IntuneService
-import pandas as pd
+from fastapi import APIRouter, Request, Response, Query
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from ..services.intune_service import IntuneService, GraphError, build_deployment_summary
+from ..services.async_intune_service import AsyncIntuneService
+from ..services.graph_throttling import graph_metrics
+from ..services.graph_query import DEVICE_VIEWS
+from ..services.inventory_sync import InventorySync
+from ..services.app_index import AppIndex
+from ..services.app_summary import AppSummary, SORT_KEYS
+from ..analytics.fleet_frame import FleetAnalytics
+from ..analytics.fleet_stats import FleetStats, utc_minute
+from ..analytics.version_distribution import VersionDistributions
+from ..storage.inventory_store import InventoryStore
+from ..storage.rollout_history import RolloutHistory
+from ..storage.scan_archive import ScanArchive, compare_scan
+from ..reports.deployment_report import report_filename, iter_deployment_report
+from ..reports.xlsx_stream import XLSX_MEDIA_TYPE
+from ..reports.rollout_scan import CSV_MEDIA_TYPE, iter_scan_csv, iter_scan_xlsx, scan_filename
+from ..reports.report_catalog import ReportCatalog, report_key
+from ..reports.report_jobs import ReportJobQueue, DONE, FAILED
+from .responses import (
+    MAX_PAGE_LIMIT, ResultCache, device_page_response, etag_matches, not_modified, snapshot_etag, with_etag
+)
+from ..core.auth import token_provider
+from ..core.config import settings
+import asyncio
 import os
+import time
+from operator import itemgetter
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
 router = APIRouter()
-# Skapa en instans av IntuneService med demo_mode
-intune_service = IntuneService(demo_mode=True)  # Eller låt den läsa från .env genom att inte skicka in något argument
+# Skapa en instans av IntuneService med demo_mode, DEMO_MODE=false kör mot Graph (eller graph_server)
+intune_service = IntuneService(demo_mode=os.getenv("DEMO_MODE", "true").lower() == "true")
+# Routes använder den asynkrona klienten, den synkrona finns kvar för schemaläggaren
+async_intune_service = AsyncIntuneService.from_sync(intune_service)
+# Lokal snapshot av inventariet som hålls uppdaterad med delta-synk
+# Bara fälten som vyerna använder hämtas ($select), apparna läggs till via detectedApps
+inventory = InventorySync(
+    intune_service, async_intune_service, max_age=settings.INVENTORY_MAX_AGE, select=DEVICE_VIEWS["inventory"]
+)
+# Mockdata genereras om vid varje start och ska därför inte sparas på disk
+inventory_store = InventoryStore(":memory:" if intune_service.demo_mode else settings.INVENTORY_DB)
+_stored_state = inventory_store.load_state()
+if _stored_state["last_sync"] is not None:
+    inventory.restore(inventory_store.load_devices(), **_stored_state)
+inventory.subscribe(inventory_store.apply_changes)
+# Index för appsökning, byggs om inkrementellt vid varje ny snapshot-version
+app_index = AppIndex()
+app_index.rebuild(inventory.snapshot())
+inventory.subscribe(app_index.apply_changes)
+# Statusräknare per app för startsidan
+app_summary = AppSummary()
+app_summary.rebuild(inventory.snapshot())
+inventory.subscribe(app_summary.apply_changes)
+# Kolumnär vy av snapshoten för analys, sökfilter och rapporter
+fleet_analytics = FleetAnalytics()
+inventory.subscribe(fleet_analytics.apply_changes)
+# Fördelningar för diagrammen, räknas en gång per snapshot-version
+fleet_stats = FleetStats(fleet_analytics)
+inventory.subscribe(fleet_stats.apply_changes)
+# Installationsstatus per app över tid, ett mätvärde per ny inventarieversion
+rollout_history = RolloutHistory(
+    ":memory:" if intune_service.demo_mode else settings.HISTORY_DB,
+    fleet_analytics,
+    raw_hours=settings.HISTORY_RAW_HOURS,
+    hourly_days=settings.HISTORY_HOURLY_DAYS,
+)
+inventory.subscribe(rollout_history.apply_changes)
+# Versionsfördelning per produkt (APPID eller manuell installation), räknas för alla produkter vid varje synk
+version_distributions = VersionDistributions(fleet_analytics)
+inventory.subscribe(version_distributions.apply_changes)
+# Importerade utrullningsskanningar, i samma databas som historiken
+scan_archive = ScanArchive(history=rollout_history)
+# Sorterade enhets-ID per fråga och snapshot, följande sidor i en cursor-bläddring räknas inte om
+device_lists = ResultCache()
 
 # Skapa en reports-mapp om den inte finns
 REPORTS_DIR = Path("reports")
 REPORTS_DIR.mkdir(exist_ok=True)
+report_catalog = ReportCatalog(
+    REPORTS_DIR,
+    max_bytes=settings.REPORTS_MAX_MB * 1024 * 1024,
+    max_age=settings.REPORTS_MAX_AGE_DAYS * 24 * 3600,
+)
+# Rapporter renderas i en processpool utanför request-hanteringen
+report_jobs = ReportJobQueue(report_catalog, max_workers=settings.REPORT_WORKERS or None)
+
+async def _load_inventory():
+    # Returnerar (snapshot, fel). Om Graph inte svarar visas senaste snapshot om vi har en.
+    try:
+        return await inventory.sync_async_if_stale(), None
+    except GraphError as e:
+        if inventory.last_sync is not None:
+            return inventory.snapshot(), None
+        return None, e.to_dict()
 
 @router.get("/device-status")
-async def get_device_status():
-    return intune_service.get_device_status()
+async def get_device_status(
+    request: Request,
+    fields: str = None,
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+):
+    # fields begränsar svaret till vissa kolumner, limit och cursor ger en sida i taget sorterat på id.
+    # Nästa sida anges i X-Next-Cursor, utan limit returneras alla enheter som tidigare.
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    ids = await run_in_threadpool(device_lists.get, snapshot.key, ("all",), lambda: snapshot.devices.keys())
+    return with_etag(await run_in_threadpool(device_page_response, snapshot, ids, fields, cursor, limit), etag)
+
+@router.get("/inventory/status")
+async def get_inventory_status():
+    return inventory.status()
+
+@router.get("/token-stats")
+async def get_token_stats():
+    # Visar hur ofta token-cachen träffar så att vi kan se att token-anropen försvunnit
+    return token_provider.stats()
+
+@router.get("/graph-stats")
+async def get_graph_stats():
+    # Throttling, nya försök och uppmätta anrop per sekund mot Graph
+    return graph_metrics.stats()
+
+@router.get("/applications/summary")
+async def get_applications_summary(
+    request: Request,
+    sort: str = "addedDate",
+    order: str = "desc",
+    limit: int = Query(None, ge=1),
+):
+    if sort not in SORT_KEYS:
+        return {"error": f"Unknown sort key '{sort}', use one of: {', '.join(SORT_KEYS)}"}
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(app_summary.summary(sort=sort, descending=order != "asc", limit=limit), etag)
 
 @router.get("/analyze-deployment")
-async def analyze_deployment():
-    devices = intune_service.get_device_status()
-    return intune_service.analyze_deployment(devices)
+async def analyze_deployment(request: Request):
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    frame = await run_in_threadpool(fleet_analytics.frame, snapshot)
+    total_devices, successful_deployments = frame.compliance_counts()
+    return with_etag(build_deployment_summary(total_devices, successful_deployments), etag)
+
+@router.get("/stats/devices")
+async def get_device_stats(request: Request, fields: str = None):
+    # Antal enheter per complianceState, operatingSystem, osVersion och department, eller valda fält
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    return with_etag(await run_in_threadpool(fleet_stats.devices, snapshot, fields), etag)
+
+@router.get("/stats/install-status")
+async def get_install_status_stats(request: Request, app_id: str = None, app_name: str = None, by: str = "department"):
+    # Installationsstatus för en app, totalt och per grupp. by= utan värde ger bara totalen.
+    if not (app_id or app_name):
+        return {"error": "Must specify either app_id or app_name"}
+
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    app_ids = app_index.find_app_ids(app_id, app_name)
+    if not app_ids:
+        return {"error": "No devices found with specified application"}
+    return with_etag(await run_in_threadpool(fleet_stats.install_status, snapshot, app_ids, by or None), etag)
+
+@router.get("/stats/sync-timeline")
+async def get_sync_timeline(request: Request, bucket: str = "1h", days: float = Query(7, gt=0, le=365)):
+    # Antal enheter per intervall för senaste synk, uppdelat på complianceState
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    now = utc_minute()
+    etag = snapshot_etag(snapshot, request, extra=now.isoformat())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(await run_in_threadpool(fleet_stats.sync_timeline, snapshot, bucket, days, now), etag)
+
+@router.get("/stale-devices")
+async def get_stale_devices(
+    request: Request,
+    hours: float = Query(24, gt=0),
+    fields: str = None,
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+):
+    # Enheter som inte synkat på hours timmar, äldst först och med samma sidindelning som /device-status
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    now = utc_minute()
+    etag = snapshot_etag(snapshot, request, extra=now.isoformat())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    index, count = await run_in_threadpool(fleet_stats.stale_devices, snapshot, now - timedelta(hours=hours))
+    return with_etag(await run_in_threadpool(
+        device_page_response, snapshot, index, fields, cursor, limit, None, count, itemgetter(1)
+    ), etag)
+
+@router.get("/history/applications/{app_id}")
+async def get_application_history(
+    request: Request,
+    app_id: str,
+    days: float = Query(90, gt=0, le=3650),
+    by: str = None,
+    resolution: str = None,
+):
+    # Installationsstatus för appen över tid, totalt eller per department/operatingSystem.
+    # Upplösningen väljs efter perioden om den inte anges (raw, hourly eller daily).
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    now = utc_minute()
+    etag = snapshot_etag(snapshot, request, extra=now.isoformat())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(await run_in_threadpool(rollout_history.series, app_id, days, by, resolution), etag)
+
+@router.get("/versions")
+async def list_version_distributions(request: Request):
+    # En rad per produkt, detaljerna hämtas via /versions/distribution
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    products = await run_in_threadpool(version_distributions.products, snapshot)
+    return with_etag([
+        {
+            "product": name,
+            "target_app_id": distribution["target"]["app_id"] if distribution["target"] else None,
+            "releases": len(distribution["sections"]),
+            "versions": sum(len(section["versions"]) for section in distribution["sections"]),
+            "grand_total": distribution["grand_total"],
+        }
+        for name, distribution in products.items()
+    ], etag)
+
+@router.get("/versions/distribution")
+async def get_version_distribution(request: Request, product: str = None, app_id: str = None):
+    # Produkt -> release -> exakt version med antal enheter och APPID eller Manual Install
+    if not (product or app_id):
+        return {"error": "Must specify either product or app_id"}
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    distribution = await run_in_threadpool(version_distributions.find, snapshot, product, app_id)
+    if distribution is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown product"})
+    return with_etag(distribution, etag)
+
+@router.get("/versions/scan")
+async def download_version_scan(product: str = None, app_id: str = None, format: str = "csv"):
+    # Samma sektionerade uppställning som de manuella skanningarna i Documentation/, som csv eller xlsx
+    if not (product or app_id):
+        return {"error": "Must specify either product or app_id"}
+    if format not in ("csv", "xlsx"):
+        return {"error": "Unknown format, use csv or xlsx"}
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    distribution = await run_in_threadpool(version_distributions.find, snapshot, product, app_id)
+    if distribution is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown product"})
+
+    filename = scan_filename(distribution["product"], extension=format)
+    if format == "xlsx":
+        body, media_type = iter_scan_xlsx(distribution), XLSX_MEDIA_TYPE
+    else:
+        body, media_type = iter_scan_csv(distribution), CSV_MEDIA_TYPE
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/scans")
+async def list_scans(app_id: str = None, entra_group: str = None, product: str = None):
+    # Importerade skanningar, app_id matchar även APPID:n som skulle uppgraderas
+    return await run_in_threadpool(scan_archive.scans, app_id, entra_group, product)
+
+@router.get("/scans/{scan_id}")
+async def get_scan(scan_id: int):
+    scan = await run_in_threadpool(scan_archive.scan, scan_id)
+    if scan is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown scan"})
+    return scan
+
+@router.get("/scans/{scan_id}/compare")
+async def compare_scan_with_inventory(scan_id: int):
+    # Skanningens versioner och APPID:n mot versionsfördelningen i Intune just nu
+    scan = await run_in_threadpool(scan_archive.scan, scan_id)
+    if scan is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown scan"})
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+    distribution = await run_in_threadpool(version_distributions.find, snapshot, scan["product"], scan["app_id"])
+    return compare_scan(scan, distribution)
 
 @router.get("/generate-report")
 async def generate_report(app_id: str = None, app_name: str = None):
     if not (app_id or app_name):
         return {"error": "Must specify either app_id or app_name"}
 
-    devices = await search_applications(app_id, app_name)
-    
-    if not isinstance(devices, list) or len(devices) == 0:
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+
+    # Samma filter mot samma inventarieversion ger samma rapport, återanvänd den
+    report_id = report_key({"app_id": app_id, "app_name": app_name}, snapshot.key)
+    entry = report_catalog.lookup(report_id)
+    if entry is not None:
+        return _report_response(entry, cached=True)
+
+    job = await run_in_threadpool(_submit_report_job, snapshot, app_id, app_name)
+    if job is None:
+        return {"error": "No devices found with specified application"}
+
+    # Vänta en stund på jobbet, stora rapporter får hämtas via jobb-API:t
+    job = await _wait_for_job(job["id"], settings.REPORT_WAIT_SECONDS)
+    if job["status"] == DONE:
+        return _report_response(job["report"], cached=False)
+    if job["status"] == FAILED:
+        return {"error": f"Report generation failed: {job['error']}"}
+    return JSONResponse(status_code=202, content={
+        "message": "Report is being generated",
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/api/report-jobs/{job['id']}"
+    })
+
+@router.post("/report-jobs")
+async def submit_report_job(response: Response, app_id: str = None, app_name: str = None):
+    if not (app_id or app_name):
+        return {"error": "Must specify either app_id or app_name"}
+
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+
+    job = await run_in_threadpool(_submit_report_job, snapshot, app_id, app_name)
+    if job is None:
         return {"error": "No devices found with specified application"}
+    if job["status"] != DONE:
+        response.status_code = 202
+    return job
+
+@router.get("/report-jobs")
+async def list_report_jobs():
+    return {"jobs": report_jobs.list(), **report_jobs.stats()}
+
+@router.get("/report-jobs/{job_id}")
+async def get_report_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    job = await _wait_for_job(job_id, wait)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown report job"})
+    return job
+
+@router.get("/report-jobs/{job_id}/download")
+async def download_report_job(job_id: str):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown report job"})
+    if job["status"] != DONE:
+        return JSONResponse(status_code=409, content={"error": "Report is not ready", "status": job["status"]})
+    return _report_file(job["report"])
 
+def _submit_report_job(snapshot, app_id, app_name):
+    # Körs i en tråd. Samma rapport som redan finns eller väntar kostar bara en uppslagning,
+    # annars får processpoolen den kolumnära vyn och app-ID:n och bygger raderna själv.
+    report_id = report_key({"app_id": app_id, "app_name": app_name}, snapshot.key)
+    job = report_jobs.existing(report_id)
+    if job is not None:
+        return job
+    app_ids = app_index.find_app_ids(app_id, app_name)
+    if not app_ids:
+        return None
+    frame = fleet_analytics.frame(snapshot)
+    installs = frame.matching_installs(app_ids)
+    if not len(installs):
+        return None
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    app_identifier = app_id if app_id else "".join(c for c in app_name if c.isalnum())
-    filename = f"app_deployment_report_{app_identifier}_{timestamp}.xlsx"
-    file_path = REPORTS_DIR / filename
-    
-    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-        deployment_data = []
-        target_app = None
-        
-        for device in devices:
-            for app in device['installedApplications']:
-                if (app_id and app['id'] == app_id) or (app_name and app_name.lower() in app['name'].lower()):
-                    target_app = app
-                    deployment_data.append({
-                        # App-specifik information
-                        'Application Name': app['displayName'],
-                        'Version': app['version'],
-                        'Short Version': app['shortVersion'],
-                        'Publisher': app['publisher'],
-                        'Application Key': app['applicationKey'],
-                        'Install State': app['installState'],
-                        
-                        # Enhetsinformation
-                        'Device Name': device['deviceName'],
-                        'User': device['userDisplayName'],
-                        'Department': device['department'],
-                        'Platform': device['platform'],
-                        'OS Version': device['osVersion'],
-                        'Last Check-in': device['lastSyncDateTime']
-                    })
-                    break
-        
-        if deployment_data:
-            df = pd.DataFrame(deployment_data)
-            # Bara en flik: 'Deployment Status'
-            df.to_excel(writer, sheet_name='Deployment Status', index=False)
-    
+    filename = report_filename(app_id, app_name, timestamp=f"{timestamp}_{report_id[:8]}")
+    return report_jobs.submit(
+        report_id,
+        filename,
+        frame,
+        app_ids,
+        application=frame.apps.at[installs["app_id"].iloc[0], "displayName"],
+        filters={"app_id": app_id, "app_name": app_name},
+        snapshot_version=snapshot.version,
+    )
+
+async def _wait_for_job(job_id, timeout):
+    deadline = time.monotonic() + timeout
+    job = report_jobs.get(job_id)
+    while job is not None and job["status"] not in (DONE, FAILED) and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+        job = report_jobs.get(job_id)
+    return job
+
+def _report_response(entry, cached):
     return {
-        "message": "Application deployment report created successfully", 
-        "file": str(file_path),
-        "application": target_app['displayName'] if target_app else "Unknown"
+        "message": "Application deployment report created successfully",
+        "report_id": entry["id"],
+        "file": str(report_catalog.path(entry)),
+        "application": entry.get("application", "Unknown"),
+        "size": entry["size"],
+        "created": entry["created"],
+        "cached": cached,
+        "download_url": f"/api/reports/{entry['id']}/download"
     }
 
+@router.get("/generate-report/stream")
+async def stream_report(app_id: str = None, app_name: str = None):
+    if not (app_id or app_name):
+        return {"error": "Must specify either app_id or app_name"}
+
+    snapshot, error = await _load_inventory()
+    if error:
+        return error
+
+    table = await run_in_threadpool(_deployment_table, snapshot, app_id, app_name)
+    if table is None:
+        return {"error": "No devices found with specified application"}
+
+    # Filen skickas bit för bit medan den skapas
+    filename = report_filename(app_id, app_name)
+    return StreamingResponse(
+        iter_deployment_report(table),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/download-report")
-async def download_report():
+async def download_report(report_id: str = None):
     try:
-        # Uppdaterat filnamnsmönster för att matcha nya rapporten
-        files = list(REPORTS_DIR.glob("app_deployment_report_*.xlsx"))
-        if not files:
+        # Utan report_id lämnas den senast skapade rapporten ut, som tidigare
+        entry = report_catalog.lookup(report_id) if report_id else report_catalog.latest()
+        if entry is None:
             return {"error": "No report available"}
-        
-        latest_file = max(files, key=lambda x: x.stat().st_mtime)
-        return FileResponse(
-            path=latest_file,
-            filename=latest_file.name,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return _report_file(entry)
     except Exception as e:
         return {"error": f"Error accessing report: {str(e)}"}
 
+@router.get("/reports")
+async def list_reports():
+    return {"reports": report_catalog.list(), **report_catalog.stats()}
+
+@router.get("/reports/{report_id}/download")
+async def download_report_by_id(report_id: str):
+    entry = report_catalog.lookup(report_id)
+    if entry is None:
+        return Response(status_code=404)
+    return _report_file(entry)
+
+@router.delete("/reports/{report_id}")
+async def delete_report(report_id: str):
+    if not report_catalog.remove(report_id):
+        return Response(status_code=404)
+    return {"message": "Report deleted", "report_id": report_id}
+
+def _report_file(entry):
+    return FileResponse(
+        path=report_catalog.path(entry),
+        filename=entry["file"],
+        media_type=XLSX_MEDIA_TYPE
+    )
+
 @router.get("/search-applications")
-async def search_applications(app_id: str = None, app_name: str = None):
-    devices = intune_service.get_device_status()
-    if not isinstance(devices, list):
+async def search_applications(
+    request: Request,
+    app_id: str = None,
+    app_name: str = None,
+    fields: str = None,
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+):
+    # Samma sidindelning och fält som /device-status. matchedApplications är de appar på enheten
+    # som matchar sökningen, så att klienten slipper hämta hela installedApplications.
+    if not (app_id or app_name):
         return []
-    
-    filtered_devices = []
-    for device in devices:
-        apps = device.get('installedApplications', [])
-        if app_id:
-            if any(app['id'] == app_id for app in apps):
-                filtered_devices.append(device)
-        elif app_name:
-            if any(app_name.lower() in app['name'].lower() for app in apps):
-                filtered_devices.append(device)
-    
-    return filtered_devices 
\ No newline at end of file
+
+    snapshot, error = await _load_inventory()
+    if error:
+        return []
+    etag = snapshot_etag(snapshot, request)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(await run_in_threadpool(_search_devices, snapshot, app_id, app_name, fields, cursor, limit), etag)
+
+def _search_devices(snapshot, app_id=None, app_name=None, fields=None, cursor=None, limit=None):
+    app_ids = app_index.find_app_ids(app_id, app_name)
+    if not app_ids:
+        return []
+    ids = device_lists.get(
+        snapshot.key, ("search", tuple(app_ids)), lambda: set(fleet_analytics.frame(snapshot).device_ids(app_ids))
+    )
+    wanted = set(app_ids)
+    computed = {
+        "matchedApplications": lambda device: [app for app in device.get("installedApplications", []) if app["id"] in wanted]
+    }
+    return device_page_response(snapshot, ids, fields, cursor, limit, computed)
+
+def _deployment_table(snapshot, app_id=None, app_name=None):
+    # En rad per enhet med första matchande app, eller None om ingen enhet har appen
+    app_ids = app_index.find_app_ids(app_id, app_name)
+    if not app_ids:
+        return None
+    table = fleet_analytics.frame(snapshot).deployment_table(app_ids)
+    return table if len(table) else None
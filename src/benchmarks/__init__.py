@@ -0,0 +1 @@
+# Tom fil för att göra mappen till ett Python-paket
\ No newline at end of file
@@ -0,0 +1,230 @@
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from ..analytics.fleet_frame import FleetAnalytics
+from ..analytics.fleet_stats import FleetStats
+from ..analytics.version_distribution import build_distribution
+from ..reports.deployment_report import write_deployment_report
+from ..services.app_index import AppIndex
+from ..services.app_summary import AppSummary
+from ..services.intune_service import IntuneService, build_deployment_summary
+from ..services.inventory_sync import InventorySync
+from ..utils.fleet_generator import generate_fleet
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# En regression flaggas när median-tid eller minnestopp ökat mer än så här mot baslinjen
+DEFAULT_THRESHOLD = 0.2
+# Sökningarna som körs: en app som finns på nästan alla enheter och en smalare
+SEARCH_APP_ID = "17004"
+SEARCH_APP_NAME = "citrix"
+# Flottan genereras relativt den här tidpunkten
+FLEET_NOW = datetime(2025, 2, 7)
+
+
+class Fleet:
+    """Snapshot och de vyer routes.py bygger ovanpå den, för en syntetisk flotta."""
+
+    def __init__(self, num_devices, seed=0):
+        self.num_devices = num_devices
+        self.devices = generate_fleet(num_devices, seed=seed, now=FLEET_NOW)
+        self.inventory = InventorySync(service=None)
+        self.app_index = AppIndex()
+        self.app_summary = AppSummary()
+        self.analytics = FleetAnalytics()
+        self.service = IntuneService(demo_mode=False)
+
+    def build_snapshot(self):
+        self.inventory.restore({device["id"]: device for device in self.devices}, 1, datetime.now())
+        return self.inventory.snapshot()
+
+    def build_views(self):
+        snapshot = self.inventory.snapshot()
+        self.app_index.rebuild(snapshot)
+        self.app_summary.rebuild(snapshot)
+        self.analytics.apply_changes(snapshot, None)
+
+    def search(self, app_id=None, app_name=None):
+        # Samma steg som routes._search_devices
+        snapshot = self.inventory.snapshot()
+        app_ids = self.app_index.find_app_ids(app_id, app_name)
+        device_ids = self.analytics.frame(snapshot).device_ids(app_ids)
+        return [snapshot.get(device_id).to_dict() for device_id in device_ids]
+
+    def analyze(self):
+        total, compliant = self.analytics.frame(self.inventory.snapshot()).compliance_counts()
+        return build_deployment_summary(total, compliant)
+
+    def analyze_stream(self):
+        # Den strömmande analysen som den gamla /device-status-vägen använder
+        return self.service.analyze_deployment(iter(self.inventory.snapshot()))
+
+    def report(self, path):
+        table = self.analytics.frame(self.inventory.snapshot()).deployment_table(
+            self.app_index.find_app_ids(SEARCH_APP_ID)
+        )
+        write_deployment_report(path, table)
+        return Path(path).stat().st_size
+
+    def fleet_stats(self, name):
+        # Ny FleetStats varje gång så att det är uträkningen som mäts, inte cachen
+        snapshot = self.inventory.snapshot()
+        stats = FleetStats(self.analytics)
+        if name == "devices":
+            return stats.devices(snapshot)
+        if name == "sync_timeline":
+            return stats.sync_timeline(snapshot, "6h", 30, now=FLEET_NOW)
+        return stats.stale_devices(snapshot, FLEET_NOW - timedelta(hours=24))
+
+    def version_distribution(self):
+        # Alla produkter i ett svep, som efter varje synk
+        return build_distribution(self.analytics.frame(self.inventory.snapshot()))
+
+    def latest_applications(self):
+        # Home.get_latest_applications efter en ny inventarieversion: sammanställningen över alla
+        # enheter byggs om i en ny AppSummary, sorteringen av de färdiga apparna är en bråkdel av tiden
+        summary = AppSummary()
+        summary.rebuild(self.inventory.snapshot())
+        return summary.summary(sort="addedDate", descending=True, limit=5)
+
+
+def benchmarks(fleet, workdir):
+    # (namn, funktion) i körordning, bygget av snapshot och vyer måste gå först
+    return [
+        ("build_snapshot", fleet.build_snapshot),
+        ("build_views", fleet.build_views),
+        ("search_by_id", lambda: fleet.search(app_id=SEARCH_APP_ID)),
+        ("search_by_name", lambda: fleet.search(app_name=SEARCH_APP_NAME)),
+        ("analyze_deployment", fleet.analyze),
+        ("analyze_deployment_stream", fleet.analyze_stream),
+        ("generate_report_xlsx", lambda: fleet.report(Path(workdir) / f"report_{fleet.num_devices}.xlsx")),
+        ("latest_applications", fleet.latest_applications),
+        ("device_stats", lambda: fleet.fleet_stats("devices")),
+        ("sync_timeline", lambda: fleet.fleet_stats("sync_timeline")),
+        ("stale_devices_index", lambda: fleet.fleet_stats("stale_devices")),
+        ("version_distribution", fleet.version_distribution),
+    ]
+
+
+def measure(func, repeat):
+    """Kör func repeat gånger för tid och en gång under tracemalloc för minne.
+
+    Minnesmätningen görs separat eftersom tracemalloc gör anropen långsammare.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    gc.collect()
+    return {
+        "wall_s": {"min": min(timings), "median": statistics.median(timings), "runs": len(timings)},
+        "peak_bytes": peak,
+        "retained_bytes": current,
+        "net_blocks": sys.getallocatedblocks() - blocks_before,
+    }
+
+
+def run(sizes=None, repeat=3, seed=0, only=None, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes or DEFAULT_SIZES:
+            log(f"Generating {size} devices")
+            fleet = Fleet(size, seed)
+            for name, func in benchmarks(fleet, workdir):
+                if only and name not in only and not name.startswith("build_"):
+                    continue
+                # Bygg-stegen körs en gång, resten upprepas
+                result = measure(func, 1 if name.startswith("build_") else repeat)
+                result.update(name=name, devices=size)
+                results.append(result)
+                log(f"  {name:<28} {result['wall_s']['median'] * 1000:10.1f} ms  {result['peak_bytes'] / 1e6:9.1f} MB peak")
+            del fleet
+            gc.collect()
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Jämför två körningar och returnerar en rad per benchmark som finns i båda.
+
+    Tiden jämförs på median, minnet på toppen. regression är sant när någon
+    av dem ökat mer än threshold.
+    """
+    previous = {(r["name"], r["devices"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get((result["name"], result["devices"]))
+        if before is None:
+            continue
+        time_ratio = result["wall_s"]["median"] / before["wall_s"]["median"] if before["wall_s"]["median"] else 1.0
+        memory_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+        rows.append({
+            "name": result["name"],
+            "devices": result["devices"],
+            "time_ratio": time_ratio,
+            "memory_ratio": memory_ratio,
+            "regression": time_ratio > 1 + threshold or memory_ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mikrobenchmarks för sök, analys, rapport och startsidan")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="kör bara dessa benchmarks (byggstegen körs alltid)")
+    parser.add_argument("--out", help="spara resultatet som JSON")
+    parser.add_argument("--compare", help="baslinje (JSON från --out) att jämföra mot")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.repeat, args.seed, args.only)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Results saved to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} (threshold {args.threshold:.0%})")
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(f"  {row['name']:<28} {row['devices']:>8}  time x{row['time_ratio']:.2f}  memory x{row['memory_ratio']:.2f}  {flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import httpx
+
+DEFAULT_MIX = {"home": 0.6, "search": 0.3, "report": 0.1}
+# Rapportjobb pollas med samma väntetid som dashboarden använder
+REPORT_POLL_WAIT = 30
+# Samma fält och sidstorlekar som Home.py och sökningssidan begär
+TABLE_FIELDS = "deviceName,userDisplayName,department,osVersion,complianceState,lastSyncDateTime"
+SEARCH_FIELDS = "deviceName,userDisplayName,userPrincipalName,department,osVersion,osDescription,matchedApplications"
+TABLE_PAGE_SIZE = 100
+STALE_PAGE_SIZE = 25
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadRecorder:
+    """Samlar latens och status per endpoint och sessionstyp under en körning."""
+
+    def __init__(self):
+        self.samples = {}
+        self.sessions = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, seconds, ok):
+        self.samples.setdefault(endpoint, []).append((seconds, ok))
+
+    def session(self, kind, seconds, ok):
+        self.sessions.setdefault(kind, []).append((seconds, ok))
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @staticmethod
+    def _summary(samples, elapsed):
+        latencies = sorted(seconds for seconds, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 0.50) * 1000 if latencies else None,
+            "p95_ms": _percentile(latencies, 0.95) * 1000 if latencies else None,
+            "p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else None,
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+        }
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        all_samples = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            "elapsed_s": elapsed,
+            "total": self._summary(all_samples, elapsed),
+            "endpoints": {endpoint: self._summary(samples, elapsed) for endpoint, samples in sorted(self.samples.items())},
+            "sessions": {kind: self._summary(samples, elapsed) for kind, samples in sorted(self.sessions.items())},
+        }
+
+
+class SessionFailed(Exception):
+    pass
+
+
+class DashboardUser:
+    """En simulerad administratör som kör samma anrop som Streamlit-sidorna.
+
+    home motsvarar en omladdning av Home.py, search en sökning i
+    Application Search och report en rapportbeställning med pollning och
+    nedladdning som i dashboard.py.
+    """
+
+    def __init__(self, client, recorder, apps, rng, think_time=1.0):
+        self.client = client
+        self.recorder = recorder
+        self.apps = apps
+        self.rng = rng
+        self.think_time = think_time
+
+    async def request(self, endpoint, url, params=None):
+        # endpoint är sökvägsmallen som resultatet grupperas på
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(url, params=params)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        if not ok:
+            raise SessionFailed(endpoint)
+        return response
+
+    async def home(self):
+        await self.request("/api/applications/summary", "/api/applications/summary",
+                           {"sort": "addedDate", "order": "desc", "limit": 5})
+        await self.request("/api/analyze-deployment", "/api/analyze-deployment")
+        await self.request("/api/stats/devices", "/api/stats/devices")
+        await self.request("/api/stats/sync-timeline", "/api/stats/sync-timeline", {"bucket": "6h", "days": 7})
+        await self.request("/api/stale-devices", "/api/stale-devices",
+                           {"hours": 24, "fields": TABLE_FIELDS, "limit": STALE_PAGE_SIZE})
+        await self.request("/api/device-status", "/api/device-status", {"fields": TABLE_FIELDS, "limit": TABLE_PAGE_SIZE})
+
+    async def search(self):
+        params = self._app_params()
+        await self.request("/api/stats/install-status", "/api/stats/install-status", {**params, "by": "department"})
+        await self.request("/api/search-applications", "/api/search-applications",
+                           {**params, "fields": "matchedApplications", "limit": 1})
+        await self.request("/api/search-applications", "/api/search-applications",
+                           {**params, "fields": SEARCH_FIELDS, "limit": TABLE_PAGE_SIZE})
+
+    async def report(self):
+        response = await self.request("/api/generate-report", "/api/generate-report", self._app_params())
+        report = response.json()
+        report_id, job_id = report.get("report_id"), report.get("job_id")
+        while job_id:
+            response = await self.request("/api/report-jobs/{job_id}", f"/api/report-jobs/{job_id}",
+                                          {"wait": REPORT_POLL_WAIT})
+            job = response.json()
+            if job.get("status") == "failed":
+                raise SessionFailed("/api/report-jobs/{job_id}")
+            if job.get("status") == "done":
+                report_id, job_id = job["report"]["id"], None
+        if report_id:
+            await self.request("/api/reports/{report_id}/download", f"/api/reports/{report_id}/download")
+
+    def _app_params(self):
+        app = self.rng.choice(self.apps)
+        return {"app_id": app["appId"]} if self.rng.random() < 0.5 else {"app_name": app["name"]}
+
+    async def run(self, mix, deadline):
+        kinds, weights = zip(*mix.items())
+        while time.perf_counter() < deadline:
+            kind = self.rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            ok = True
+            try:
+                await getattr(self, kind)()
+            except SessionFailed:
+                ok = False
+            self.recorder.session(kind, time.perf_counter() - start, ok)
+            if self.think_time:
+                await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+
+
+async def run_load(base_url, users=10, duration=60.0, mix=None, think_time=1.0, timeout=120.0, seed=0):
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # Apparna att söka på hämtas från samma sammanställning som startsidan visar
+        response = await client.get("/api/applications/summary")
+        apps = response.json() if response.status_code == 200 else []
+        if not isinstance(apps, list) or not apps:
+            raise RuntimeError(f"No applications returned by {base_url}/api/applications/summary")
+
+        recorder = LoadRecorder()
+        deadline = time.perf_counter() + duration
+        dashboard_users = [
+            DashboardUser(client, recorder, apps, random.Random(seed + i), think_time) for i in range(users)
+        ]
+        await asyncio.gather(*(user.run(mix or DEFAULT_MIX, deadline) for user in dashboard_users))
+        recorder.stop()
+    return recorder.report()
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown session type: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def _print_report(report):
+    print(f"\n{'endpoint':<36} {'reqs':>7} {'err%':>6} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for endpoint, row in rows:
+        if not row["requests"]:
+            continue
+        print(f"{endpoint:<36} {row['requests']:>7} {row['error_rate'] * 100:>5.1f}% {row['throughput_rps']:>8.1f} "
+              f"{row['p50_ms']:>7.0f}ms {row['p95_ms']:>7.0f}ms {row['p99_ms']:>7.0f}ms")
+    print(f"\n{'session':<36} {'count':>7} {'err%':>6} {'p50':>9} {'p95':>9}")
+    for kind, row in report["sessions"].items():
+        print(f"{kind:<36} {row['requests']:>7} {row['error_rate'] * 100:>5.1f}% {row['p50_ms']:>7.0f}ms {row['p95_ms']:>7.0f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lasttest som simulerar samtidiga dashboard-användare mot API:t")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60.0, help="sekunder")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX, help="t.ex. home=0.6,search=0.3,report=0.1")
+    parser.add_argument("--think-time", type=float, default=1.0, help="medeltid i sekunder mellan sessioner")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="spara resultatet som JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args.base_url, args.users, args.duration, args.mix, args.think_time, args.timeout, args.seed))
+    report["meta"] = {
+        "created": datetime.now().isoformat(),
+        "base_url": args.base_url,
+        "users": args.users,
+        "duration": args.duration,
+        "mix": args.mix,
+        "think_time": args.think_time,
+    }
+    _print_report(report)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
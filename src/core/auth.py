@@ -1,14 +1,131 @@
+import threading
+import time
 import requests
 from .config import settings
 
+
+class TokenProvider:
+    """Håller en access token i minnet tills strax innan den går ut.
+
+    Anropare som kommer in medan en token hämtas väntar på samma hämtning
+    i stället för att göra egna anrop mot token-endpointen. När tokenen
+    närmar sig utgång (inom refresh_margin sekunder) förnyas den i en
+    bakgrundstråd medan den gamla tokenen fortsätter att lämnas ut.
+    """
+
+    def __init__(self, token_url=None, client_id=None, client_secret=None,
+                 scope=None, refresh_margin=None, session=None):
+        self.token_url = token_url or settings.TOKEN_URL
+        self.client_id = client_id or settings.CLIENT_ID
+        self.client_secret = client_secret or settings.CLIENT_SECRET
+        self.scope = scope or settings.SCOPE
+        self.refresh_margin = settings.TOKEN_REFRESH_MARGIN if refresh_margin is None else refresh_margin
+        self._session = session or requests.Session()
+
+        self._lock = threading.Lock()
+        self._refreshed = threading.Condition(self._lock)
+        self._token = None
+        self._expires_at = 0.0
+        self._refreshing = False
+
+        self.hits = 0
+        self.misses = 0
+        self.peeks = 0
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    def get_token(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._token and now < self._expires_at:
+                self.hits += 1
+                if now >= self._expires_at - self.refresh_margin and not self._refreshing:
+                    # Tokenen är fortfarande giltig, förnya den i bakgrunden
+                    self._refreshing = True
+                    self.background_refreshes += 1
+                    threading.Thread(target=self._refresh, daemon=True).start()
+                return self._token
+
+            self.misses += 1
+            # Vänta på en pågående hämtning i stället för att starta en egen
+            while self._refreshing:
+                self._refreshed.wait()
+            if self._token and time.monotonic() < self._expires_at:
+                return self._token
+            self._refreshing = True
+
+        return self._refresh()
+
+    def peek(self):
+        # Returnerar en giltig token utan att blockera, annars None. Räknas inte som träff i hits,
+        # en miss följs av get_token som räknar själv.
+        with self._lock:
+            if self._token and time.monotonic() < self._expires_at - self.refresh_margin:
+                self.peeks += 1
+                return self._token
+        return None
+
+    def invalidate(self, token=None):
+        # Graph svarade 401 med token. Bara den tokenen kastas, en som redan förnyats behålls.
+        with self._lock:
+            if token is not None and token != self._token:
+                return
+            self._token = None
+            self._expires_at = 0.0
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            remaining = max(0.0, self._expires_at - time.monotonic()) if self._token else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "peeks": self.peeks,
+                "refreshes": self.refreshes,
+                "background_refreshes": self.background_refreshes,
+                "failures": self.failures,
+                "invalidations": self.invalidations,
+                "expires_in": round(remaining),
+            }
+
+    def _refresh(self):
+        try:
+            token, expires_in = self._fetch()
+        except (requests.RequestException, ValueError):
+            token, expires_in = None, 0
+
+        with self._lock:
+            self.refreshes += 1
+            if token:
+                self._token = token
+                self._expires_at = time.monotonic() + expires_in
+            else:
+                self.failures += 1
+            self._refreshing = False
+            self._refreshed.notify_all()
+            # Vid misslyckad bakgrundsförnyelse lämnas den gamla tokenen ut tills den gått ut
+            if self._token and time.monotonic() < self._expires_at:
+                return self._token
+            return None
+
+    def _fetch(self):
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "scope": self.scope
+        }
+        response = self._session.post(self.token_url, data=data)
+        if response.status_code != 200:
+            return None, 0
+        body = response.json()
+        return body.get("access_token"), int(body.get("expires_in", 3599))
+
+
+token_provider = TokenProvider()
+
+
 def get_access_token():
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": settings.CLIENT_ID,
-        "client_secret": settings.CLIENT_SECRET,
-        "scope": settings.SCOPE
-    }
-    response = requests.post(settings.TOKEN_URL, data=data)
-    if response.status_code == 200:
-        return response.json().get("access_token")
-    return None 
\ No newline at end of file
+    return token_provider.get_token()
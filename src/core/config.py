@@ -8,6 +8,35 @@ class Settings:
     CLIENT_ID: str = os.getenv("CLIENT_ID")
     CLIENT_SECRET: str = os.getenv("CLIENT_SECRET")
     SCOPE: str = "https://graph.microsoft.com/.default"
-    TOKEN_URL: str = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
+    # TOKEN_URL och GRAPH_URL kan pekas om, t.ex. mot src.simulator.graph_server
+    TOKEN_URL: str = os.getenv("TOKEN_URL", f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token")
+    # Förnya token så här många sekunder innan den går ut
+    TOKEN_REFRESH_MARGIN: int = int(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+    GRAPH_URL: str = os.getenv("GRAPH_URL", "https://graph.microsoft.com/v1.0")
+    # Antal enheter per sida när managedDevices hämtas ($top)
+    GRAPH_PAGE_SIZE: int = int(os.getenv("GRAPH_PAGE_SIZE", "500"))
+    # Max antal samtidiga Graph-anrop från den asynkrona klienten
+    GRAPH_MAX_CONCURRENCY: int = int(os.getenv("GRAPH_MAX_CONCURRENCY", "8"))
+    # Antal nya försök när Graph throttlar (429/503/504) innan anropet ger upp
+    GRAPH_MAX_RETRIES: int = int(os.getenv("GRAPH_MAX_RETRIES", "5"))
+    # Hur gammal inventariesnapshoten får vara (sekunder) innan en delta-synk görs vid anrop
+    INVENTORY_MAX_AGE: int = int(os.getenv("INVENTORY_MAX_AGE", "300"))
+    # Intervall i minuter för schemalagd delta-synk
+    INVENTORY_SYNC_INTERVAL: int = int(os.getenv("INVENTORY_SYNC_INTERVAL", "15"))
+    # SQLite-fil för det lokala inventariet
+    INVENTORY_DB: str = os.getenv("INVENTORY_DB", "data/inventory.db")
+    # SQLite-fil för utrullningshistoriken, och hur länge rå- och timvärden sparas
+    HISTORY_DB: str = os.getenv("HISTORY_DB", "data/history.db")
+    HISTORY_RAW_HOURS: int = int(os.getenv("HISTORY_RAW_HOURS", "48"))
+    HISTORY_HOURLY_DAYS: int = int(os.getenv("HISTORY_HOURLY_DAYS", "14"))
+    # Katalog med utrullningsskanningar (*App Scan*.csv) som importeras varje timme, tom stänger av importen
+    SCAN_IMPORT_DIR: str = os.getenv("SCAN_IMPORT_DIR", "")
+    # Rapportcache: största totala storlek i MB och högsta ålder i dagar
+    REPORTS_MAX_MB: int = int(os.getenv("REPORTS_MAX_MB", "500"))
+    REPORTS_MAX_AGE_DAYS: int = int(os.getenv("REPORTS_MAX_AGE_DAYS", "7"))
+    # Antal processer för rapportrendering, 0 betyder antal kärnor minus en
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", "0"))
+    # Hur länge /generate-report väntar på jobbet innan det svarar med jobb-ID
+    REPORT_WAIT_SECONDS: float = float(os.getenv("REPORT_WAIT_SECONDS", "30"))
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
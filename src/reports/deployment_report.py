@@ -0,0 +1,61 @@
+import pandas as pd
+from datetime import datetime
+from .xlsx_stream import iter_xlsx, write_xlsx
+
+SHEET_NAME = "Deployment Status"
+
+# (kolumnrubrik, fält) i samma ordning som rapporten alltid haft.
+# Fälten är kolumnnamn i FleetFrame.deployment_table.
+REPORT_COLUMNS = [
+    # App-specifik information
+    ("Application Name", "displayName"),
+    ("Version", "version"),
+    ("Short Version", "shortVersion"),
+    ("Publisher", "publisher"),
+    ("Application Key", "applicationKey"),
+    ("Install State", "installState"),
+
+    # Enhetsinformation
+    ("Device Name", "deviceName"),
+    ("User", "userDisplayName"),
+    ("Department", "department"),
+    ("Platform", "platform"),
+    ("OS Version", "osVersion"),
+    ("Last Check-in", "lastSyncDateTime"),
+]
+
+REPORT_HEADER = [title for title, _ in REPORT_COLUMNS]
+
+
+def report_filename(app_id=None, app_name=None, timestamp=None):
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    app_identifier = app_id if app_id else "".join(c for c in app_name if c.isalnum())
+    return f"app_deployment_report_{app_identifier}_{timestamp}.xlsx"
+
+
+# Rader som görs om till Python-objekt åt gången, tabellen i övrigt ligger kvar kolumnärt
+ROW_CHUNK = 5000
+
+
+def deployment_rows(table, chunk_size=ROW_CHUNK):
+    # table är FleetFrame.deployment_table, en rad per enhet med den sökta appen
+    columns = [field for _, field in REPORT_COLUMNS]
+    for start in range(0, len(table), chunk_size):
+        chunk = table.iloc[start:start + chunk_size]
+        data = chunk[columns].astype(object)
+        # FleetFrame lagrar UTC utan tidszon, skriv tillbaka Z som i Graphs ISO-strängar
+        data["lastSyncDateTime"] = [
+            value.isoformat() + "Z" if isinstance(value, pd.Timestamp) else None
+            for value in chunk["lastSyncDateTime"]
+        ]
+        data = data.where(data.notna(), None)
+        for row in data.itertuples(index=False, name=None):
+            yield list(row)
+
+
+def iter_deployment_report(table):
+    return iter_xlsx(SHEET_NAME, REPORT_HEADER, deployment_rows(table))
+
+
+def write_deployment_report(path, table):
+    write_xlsx(path, SHEET_NAME, REPORT_HEADER, deployment_rows(table))
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+CATALOG_FILE = "catalog.json"
+# Filter som AppIndex matchar utan hänsyn till skiftläge, övriga jämförs exakt
+CASE_INSENSITIVE_FILTERS = ("app_name",)
+
+
+def report_key(filters, snapshot_key):
+    # Samma filter mot samma inventarieversion ger alltid samma rapport-ID
+    normalized = {
+        k: (v.casefold() if k in CASE_INSENSITIVE_FILTERS and isinstance(v, str) else v)
+        for k, v in sorted(filters.items()) if v
+    }
+    payload = json.dumps({"filters": normalized, "snapshot": snapshot_key}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+class ReportCatalog:
+    """Katalog över genererade rapporter i reports-mappen.
+
+    Varje rapport identifieras av en nyckel byggd på filter och
+    inventarieversion, så en upprepad beställning mot oförändrat inventarie
+    returnerar den befintliga filen. Katalogen sparas som JSON bredvid
+    filerna och städas efter ålder och total storlek.
+    """
+
+    def __init__(self, directory, max_bytes=None, max_age=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def lookup(self, report_id):
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None:
+                return None
+            if not (self.directory / entry["file"]).exists():
+                # Filen har tagits bort utanför katalogen
+                del self._entries[report_id]
+                self._save()
+                return None
+            return dict(entry)
+
+    def path(self, entry):
+        return self.directory / entry["file"]
+
+    def list(self):
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: entry["created"], reverse=True)
+
+    def latest(self):
+        entries = self.list()
+        return entries[0] if entries else None
+
+    def add(self, report_id, filename, write, **metadata):
+        """Skriver rapporten via write(path) och registrerar den i katalogen.
+
+        Filen skrivs först till en temporär fil och byter namn när den är klar,
+        så att en halvfärdig rapport aldrig kan laddas ner.
+        """
+        final_path = self.directory / filename
+        tmp_path = self.directory / f".{filename}.{report_id}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, final_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        entry = {
+            "id": report_id,
+            "file": filename,
+            "size": final_path.stat().st_size,
+            "created": datetime.now().isoformat(),
+            **metadata,
+        }
+        with self._lock:
+            self._entries[report_id] = entry
+            self._evict()
+            self._save()
+        return dict(entry)
+
+    def remove(self, report_id):
+        with self._lock:
+            entry = self._entries.pop(report_id, None)
+            if entry is not None:
+                self._delete_file(entry)
+                self._save()
+        return entry is not None
+
+    def evict(self):
+        with self._lock:
+            removed = self._evict()
+            self._save()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "count": len(self._entries),
+                "total_bytes": sum(entry["size"] for entry in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+            }
+
+    def _evict(self):
+        removed = []
+        entries = sorted(self._entries.values(), key=lambda entry: entry["created"])
+        if self.max_age is not None:
+            cutoff = datetime.fromtimestamp(time.time() - self.max_age).isoformat()
+            for entry in [entry for entry in entries if entry["created"] < cutoff]:
+                removed.append(entry)
+                entries.remove(entry)
+        if self.max_bytes is not None:
+            total = sum(entry["size"] for entry in entries)
+            # Äldsta rapporterna tas bort först, den senaste behålls alltid
+            while entries[:-1] and total > self.max_bytes:
+                entry = entries.pop(0)
+                total -= entry["size"]
+                removed.append(entry)
+        for entry in removed:
+            del self._entries[entry["id"]]
+            self._delete_file(entry)
+        return [entry["id"] for entry in removed]
+
+    def _delete_file(self, entry):
+        try:
+            (self.directory / entry["file"]).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _load(self):
+        try:
+            with open(self.directory / CATALOG_FILE, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return {entry["id"]: entry for entry in entries if (self.directory / entry["file"]).exists()}
+
+    def _save(self):
+        tmp_path = self.directory / f".{CATALOG_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.values()), f, indent=2)
+        os.replace(tmp_path, self.directory / CATALOG_FILE)
@@ -0,0 +1,222 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+from .deployment_report import write_deployment_report
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+FRAMES_DIR = ".frames"
+
+# Senast inlästa FleetFrame i arbetsprocessen, flera jobb mot samma version läser filen en gång
+_worker_frame = {}
+
+
+def _load_frame(frame_path):
+    frame = _worker_frame.get(frame_path)
+    if frame is None:
+        _worker_frame.clear()
+        frame = _worker_frame[frame_path] = pd.read_pickle(frame_path)
+    return frame
+
+
+def _render(path, frame_path, app_ids):
+    # Körs i en arbetsprocess: bygger raderna ur den sparade FleetFrame och skriver xlsx,
+    # så varken raderna eller serialiseringen belastar API-processen
+    write_deployment_report(path, _load_frame(frame_path).deployment_table(app_ids))
+    return os.path.getsize(path)
+
+
+class ReportJobQueue:
+    """Kö för rapportjobb som renderas i en begränsad processpool.
+
+    Jobb-ID är samma som rapport-ID i ReportCatalog, så flera beställningar
+    av samma rapport slås ihop till ett jobb och en färdig rapport ger
+    direkt ett klart jobb. Arbetsprocesserna får bara sökvägen till en
+    sparad FleetFrame och app-ID:n, och bygger raderna själva. Ramen sparas
+    en gång per inventarieversion under reports/.frames.
+    """
+
+    def __init__(self, catalog, max_workers=None, keep_finished=3600):
+        self.catalog = catalog
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.keep_finished = keep_finished
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.submitted = 0
+        self.coalesced = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn i stället för fork, API-processen har trådar (uvicorn, schemaläggaren) som kan hålla lås
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._public(job)
+        # Jobbet kan ha rensats men rapporten finns kvar i katalogen
+        entry = self.catalog.lookup(job_id)
+        return self._done_job(entry) if entry else None
+
+    def list(self):
+        with self._lock:
+            return sorted((self._public(job) for job in self._jobs.values()), key=lambda job: job["created"], reverse=True)
+
+    def stats(self):
+        with self._lock:
+            by_status = {}
+            for job in self._jobs.values():
+                status = self._public(job)["status"]
+                by_status[status] = by_status.get(status, 0) + 1
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "by_status": by_status,
+            }
+
+    def existing(self, job_id):
+        # Färdig rapport eller jobb som redan väntar, kontrolleras innan något annat görs
+        entry = self.catalog.lookup(job_id)
+        if entry is not None:
+            return self._done_job(entry)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == QUEUED:
+                self.coalesced += 1
+                return self._public(job)
+        return None
+
+    def submit(self, job_id, filename, frame, app_ids, **metadata):
+        """Lägger till ett rapportjobb, eller returnerar det befintliga för samma rapport.
+
+        frame är FleetFrame för inventarieversionen och app_ids apparna som
+        rapporten gäller. Raderna byggs i arbetsprocessen.
+        """
+        job = self.existing(job_id)
+        if job is not None:
+            return job
+
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is not None and job["status"] == QUEUED:
+                self.coalesced += 1
+                return self._public(job)
+            job = self._jobs[job_id] = {
+                "id": job_id,
+                "status": QUEUED,
+                "created": datetime.now().isoformat(),
+                "finished": None,
+                "error": None,
+                "report": None,
+                "application": metadata.get("application"),
+                "_frame_key": frame.key,
+            }
+            self.submitted += 1
+
+        try:
+            frame_path = self._export_frame(frame)
+            rendered = self.catalog.directory / f".job-{job_id}.xlsx"
+            future = self.executor.submit(_render, str(rendered), str(frame_path), list(app_ids))
+        except Exception as e:
+            self._finish(job_id, error=str(e))
+            return self.get(job_id)
+        with self._lock:
+            self._jobs[job_id]["_future"] = future
+        future.add_done_callback(lambda f: self._completed(f, job_id, filename, rendered, metadata))
+        return self.get(job_id)
+
+    def _completed(self, future, job_id, filename, rendered, metadata):
+        try:
+            future.result()
+            entry = self.catalog.add(job_id, filename, lambda path: os.replace(rendered, path), **metadata)
+        except Exception as e:
+            if rendered.exists():
+                rendered.unlink()
+            self._finish(job_id, error=str(e) or e.__class__.__name__)
+        else:
+            self._finish(job_id, report=entry)
+
+    def _finish(self, job_id, report=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = FAILED if error else DONE
+            job["error"] = error
+            job["report"] = report
+            job["finished"] = datetime.now().isoformat()
+            job["_finished_at"] = time.monotonic()
+            job.pop("_future", None)
+
+    def _export_frame(self, frame):
+        # En fil per inventarieversion, äldre filer tas bort när inget väntande jobb använder dem
+        directory = self.catalog.directory / FRAMES_DIR
+        directory.mkdir(exist_ok=True)
+        path = directory / f"{frame.key}.pkl"
+        tmp_path = None
+        if not path.exists():
+            # Serialiseringen tar sekunder för stora flottor och görs utan låset, så submit, status
+            # och list inte väntar. Samtidiga jobb mot samma version skriver var sin temporärfil.
+            tmp_path = directory / f".{frame.key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                pd.to_pickle(frame, tmp_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+        with self._lock:
+            if tmp_path is not None:
+                if path.exists():
+                    tmp_path.unlink()
+                else:
+                    os.replace(tmp_path, path)
+            in_use = {job["_frame_key"] for job in self._jobs.values() if job["status"] == QUEUED} | {frame.key}
+            for old in directory.glob("*.pkl"):
+                if old.stem not in in_use:
+                    old.unlink(missing_ok=True)
+        return path
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.keep_finished
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.get("_finished_at", cutoff + 1) < cutoff]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _public(job):
+        public = {k: v for k, v in job.items() if not k.startswith("_")}
+        future = job.get("_future")
+        if public["status"] == QUEUED and future is not None and future.running():
+            public["status"] = RUNNING
+        return public
+
+    @staticmethod
+    def _done_job(entry):
+        return {
+            "id": entry["id"],
+            "status": DONE,
+            "created": entry["created"],
+            "finished": entry["created"],
+            "error": None,
+            "report": entry,
+            "application": entry.get("application"),
+        }
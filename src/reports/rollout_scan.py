@@ -0,0 +1,202 @@
+import csv
+import io
+import re
+from datetime import datetime
+from pathlib import Path
+from ..analytics.version_distribution import MANUAL_INSTALL, product_name
+from .xlsx_stream import iter_xlsx
+
+SCAN_HEADER = ["ProductName & Version", "Device Count", "APPID"]
+GRAND_TOTAL = "Grand Total"
+COMMENTS = "Comments/Instructions"
+CSV_MEDIA_TYPE = "text/csv"
+
+_APPID_LINE = re.compile(r"APPID:\s*(\d+)\s*(.*)$")
+_ENTRA_GROUP = re.compile(r"Entra Group\s*:\s*(.+)$", re.IGNORECASE)
+_CREATED = re.compile(r"created on\s+(\d{1,2})\.(\d{1,2})\.(\d{4})", re.IGNORECASE)
+_FILE_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_TICKETS = re.compile(r"\b(CRQ\d+|INC\d+)\b")
+_VERSION = re.compile(r"^\d+(?:\.\d+)+$")
+_ERROR_COUNT = re.compile(r"Error counts?\s*:?\s*-?\s*(\d+)", re.IGNORECASE)
+
+
+def scan_filename(product, created=None, extension="csv"):
+    # Samma namn som de manuella skanningarna, t.ex. "CitrixWorkspace App Scan_2025-02-07.csv"
+    created = created or datetime.now()
+    name = "".join(c for c in product if c.isalnum())
+    return f"{name} App Scan_{created:%Y-%m-%d}.{extension}"
+
+
+def _group_line(application):
+    groups = ", ".join(application.get("entraGroups") or [])
+    return f"Entra Group : {groups}" if groups else None
+
+
+def scan_rows(distribution, created=None, comments=None):
+    """Rader i samma uppställning som Documentation/*App Scan*.csv, tre kolumner per rad.
+
+    Först ett block med APPID och Entra-grupp för releasen som rullas ut och
+    äldre APPID:n som ska uppgraderas, sedan en sektion per release med
+    antal enheter per exakt version och om versionen kom via APPID eller
+    manuell installation, Grand Total och eventuella kommentarer.
+    """
+    created = created or datetime.now()
+    target = distribution.get("target")
+    if target:
+        lines = [f"Rollout of APPID:{target['app_id']} {target['name']}", _group_line(target)]
+        lines.append(f"Rollout List created on {created:%d.%m.%Y}")
+        yield ["\n".join(line for line in lines if line), None, None]
+        yield [None, None, None]
+
+    older = [app for app in distribution.get("applications", []) if target and app["app_id"] != target["app_id"]]
+    if older:
+        lines = ["Upgrade Information"]
+        for application in older:
+            lines.append(f"APPID:{application['app_id']} {application['name']}")
+            lines.append(_group_line(application))
+        yield ["\n".join(line for line in lines if line), None, None]
+        yield [None, None, None]
+
+    yield list(SCAN_HEADER)
+    for section in distribution["sections"]:
+        yield [section["release"], None, None]
+        for version in section["versions"]:
+            yield [version["version"], version["devices"], version["source"]]
+    yield [GRAND_TOTAL, distribution["grand_total"], None]
+
+    if comments:
+        yield [COMMENTS, None, None]
+        for comment in comments:
+            yield [comment, None, None]
+
+
+def iter_scan_csv(distribution, created=None, comments=None):
+    # Semikolonseparerad som skanningarna, celler med radbrytningar citeras
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    for row in scan_rows(distribution, created, comments):
+        writer.writerow(["" if value is None else value for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_scan_xlsx(distribution, created=None, comments=None):
+    rows = scan_rows(distribution, created, comments)
+    header = next(rows)
+    return iter_xlsx(distribution["product"], header, rows)
+
+
+def _parse_rollout_block(text, scan):
+    for line in (line.strip() for line in text.splitlines()):
+        if not line:
+            continue
+        scan["tickets"].extend(ticket for ticket in _TICKETS.findall(line) if ticket not in scan["tickets"])
+        appid = _APPID_LINE.search(line)
+        group = _ENTRA_GROUP.search(line)
+        created = _CREATED.search(line)
+        if appid and scan["app_id"] is None:
+            scan["app_id"], scan["name"] = appid.group(1), appid.group(2).strip() or None
+        elif group:
+            scan["entra_group"] = scan["entra_group"] or group.group(1).strip()
+        elif created:
+            day, month, year = (int(part) for part in created.groups())
+            scan["created"] = datetime(year, month, day).date().isoformat()
+        elif scan["app_id"] is not None and scan["package"] is None and " " not in line:
+            # Paketnamnet står på egen rad under APPID-raden, t.ex. COM-Citrix-CitrixWorkspaceCU1-x86-2402-MUI
+            scan["package"] = line
+
+
+def _parse_upgrade_block(text, scan):
+    # APPID-rader följda av sin Entra-grupp, _RETIRED betyder att gruppen är avvecklad
+    for line in (line.strip() for line in text.splitlines()[1:]):
+        appid = _APPID_LINE.search(line)
+        group = _ENTRA_GROUP.search(line)
+        if appid:
+            scan["upgrades"].append({
+                "app_id": appid.group(1), "name": appid.group(2).strip() or None, "entra_group": None, "retired": False,
+            })
+        elif group and scan["upgrades"]:
+            value = group.group(1).strip()
+            scan["upgrades"][-1]["entra_group"] = value
+            scan["upgrades"][-1]["retired"] = value.upper().endswith("RETIRED")
+
+
+def _count(value):
+    try:
+        return int(str(value).strip().replace(" ", ""))
+    except ValueError:
+        return None
+
+
+def parse_scan(rows, name=None):
+    """Läser en skanning som scan_rows skriver den, eller som de manuella i Documentation/.
+
+    rows är csv-rader (listor), t.ex. från csv.reader, och läses en i taget.
+    Returnerar en dict med rollout-APPID, Entra-grupp, ärendenummer,
+    datum, uppgraderingsinformation, en rad per version med antal och
+    APPID (None för manuella installationer), Grand Total och kommentarer.
+    """
+    scan = {
+        "product": None, "app_id": None, "name": None, "package": None, "entra_group": None,
+        "created": None, "tickets": [], "upgrades": [], "versions": [], "grand_total": None,
+        "comments": [], "error_count": None,
+    }
+    section = None
+    mode = "header"
+    for row in rows:
+        cells = [(cell or "").strip() for cell in row] + ["", "", ""]
+        first, count, source = cells[0], cells[1], cells[2]
+        if not first:
+            continue
+        if mode == "header":
+            if first.lower() == SCAN_HEADER[0].lower():
+                mode = "table"
+            elif first.lower().startswith("upgrade information"):
+                _parse_upgrade_block(first, scan)
+            else:
+                _parse_rollout_block(first, scan)
+        elif mode == "table":
+            if first.lower() == GRAND_TOTAL.lower():
+                scan["grand_total"] = _count(count)
+                mode = "trailer"
+            elif _VERSION.match(first):
+                appid = _APPID_LINE.search(source)
+                scan["versions"].append({
+                    "release": section,
+                    "version": first,
+                    "devices": _count(count) or 0,
+                    "app_id": appid.group(1) if appid else None,
+                    "source": f"APPID:{appid.group(1)}" if appid else (source or MANUAL_INSTALL),
+                })
+            else:
+                section = first
+        else:
+            errors = _ERROR_COUNT.search(first)
+            if errors:
+                scan["error_count"] = int(errors.group(1))
+            elif first.lower() != COMMENTS.lower():
+                scan["comments"].append(first)
+
+    if mode == "header":
+        raise ValueError("Not a rollout scan, no version table found")
+    scan["product"] = product_name(
+        scan["name"] or (scan["versions"][0]["release"] if scan["versions"] and scan["versions"][0]["release"] else "")
+    ) or (name.split(" App Scan")[0] if name else None)
+    if scan["created"] is None and name:
+        date = _FILE_DATE.search(name)
+        if date:
+            scan["created"] = "-".join(date.groups())
+    return scan
+
+
+def read_scan(path):
+    # Filerna kommer från Excel, antingen som UTF-8 (med eller utan BOM) eller Windows-1252
+    path = Path(path)
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            with open(path, encoding=encoding, newline="") as f:
+                return parse_scan(csv.reader(f, delimiter=";"), path.name)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Unsupported encoding in {path.name}")
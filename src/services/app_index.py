@@ -0,0 +1,103 @@
+import threading
+
+
+def normalize_name(name):
+    return (name or "").casefold()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AppIndex:
+    """Inverterat index över installerade appar i inventariesnapshoten.
+
+    Håller app-ID -> enhets-ID, för att veta när sista enheten med en app
+    försvinner, samt ett trigramindex över normaliserade
+    appnamn så att sökning på namn-delsträng inte behöver gå igenom alla
+    enheter. Uppdateras inkrementellt via InventorySync.subscribe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._app_devices = {}
+        self._device_apps = {}
+        self._app_names = {}
+        self._trigrams = {}
+        self.version = 0
+
+    def rebuild(self, snapshot):
+        with self._lock:
+            self._app_devices, self._device_apps = {}, {}
+            self._app_names, self._trigrams = {}, {}
+            for device in snapshot:
+                self._add_device(device)
+            self.version = snapshot.version
+
+    def apply_changes(self, snapshot, changes):
+        if changes.full:
+            self.rebuild(snapshot)
+            return
+        with self._lock:
+            for device_id in changes.removed:
+                self._remove_device(device_id)
+            for device in changes.upserted.values():
+                self._remove_device(device["id"])
+                self._add_device(device)
+            self.version = snapshot.version
+
+    def find_app_ids(self, app_id=None, app_name=None):
+        with self._lock:
+            if app_id:
+                return [app_id] if app_id in self._app_devices else []
+            if not app_name:
+                return []
+            needle = normalize_name(app_name)
+            if len(needle) < 3:
+                candidates = self._app_names
+            else:
+                # Kandidater är appar som har alla trigram i söksträngen
+                postings = sorted((self._trigrams.get(gram, set()) for gram in trigrams(needle)), key=len)
+                candidates = set.intersection(*postings) if postings else set()
+            return sorted(app for app in candidates if needle in self._app_names[app])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "apps": len(self._app_devices),
+                "devices": len(self._device_apps),
+                "trigrams": len(self._trigrams),
+            }
+
+    def _add_device(self, device):
+        app_ids = set()
+        for app in device.get("installedApplications", []):
+            app_id = app["id"]
+            app_ids.add(app_id)
+            devices = self._app_devices.get(app_id)
+            if devices is None:
+                devices = self._app_devices[app_id] = set()
+                name = normalize_name(app.get("name") or app.get("displayName"))
+                self._app_names[app_id] = name
+                for gram in trigrams(name):
+                    self._trigrams.setdefault(gram, set()).add(app_id)
+            devices.add(device["id"])
+        if app_ids:
+            self._device_apps[device["id"]] = app_ids
+
+    def _remove_device(self, device_id):
+        for app_id in self._device_apps.pop(device_id, ()):
+            devices = self._app_devices.get(app_id)
+            if devices is None:
+                continue
+            devices.discard(device_id)
+            if not devices:
+                # Sista enheten med appen försvann, ta bort den ur namnindexet
+                del self._app_devices[app_id]
+                for gram in trigrams(self._app_names.pop(app_id, "")):
+                    grams = self._trigrams.get(gram)
+                    if grams is not None:
+                        grams.discard(app_id)
+                        if not grams:
+                            del self._trigrams[gram]
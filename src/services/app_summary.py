@@ -0,0 +1,102 @@
+import threading
+
+INSTALLED_STATES = {"Installed"}
+FAILED_STATES = {"Failed", "Error", "Uninstall Failed"}
+
+SORT_KEYS = {
+    "addedDate": lambda app: app["addedDate"] or "",
+    "name": lambda app: (app["name"] or "").casefold(),
+    "successRate": lambda app: app["success_rate"],
+    "total": lambda app: app["total"],
+    "failed": lambda app: app["status_counts"]["Failed"],
+}
+
+
+class AppSummary:
+    """Installationsstatus per app, summerad över hela flottan.
+
+    Räknarna hålls uppdaterade inkrementellt: varje enhets bidrag sparas så
+    att en ändrad eller borttagen enhet kan dras av utan att räkna om allt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._apps = {}
+        self._contributions = {}
+        self.version = 0
+
+    def rebuild(self, snapshot):
+        with self._lock:
+            self._apps, self._contributions = {}, {}
+            for device in snapshot:
+                self._add_device(device)
+            self.version = snapshot.version
+
+    def apply_changes(self, snapshot, changes):
+        if changes.full:
+            self.rebuild(snapshot)
+            return
+        with self._lock:
+            for device_id in changes.removed:
+                self._remove_device(device_id)
+            for device in changes.upserted.values():
+                self._remove_device(device["id"])
+                self._add_device(device)
+            self.version = snapshot.version
+
+    def summary(self, sort="addedDate", descending=True, limit=None):
+        key = SORT_KEYS.get(sort, SORT_KEYS["addedDate"])
+        with self._lock:
+            apps = [self._to_dict(app_id, entry) for app_id, entry in self._apps.items()]
+        apps.sort(key=key, reverse=descending)
+        return apps[:limit] if limit else apps
+
+    def _add_device(self, device):
+        contribution = []
+        for app in device.get("installedApplications", []):
+            entry = self._apps.get(app["id"])
+            if entry is None:
+                entry = self._apps[app["id"]] = {
+                    "name": app.get("displayName") or app.get("name"),
+                    "entraGroups": app.get("entraGroups", []),
+                    "addedDate": app.get("addedDate"),
+                    "states": {},
+                    "total": 0,
+                }
+            state = app.get("installState") or "Unknown"
+            entry["states"][state] = entry["states"].get(state, 0) + 1
+            entry["total"] += 1
+            contribution.append((app["id"], state))
+        if contribution:
+            self._contributions[device["id"]] = contribution
+
+    def _remove_device(self, device_id):
+        for app_id, state in self._contributions.pop(device_id, ()):
+            entry = self._apps[app_id]
+            entry["total"] -= 1
+            entry["states"][state] -= 1
+            if not entry["states"][state]:
+                del entry["states"][state]
+            if not entry["total"]:
+                del self._apps[app_id]
+
+    @staticmethod
+    def _to_dict(app_id, entry):
+        total = entry["total"]
+        installed = sum(n for state, n in entry["states"].items() if state in INSTALLED_STATES)
+        failed = sum(n for state, n in entry["states"].items() if state in FAILED_STATES)
+        status_counts = {"Installed": installed, "Failed": failed, "N/A": total - installed - failed}
+        return {
+            "appId": app_id,
+            "name": entry["name"],
+            "entraGroups": entry["entraGroups"],
+            "addedDate": entry["addedDate"],
+            "total": total,
+            "states": dict(entry["states"]),
+            "status_counts": status_counts,
+            "status_percentages": {
+                k: (v / total * 100) if total > 0 else 0
+                for k, v in status_counts.items()
+            },
+            "success_rate": (installed / total * 100) if total > 0 else 0,
+        }
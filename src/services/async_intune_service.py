@@ -0,0 +1,264 @@
+import asyncio
+import httpx
+from ..core.auth import token_provider
+from ..core.config import settings
+from .intune_service import GraphError, build_deployment_summary, DEMO_DELTA_LINK
+from .graph_query import DeviceQuery
+from .graph_throttling import (
+    AdaptiveLimiter, THROTTLE_STATUSES, batch_body, batch_chunks, detected_apps_url, graph_metrics, retry_after_seconds
+)
+
+# HTTP/2 kräver paketet h2, annars används HTTP/1.1 med keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AsyncIntuneService:
+    """Asyncio-variant av IntuneService för FastAPI-routes.
+
+    Alla anrop går via en delad httpx.AsyncClient med connection pool. Antalet
+    samtidiga Graph-anrop styrs av en AdaptiveLimiter som backar vid
+    throttling, och throttlade anrop görs om efter Retry-After.
+    """
+
+    def __init__(self, demo_mode=False, page_size=None, max_concurrency=None, mock_devices=None):
+        self.demo_mode = demo_mode
+        self.page_size = page_size or settings.GRAPH_PAGE_SIZE
+        self.max_concurrency = max_concurrency or settings.GRAPH_MAX_CONCURRENCY
+        self._mock_devices = mock_devices
+        self._client = None
+        self.limiter = AdaptiveLimiter(self.max_concurrency, metrics=graph_metrics)
+
+    @classmethod
+    def from_sync(cls, service, **kwargs):
+        # Delar demo-läge och mockdata med en befintlig IntuneService
+        return cls(demo_mode=service.demo_mode, page_size=service.page_size,
+                   mock_devices=service._mock_devices, **kwargs)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def iter_device_pages(self, query=None):
+        if self.demo_mode:
+            devices = query.apply(self._mock_devices) if query else self._mock_devices
+            for start in range(0, len(devices), self.page_size):
+                yield devices[start:start + self.page_size]
+            return
+
+        url = f"{settings.GRAPH_URL}/deviceManagement/managedDevices"
+        params = query.params(self.page_size) if query else {"$top": self.page_size}
+        remaining = query.top if query else None
+        async for page in self._iter_pages(url, params):
+            items = page.get("value", [])
+            if remaining is not None:
+                # Samma gräns som IntuneService.iter_device_pages
+                items = items[:remaining]
+                remaining -= len(items)
+            yield items
+            if remaining == 0:
+                return
+
+    async def iter_delta_pages(self, delta_link=None, select=None):
+        # Samma kontrakt som IntuneService.iter_delta_pages
+        if self.demo_mode:
+            if delta_link:
+                yield [], DEMO_DELTA_LINK
+                return
+            pages = [page async for page in self.iter_device_pages()] or [[]]
+            for i, page in enumerate(pages):
+                yield page, DEMO_DELTA_LINK if i == len(pages) - 1 else None
+            return
+
+        if delta_link:
+            url, params = delta_link, None
+        else:
+            url = f"{settings.GRAPH_URL}/deviceManagement/managedDevices/delta"
+            params = DeviceQuery(select).params(self.page_size)
+        async for page in self._iter_pages(url, params):
+            yield page.get("value", []), page.get("@odata.deltaLink")
+
+    async def _iter_pages(self, url, params=None):
+        # Nästa sida hämtas som en egen task medan den aktuella bearbetas
+        pending = asyncio.ensure_future(self._get_page(url, params))
+        try:
+            while pending:
+                page = await pending
+                next_link = page.get("@odata.nextLink")
+                pending = asyncio.ensure_future(self._get_page(next_link)) if next_link else None
+                yield page
+        finally:
+            if pending and not pending.done():
+                pending.cancel()
+
+    async def iter_devices(self, query=None):
+        async for page in self.iter_device_pages(query):
+            for device in page:
+                yield device
+
+    async def query_devices(self, query):
+        return [device async for device in self.iter_devices(query)]
+
+    async def get_device_status(self):
+        if self.demo_mode:
+            return self._mock_devices
+
+        try:
+            return [device async for device in self.iter_devices()]
+        except GraphError as e:
+            return e.to_dict()
+
+    async def analyze_deployment(self):
+        total_devices = 0
+        successful_deployments = 0
+        try:
+            async for device in self.iter_devices(DeviceQuery.view("compliance")):
+                total_devices += 1
+                if device.get("complianceState") == "compliant":
+                    successful_deployments += 1
+        except GraphError as e:
+            return e.to_dict()
+        return build_deployment_summary(total_devices, successful_deployments)
+
+    async def _get_access_token(self):
+        # Cachad token utan att blockera event-loopen, annars hämtas den i en tråd
+        token = token_provider.peek()
+        if token:
+            return token
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, token_provider.get_token)
+
+    async def get_detected_apps(self, device_ids):
+        """Hämtar detectedApps för flera enheter, 20 enheter per $batch-anrop.
+
+        Delanrop som misslyckas eller throttlas görs om ett och ett. Returnerar
+        {device_id: [appar]}, enheter som inte längre finns (404) får en tom lista.
+        """
+        urls = {detected_apps_url(device_id): device_id for device_id in device_ids}
+        chunks = await asyncio.gather(*(self._send_batch(chunk) for chunk in batch_chunks(list(urls))))
+
+        apps, failed = {}, []
+        for url, status, body in (result for chunk in chunks for result in chunk):
+            if status == 200:
+                # Ett delsvar utan body räknas som en tom sida, annars skulle _collect_pages hämta url None
+                apps[urls[url]] = await self._collect_pages(body or {})
+            elif status == 404:
+                apps[urls[url]] = []
+            else:
+                failed.append(url)
+
+        retried = await asyncio.gather(
+            *(self._collect_pages(None, f"{settings.GRAPH_URL}{url}") for url in failed), return_exceptions=True
+        )
+        errors = []
+        for url, result in zip(failed, retried):
+            if isinstance(result, GraphError) and result.status_code == 404:
+                apps[urls[url]] = []
+            elif isinstance(result, Exception):
+                errors.append(urls[url])
+            else:
+                apps[urls[url]] = result
+        if errors:
+            raise GraphError("Failed to fetch detected apps", {"devices": errors[:20], "count": len(errors)})
+        return apps
+
+    async def attach_detected_apps(self, devices):
+        # Graph levererar inte appar på managedDevices, de läggs till som installedApplications
+        if self.demo_mode or not devices:
+            return
+        apps = await self.get_detected_apps([device["id"] for device in devices])
+        for device in devices:
+            device["installedApplications"] = apps.get(device["id"], [])
+
+    async def _collect_pages(self, body, url=None):
+        # Hela listan för ett delsvar, följer @odata.nextLink om svaret är sidindelat
+        if body is None:
+            body = await self._get_page(url)
+        items = list(body.get("value", []))
+        next_link = body.get("@odata.nextLink")
+        if next_link:
+            async for page in self._iter_pages(next_link):
+                items.extend(page.get("value", []))
+        return items
+
+    async def _send_batch(self, urls):
+        response = await self._send("POST", f"{settings.GRAPH_URL}/$batch", json=batch_body(urls))
+        graph_metrics.record_batch(len(urls))
+        if response.status_code != 200:
+            # Hela batchen misslyckades, alla delanrop görs om var för sig
+            return [(url, response.status_code, None) for url in urls]
+
+        by_id = {item.get("id"): item for item in response.json().get("responses", [])}
+        results = []
+        retry_after = 0.0
+        for i, url in enumerate(urls):
+            item = by_id.get(str(i), {})
+            status = item.get("status", 500)
+            if status in THROTTLE_STATUSES:
+                seconds = retry_after_seconds(item.get("headers"))
+                graph_metrics.record_throttle(seconds)
+                retry_after = max(retry_after, seconds)
+            results.append((url, status, item.get("body")))
+        if retry_after:
+            await self.limiter.throttled(retry_after)
+        return results
+
+    async def _send(self, method, url, params=None, json=None):
+        # Ett Graph-anrop genom den adaptiva gränsen, görs om efter Retry-After vid throttling
+        # och en gång med ny token vid 401
+        attempt, reauthenticated = 0, False
+        while True:
+            access_token = await self._get_access_token()
+            if not access_token:
+                raise GraphError("Failed to authenticate")
+
+            headers = {"Authorization": f"Bearer {access_token}"}
+            async with self.limiter:
+                try:
+                    response = await self.client.request(method, url, headers=headers, params=params, json=json)
+                except httpx.HTTPError as e:
+                    graph_metrics.record_failure()
+                    raise GraphError("Failed to fetch device status", str(e))
+            graph_metrics.record_request()
+            if response.status_code == 401 and not reauthenticated:
+                # Samma som IntuneService._send, den cachade tokenen gäller inte längre
+                token_provider.invalidate(access_token)
+                reauthenticated = True
+                continue
+            if response.status_code not in THROTTLE_STATUSES:
+                if response.status_code < 400:
+                    self.limiter.succeeded()
+                return response
+
+            retry_after = retry_after_seconds(response.headers, attempt)
+            graph_metrics.record_throttle(retry_after)
+            await self.limiter.throttled(retry_after)
+            if attempt >= settings.GRAPH_MAX_RETRIES:
+                break
+            graph_metrics.record_retry()
+            attempt += 1
+        graph_metrics.record_failure()
+        return response
+
+    async def _get_page(self, url, params=None):
+        response = await self._send("GET", url, params=params)
+        if response.status_code != 200:
+            raise GraphError("Failed to fetch device status", response.text, response.status_code)
+        return response.json()
@@ -0,0 +1,127 @@
+import sys
+from array import array
+from collections.abc import Mapping
+
+APPS_KEY = "installedApplications"
+STATE_KEY = "installState"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _freeze(value):
+    # Listor (t.ex. entraGroups) görs hashbara så att appvarianter kan jämföras
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class AppCatalog:
+    """Internerar appmetadata och installationsstatusar för hela flottan.
+
+    Varje unik kombination av appfält (allt utom installState) sparas en
+    gång som en variant. Enheterna pekar på varianten med ett heltal och
+    har sin status som en kod, i stället för en egen kopia av appen.
+    """
+
+    def __init__(self):
+        self._variants = []
+        self._variant_index = {}
+        self._states = []
+        self._state_codes = {}
+        self._field_sets = {}
+
+    def __len__(self):
+        return len(self._variants)
+
+    def variant(self, index):
+        return self._variants[index]
+
+    def state(self, code):
+        return self._states[code]
+
+    def intern_app(self, app):
+        fields = {key: _intern(value) for key, value in app.items() if key != STATE_KEY}
+        key = _freeze(fields)
+        index = self._variant_index.get(key)
+        if index is None:
+            index = self._variant_index[key] = len(self._variants)
+            self._variants.append(fields)
+        return index
+
+    def intern_state(self, state):
+        code = self._state_codes.get(state)
+        if code is None:
+            code = self._state_codes[state] = len(self._states)
+            self._states.append(state)
+        return code
+
+    def intern_fields(self, keys):
+        # Alla enheter från Graph har samma fält, så nyckel-tuplen delas
+        keys = tuple(keys)
+        return self._field_sets.setdefault(keys, keys)
+
+    def compact(self, device):
+        if isinstance(device, DeviceRecord):
+            return device
+        return DeviceRecord(self, device)
+
+
+class DeviceRecord(Mapping):
+    """Kompakt, skrivskyddad enhet som beter sig som Graph-dicten.
+
+    Enhetens egna fält ligger i en tuple med delade nycklar och apparna som
+    två arrayer: variant-index i AppCatalog och statuskod. installedApplications
+    byggs först när någon läser fältet.
+    """
+
+    __slots__ = ("_catalog", "_keys", "_values", "_apps", "_states")
+
+    def __init__(self, catalog, device):
+        fields = {key: _intern(value) for key, value in device.items() if key != APPS_KEY}
+        self._catalog = catalog
+        self._keys = catalog.intern_fields(fields)
+        self._values = tuple(fields.values())
+        apps = device.get(APPS_KEY)
+        if apps is None:
+            self._apps = None
+            self._states = None
+        else:
+            self._apps = array("I", (catalog.intern_app(app) for app in apps))
+            self._states = array("B", (catalog.intern_state(app.get(STATE_KEY)) for app in apps))
+
+    def __getitem__(self, key):
+        if key == APPS_KEY and self._apps is not None:
+            return self.installed_applications()
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        yield from self._keys
+        if self._apps is not None:
+            yield APPS_KEY
+
+    def __len__(self):
+        return len(self._keys) + (self._apps is not None)
+
+    def __repr__(self):
+        return f"DeviceRecord({self.get('id')!r})"
+
+    def installed_applications(self):
+        catalog = self._catalog
+        return [
+            {**catalog.variant(variant), STATE_KEY: catalog.state(state)}
+            for variant, state in zip(self._apps, self._states)
+        ]
+
+    def to_dict(self):
+        # JSON-vy för API-svaren
+        device = dict(zip(self._keys, self._values))
+        if self._apps is not None:
+            device[APPS_KEY] = self.installed_applications()
+        return device
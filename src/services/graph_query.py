@@ -0,0 +1,232 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# Fälten som vyerna faktiskt använder. id tas alltid med.
+DEVICE_VIEWS = {
+    # Allt som inventariet, sökningen, rapporterna och Streamlit-sidorna läser
+    "inventory": [
+        "id", "deviceName", "userDisplayName", "userPrincipalName", "department", "operatingSystem",
+        "osVersion", "osDescription", "platform", "complianceState", "lastSyncDateTime",
+        "managementAgent", "model", "serialNumber", "skuFamily",
+    ],
+    # Startsidans diagram och statistik
+    "overview": ["id", "deviceName", "department", "operatingSystem", "osVersion", "complianceState", "lastSyncDateTime"],
+    # analyze-deployment
+    "compliance": ["id", "complianceState"],
+}
+
+OPERATORS = ("eq", "ne", "gt", "ge", "lt", "le")
+_CLAUSE = re.compile(r"(\w+) (eq|ne|gt|ge|lt|le) ('(?:[^']|'')*'|[^\s()]+)")
+_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}T")
+
+
+def odata_literal(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, datetime):
+        # DateTimeOffset skrivs utan citattecken
+        return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _parse_literal(text):
+    if text.startswith("'"):
+        return text[1:-1].replace("''", "'")
+    if text in ("true", "false"):
+        return text == "true"
+    if _DATETIME.match(text):
+        return text
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def build_filter(filters):
+    """Bygger ett $filter-uttryck av [(fält, operator, värde)].
+
+    En lista som värde med eq blir ett or-uttryck inom parentes, alla villkor
+    kombineras med and. En lista går bara med eq.
+    """
+    clauses = []
+    for field, op, value in filters:
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        if isinstance(value, (list, tuple, set)):
+            if op != "eq":
+                raise ValueError(f"Operator {op} does not support a list of values")
+            clauses.append("(" + " or ".join(f"{field} eq {odata_literal(v)}" for v in value) + ")")
+        else:
+            clauses.append(f"{field} {op} {odata_literal(value)}")
+    return " and ".join(clauses) or None
+
+
+def parse_filter(expression):
+    # Omvändningen av build_filter, räcker för uttrycken som byggs här
+    filters = []
+    for part in re.split(r"\s+and\s+", expression.strip()) if expression else []:
+        matches = _CLAUSE.findall(part)
+        if not matches:
+            raise ValueError(f"Unsupported filter: {part}")
+        if len(matches) > 1:
+            filters.append((matches[0][0], "eq", [_parse_literal(value) for _, _, value in matches]))
+        else:
+            field, op, value = matches[0]
+            filters.append((field, op, _parse_literal(value)))
+    return filters
+
+
+def _compare(actual, op, expected):
+    if actual is None:
+        return op == "ne" and expected is not None
+    if isinstance(expected, str) and _DATETIME.match(expected):
+        # Tidsstämplar jämförs på sekundnivå oavsett tidszonsuffix
+        actual, expected = str(actual)[:19], expected[:19]
+    if op == "eq":
+        return actual == expected
+    if op == "ne":
+        return actual != expected
+    try:
+        return {"gt": actual > expected, "ge": actual >= expected, "lt": actual < expected, "le": actual <= expected}[op]
+    except TypeError:
+        return False
+
+
+class DeviceQuery:
+    """Fält, filter och högsta antal enheter för en managedDevices-hämtning.
+
+    Översätts till $select/$filter/$top mot Graph. top är både sidstorlek och
+    gräns, hämtningen slutar följa nextLink när top enheter har kommit. I
+    demoläget, och i graph_server, används matches och project för samma
+    resultat lokalt.
+    """
+
+    def __init__(self, select=None, filters=None, top=None):
+        self.select = sorted(set(select) | {"id"}) if select else None
+        if isinstance(filters, dict):
+            filters = [(field, "eq", value) for field, value in filters.items()]
+        self.filters = [(field, op, tuple(value) if isinstance(value, (list, set)) else value)
+                        for field, op, value in (filters or [])]
+        self.top = top
+
+    @classmethod
+    def view(cls, name, filters=None, top=None):
+        return cls(DEVICE_VIEWS[name], filters, top)
+
+    @classmethod
+    def from_params(cls, params):
+        select = params.get("$select")
+        return cls(
+            select.split(",") if select else None,
+            parse_filter(params.get("$filter")),
+            int(params["$top"]) if params.get("$top") else None,
+        )
+
+    @property
+    def key(self):
+        return (tuple(self.select or ()), build_filter(self.filters), self.top)
+
+    def params(self, page_size=None):
+        params = {}
+        if self.select:
+            params["$select"] = ",".join(self.select)
+        expression = build_filter(self.filters)
+        if expression:
+            params["$filter"] = expression
+        top = self.top or page_size
+        if top:
+            params["$top"] = top
+        return params
+
+    def matches(self, device):
+        for field, op, value in self.filters:
+            if isinstance(value, tuple):
+                if device.get(field) not in value:
+                    return False
+            elif not _compare(device.get(field), op, value):
+                return False
+        return True
+
+    def project(self, device):
+        if not self.select:
+            return device
+        return {field: device[field] for field in self.select if field in device}
+
+    def apply(self, devices):
+        # Lokal motsvarighet till Graph-anropet, används för demodata
+        result = [self.project(device) for device in devices if self.matches(device)]
+        return result[:self.top] if self.top else result
+
+
+class ProjectionCache:
+    """Cachar resultat från Graph per fråga (DeviceQuery.key).
+
+    Fält, filter och top skickas till Graph som $select/$filter/$top, så
+    varje kombination får en egen post med bara de enheter den bad om.
+    Varje post hålls max_age sekunder och högst max_entries poster sparas,
+    den som använts minst nyligen kastas först. Samtidiga anrop för samma
+    fråga väntar på samma hämtning.
+    """
+
+    def __init__(self, service, max_age=300, max_entries=8):
+        self.service = service
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        key = query.key
+        while True:
+            with self._lock:
+                self._drop_expired()
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # En annan tråd hämtar redan samma projektion
+            loading.wait()
+
+        try:
+            devices = self.service.query_devices(query)
+            with self._lock:
+                self._entries[key] = (time.monotonic(), devices)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+        return devices
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (stored, _) in self._entries.items() if now - stored >= self.max_age]:
+            del self._entries[key]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "projections": len(self._entries),
+                "devices": sum(len(devices) for _, devices in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
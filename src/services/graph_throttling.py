@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+# Graph tar emot högst 20 anrop per $batch
+BATCH_SIZE = 20
+# Statusar där Graph ber oss vänta och försöka igen
+THROTTLE_STATUSES = {429, 503, 504}
+# Väntetid när Retry-After saknas, dubblas för varje nytt försök
+DEFAULT_RETRY_AFTER = 2.0
+MAX_RETRY_AFTER = 120.0
+# Fönster i sekunder för uppmätta anrop per sekund
+RATE_WINDOW = 60.0
+
+
+def retry_after_seconds(headers, attempt=0):
+    # Retry-After i sekunder, annars exponentiell backoff
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return min(MAX_RETRY_AFTER, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return min(MAX_RETRY_AFTER, DEFAULT_RETRY_AFTER * 2 ** attempt)
+
+
+def batch_chunks(urls, size=BATCH_SIZE):
+    for start in range(0, len(urls), size):
+        yield urls[start:start + size]
+
+
+def batch_body(urls):
+    # urls är relativa till Graph-versionen, t.ex. /deviceManagement/managedDevices/{id}/detectedApps
+    return {"requests": [{"id": str(i), "method": "GET", "url": url} for i, url in enumerate(urls)]}
+
+
+def detected_apps_url(device_id):
+    return f"/deviceManagement/managedDevices/{device_id}/detectedApps"
+
+
+class GraphMetrics:
+    """Räknare för Graph-trafiken, delas av den synkrona och asynkrona klienten."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._completed = deque()
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.retry_after_total = 0.0
+        self.concurrency_limit = None
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self._completed.append(now)
+            while self._completed and self._completed[0] < now - RATE_WINDOW:
+                self._completed.popleft()
+
+    def record_throttle(self, retry_after):
+        with self._lock:
+            self.throttled += 1
+            self.retry_after_total += retry_after
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def record_batch(self, size):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += size
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for completed in self._completed if completed >= now - RATE_WINDOW)
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "failures": self.failures,
+                "batches": self.batches,
+                "batched_requests": self.batched_requests,
+                "retry_after_seconds": round(self.retry_after_total, 1),
+                "requests_per_second": round(recent / RATE_WINDOW, 2),
+                "concurrency_limit": self.concurrency_limit,
+            }
+
+
+class AdaptiveLimiter:
+    """Asynkron gräns för samtidiga Graph-anrop som anpassar sig efter throttling.
+
+    Gränsen ökar med ungefär ett för varje full omgång lyckade anrop och
+    halveras när Graph throttlar (AIMD). Vid Retry-After pausas alla nya
+    anrop tills tiden gått ut. Flera throttlade svar inom samma paus räknas
+    som en händelse så att gränsen inte rasar till ett direkt.
+    """
+
+    def __init__(self, max_limit, min_limit=1, metrics=None):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.metrics = metrics
+        self._active = 0
+        self._resume_at = 0.0
+        self._condition = None
+        self._publish()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self._active < int(self.limit):
+                    break
+                await self._condition.wait()
+            self._active += 1
+
+    async def release(self):
+        self._active -= 1
+        await self._notify()
+
+    def succeeded(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._publish()
+
+    async def throttled(self, retry_after):
+        now = time.monotonic()
+        if now >= self._resume_at:
+            self.limit = max(self.min_limit, self.limit / 2)
+        self._resume_at = max(self._resume_at, now + retry_after)
+        self._publish()
+        await self._notify()
+
+    async def _notify(self):
+        if self._condition is not None:
+            async with self._condition:
+                self._condition.notify_all()
+
+    def _publish(self):
+        if self.metrics is not None:
+            self.metrics.concurrency_limit = int(self.limit)
+
+
+graph_metrics = GraphMetrics()
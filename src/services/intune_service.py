@@ -1,45 +1,254 @@
 import requests
-from ..core.auth import get_access_token
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..core.auth import get_access_token, token_provider
+from ..core.config import settings
 from ..utils.mock_data import generate_mock_devices, get_mock_deployment_analysis
+from .graph_query import DeviceQuery
+from .graph_throttling import (
+    THROTTLE_STATUSES, batch_body, batch_chunks, detected_apps_url, graph_metrics, retry_after_seconds
+)
 from datetime import datetime
 import os
 
+
+class GraphError(Exception):
+    def __init__(self, message, details=None, status_code=None):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+        self.status_code = status_code
+
+    def to_dict(self):
+        error = {"error": self.message}
+        if self.details is not None:
+            error["details"] = self.details
+        return error
+
+
+def build_deployment_summary(total_devices, successful_deployments):
+    success_rate = (successful_deployments / total_devices) * 100 if total_devices > 0 else 0
+    return {
+        "total_devices": total_devices,
+        "successful_deployments": successful_deployments,
+        "success_rate": success_rate,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+# Demo-läget har ingen riktig delta-endpoint, alla synkar efter den första är tomma
+DEMO_DELTA_LINK = "demo://managedDevices/delta"
+
+
 class IntuneService:
-    def __init__(self, demo_mode=False):
+    def __init__(self, demo_mode=False, page_size=None, prefetch=True):
         self.demo_mode = demo_mode or os.getenv("DEMO_MODE", "false").lower() == "true"
+        self.page_size = page_size or settings.GRAPH_PAGE_SIZE
+        self.prefetch = prefetch
+        self._session = requests.Session()
         self._mock_devices = generate_mock_devices() if self.demo_mode else None
 
+    def iter_device_pages(self, query=None):
+        # Ger en sida enheter i taget och följer @odata.nextLink tills alla sidor är hämtade.
+        # query (DeviceQuery) skickas som $select/$filter/$top så att Graph bara levererar det som behövs.
+        if self.demo_mode:
+            devices = query.apply(self._mock_devices) if query else self._mock_devices
+            for start in range(0, len(devices), self.page_size):
+                yield devices[start:start + self.page_size]
+            return
+
+        url = f"{settings.GRAPH_URL}/deviceManagement/managedDevices"
+        params = query.params(self.page_size) if query else {"$top": self.page_size}
+        remaining = query.top if query else None
+        for page in self._iter_pages(url, params):
+            items = page.get("value", [])
+            if remaining is not None:
+                # $top är bara sidstorleken för Graph, sluta följa nextLink när gränsen är nådd
+                items = items[:remaining]
+                remaining -= len(items)
+            yield items
+            if remaining == 0:
+                return
+
+    def iter_delta_pages(self, delta_link=None, select=None):
+        # Ger (enheter, deltaLink) per sida. deltaLink finns bara på sista sidan.
+        # Utan delta_link görs en full synk som avslutas med en ny deltaLink.
+        # select följer med i deltaLink, så den behöver bara anges vid full synk.
+        if self.demo_mode:
+            if delta_link:
+                yield [], DEMO_DELTA_LINK
+                return
+            pages = list(self.iter_device_pages()) or [[]]
+            for i, page in enumerate(pages):
+                yield page, DEMO_DELTA_LINK if i == len(pages) - 1 else None
+            return
+
+        if delta_link:
+            url, params = delta_link, None
+        else:
+            url = f"{settings.GRAPH_URL}/deviceManagement/managedDevices/delta"
+            params = DeviceQuery(select).params(self.page_size)
+        for page in self._iter_pages(url, params):
+            yield page.get("value", []), page.get("@odata.deltaLink")
+
+    def _iter_pages(self, url, params=None):
+        if not self.prefetch:
+            while url:
+                page = self._get_page(url, params)
+                url, params = page.get("@odata.nextLink"), None
+                yield page
+            return
+
+        # Hämta nästa sida i bakgrunden medan anroparen bearbetar den aktuella
+        pool = ThreadPoolExecutor(max_workers=1)
+        try:
+            pending = pool.submit(self._get_page, url, params)
+            while pending:
+                page = pending.result()
+                next_link = page.get("@odata.nextLink")
+                pending = pool.submit(self._get_page, next_link, None) if next_link else None
+                yield page
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_devices(self, query=None):
+        for page in self.iter_device_pages(query):
+            yield from page
+
+    def query_devices(self, query):
+        # Alla enheter för en projektion, GraphError skickas vidare till anroparen
+        return list(self.iter_devices(query))
+
     def get_device_status(self):
         if self.demo_mode:
             return self._mock_devices
 
-        access_token = get_access_token()
-        if not access_token:
-            return {"error": "Failed to authenticate"}
-        
-        headers = {"Authorization": f"Bearer {access_token}"}
-        url = "https://graph.microsoft.com/v1.0/deviceManagement/managedDevices"
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return response.json().get("value", [])
-        return {"error": "Failed to fetch device status", "details": response.text}
+        try:
+            return list(self.iter_devices())
+        except GraphError as e:
+            return e.to_dict()
 
     def analyze_deployment(self, devices=None):
-        if self.demo_mode:
+        if self.demo_mode and devices is None:
             return get_mock_deployment_analysis(self._mock_devices)
 
-        if "error" in (devices or {}):
+        if isinstance(devices, dict) and "error" in devices:
             return devices
-        
-        devices = devices or self.get_device_status()
-        total_devices = len(devices)
-        successful_deployments = sum(1 for device in devices if device.get("complianceState") == "compliant")
-        success_rate = (successful_deployments / total_devices) * 100 if total_devices > 0 else 0
-        
-        return {
-            "total_devices": total_devices,
-            "successful_deployments": successful_deployments,
-            "success_rate": success_rate,
-            "timestamp": datetime.now().isoformat()
-        } 
\ No newline at end of file
+
+        # Räkna i ett svep över strömmen så att hela flottan aldrig ligger i minnet
+        total_devices = 0
+        successful_deployments = 0
+        try:
+            for device in (devices if devices is not None else self.iter_devices(DeviceQuery.view("compliance"))):
+                total_devices += 1
+                if device.get("complianceState") == "compliant":
+                    successful_deployments += 1
+        except GraphError as e:
+            return e.to_dict()
+        return build_deployment_summary(total_devices, successful_deployments)
+
+    def get_detected_apps(self, device_ids):
+        # Samma kontrakt som AsyncIntuneService.get_detected_apps, batcharna skickas i tur och ordning
+        urls = {detected_apps_url(device_id): device_id for device_id in device_ids}
+        apps, failed = {}, []
+        for chunk in batch_chunks(list(urls)):
+            for url, status, body in self._send_batch(chunk):
+                if status == 200:
+                    # Delsvar utan body är en tom sida, som i AsyncIntuneService
+                    apps[urls[url]] = self._collect_pages(body or {})
+                elif status == 404:
+                    apps[urls[url]] = []
+                else:
+                    failed.append(url)
+
+        errors = []
+        for url in failed:
+            try:
+                apps[urls[url]] = self._collect_pages(None, f"{settings.GRAPH_URL}{url}")
+            except GraphError as e:
+                if e.status_code == 404:
+                    apps[urls[url]] = []
+                else:
+                    errors.append(urls[url])
+        if errors:
+            raise GraphError("Failed to fetch detected apps", {"devices": errors[:20], "count": len(errors)})
+        return apps
+
+    def attach_detected_apps(self, devices):
+        # Graph levererar inte appar på managedDevices, de läggs till som installedApplications
+        if self.demo_mode or not devices:
+            return
+        apps = self.get_detected_apps([device["id"] for device in devices])
+        for device in devices:
+            device["installedApplications"] = apps.get(device["id"], [])
+
+    def _collect_pages(self, body, url=None):
+        if body is None:
+            body = self._get_page(url)
+        items = list(body.get("value", []))
+        if body.get("@odata.nextLink"):
+            for page in self._iter_pages(body["@odata.nextLink"]):
+                items.extend(page.get("value", []))
+        return items
+
+    def _send_batch(self, urls):
+        response = self._send("POST", f"{settings.GRAPH_URL}/$batch", json=batch_body(urls))
+        graph_metrics.record_batch(len(urls))
+        if response.status_code != 200:
+            return [(url, response.status_code, None) for url in urls]
+
+        by_id = {item.get("id"): item for item in response.json().get("responses", [])}
+        results = []
+        retry_after = 0.0
+        for i, url in enumerate(urls):
+            item = by_id.get(str(i), {})
+            status = item.get("status", 500)
+            if status in THROTTLE_STATUSES:
+                seconds = retry_after_seconds(item.get("headers"))
+                graph_metrics.record_throttle(seconds)
+                retry_after = max(retry_after, seconds)
+            results.append((url, status, item.get("body")))
+        if retry_after:
+            # Respektera Retry-After innan delanropen görs om
+            time.sleep(retry_after)
+        return results
+
+    def _send(self, method, url, params=None, json=None):
+        # Görs om efter Retry-After när Graph throttlar, upp till GRAPH_MAX_RETRIES gånger.
+        # Vid 401 hämtas en ny token och anropet görs om en gång.
+        attempt, reauthenticated = 0, False
+        while True:
+            access_token = get_access_token()
+            if not access_token:
+                raise GraphError("Failed to authenticate")
+
+            headers = {"Authorization": f"Bearer {access_token}"}
+            try:
+                response = self._session.request(method, url, headers=headers, params=params, json=json)
+            except requests.RequestException as e:
+                graph_metrics.record_failure()
+                raise GraphError("Failed to fetch device status", str(e))
+            graph_metrics.record_request()
+            if response.status_code == 401 and not reauthenticated:
+                # Tokenen kan ha återkallats eller klockan dragit iväg, vänta inte ut förnyelsemarginalen
+                token_provider.invalidate(access_token)
+                reauthenticated = True
+                continue
+            if response.status_code not in THROTTLE_STATUSES:
+                return response
+
+            retry_after = retry_after_seconds(response.headers, attempt)
+            graph_metrics.record_throttle(retry_after)
+            if attempt >= settings.GRAPH_MAX_RETRIES:
+                break
+            graph_metrics.record_retry()
+            time.sleep(retry_after)
+            attempt += 1
+        graph_metrics.record_failure()
+        return response
+
+    def _get_page(self, url, params=None):
+        response = self._send("GET", url, params=params)
+        if response.status_code != 200:
+            raise GraphError("Failed to fetch device status", response.text, response.status_code)
+        return response.json()
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from .intune_service import GraphError
+from .device_records import AppCatalog
+
+logger = logging.getLogger(__name__)
+
+# Graph svarar 410 Gone när en deltaLink har gått ut, då krävs en ny full synk
+DELTA_EXPIRED_STATUS = 410
+
+
+class InventorySnapshot:
+    """Oföränderlig vy av inventariet vid en viss version."""
+
+    def __init__(self, devices, version, last_sync, lineage):
+        self.devices = devices
+        self.version = version
+        self.last_sync = last_sync
+        self.lineage = lineage
+
+    @property
+    def key(self):
+        # Unik för just denna data: versionen räknas om från 1 i en ny lineage
+        return f"{self.lineage}-{self.version}"
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def get(self, device_id):
+        return self.devices.get(device_id)
+
+
+class InventoryChanges:
+    """Det som ändrades i en synk, skickas till prenumeranter efter varje ny version."""
+
+    def __init__(self, upserted, removed, full, version, delta_link=None):
+        self.upserted = upserted
+        self.removed = removed
+        self.full = full
+        self.version = version
+        self.delta_link = delta_link
+
+
+class _DeltaBatch:
+    # Samlar ihop sidorna från en synk så att de kan appliceras som en enda version
+    def __init__(self, full):
+        self.full = full
+        self.upserted = {}
+        self.removed = set()
+        self.delta_link = None
+
+    def add_page(self, items, delta_link):
+        for item in items:
+            device_id = item.get("id")
+            if device_id is None:
+                continue
+            if "@removed" in item:
+                self.upserted.pop(device_id, None)
+                self.removed.add(device_id)
+            else:
+                self.removed.discard(device_id)
+                self.upserted[device_id] = item
+        if delta_link:
+            self.delta_link = delta_link
+
+    def missing_apps(self):
+        # Enheter där Graph inte skickat med appar, de hämtas via detectedApps
+        return [device for device in self.upserted.values() if "installedApplications" not in device]
+
+
+class InventorySync:
+    """Håller en lokal ögonblicksbild av managedDevices uppdaterad via Graph delta.
+
+    Första synken hämtar hela flottan och sparar deltaLink. Efterföljande
+    synkar hämtar bara tillagda, ändrade och borttagna enheter. Varje synk
+    som ändrar något ger en ny snapshot-version.
+    """
+
+    def __init__(self, service, async_service=None, max_age=None, select=None):
+        self.service = service
+        self.async_service = async_service
+        self.max_age = max_age
+        # Fälten som hämtas från Graph ($select), None betyder alla
+        self.select = select
+        self.delta_link = None
+        self._snapshot = InventorySnapshot({}, 0, None, uuid.uuid4().hex)
+        # Enheterna lagras som DeviceRecord med appmetadata internerad i katalogen
+        self._catalog = AppCatalog()
+        self._synced_at = 0.0
+        self._apply_lock = threading.Lock()
+        # Samma lås för schemalagd och asynkron synk, två synkar från samma deltaLink får inte köras samtidigt
+        self._sync_lock = threading.Lock()
+        # Samlar väntande korutiner så att bara en av dem tar _sync_lock via en tråd
+        self._async_lock = None
+        # Hålls medan prenumeranterna får en version, så att de får versionerna i ordning
+        self._notify_lock = threading.Lock()
+        self._listeners = []
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def last_sync(self):
+        return self._snapshot.last_sync
+
+    def snapshot(self):
+        return self._snapshot
+
+    def restore(self, devices, version, last_sync, delta_link=None, lineage=None):
+        # Varmstart från lokal lagring, nästa synk blir en delta-synk om deltaLink finns
+        with self._apply_lock:
+            self._catalog = AppCatalog()
+            devices = {device_id: self._catalog.compact(device) for device_id, device in devices.items()}
+            self._snapshot = InventorySnapshot(devices, version, last_sync, lineage or self._snapshot.lineage)
+            self.delta_link = delta_link
+            age = (datetime.now() - last_sync).total_seconds() if last_sync else 0.0
+            self._synced_at = time.monotonic() - age
+
+    def subscribe(self, listener):
+        # listener(snapshot, changes) anropas efter varje ny version
+        self._listeners.append(listener)
+
+    def is_stale(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        if self._snapshot.last_sync is None:
+            return True
+        return max_age is not None and time.monotonic() - self._synced_at > max_age
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "key": snapshot.key,
+            "last_sync": snapshot.last_sync.isoformat() if snapshot.last_sync else None,
+            "device_count": len(snapshot),
+            "incremental": self.delta_link is not None,
+        }
+
+    def sync(self):
+        with self._sync_lock:
+            return self._sync_with_resync()
+
+    def sync_if_stale(self, max_age=None):
+        if self.is_stale(max_age):
+            with self._sync_lock:
+                # En annan tråd kan ha synkat medan vi väntade på låset
+                if self.is_stale(max_age):
+                    return self._sync_with_resync()
+        return self._snapshot
+
+    async def sync_async_if_stale(self, max_age=None):
+        # Utan asynkron klient körs den synkrona synken i en tråd
+        if self.async_service is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.sync_if_stale, max_age)
+        if self.is_stale(max_age):
+            if self._async_lock is None:
+                self._async_lock = asyncio.Lock()
+            async with self._async_lock:
+                if self.is_stale(max_age):
+                    await self._acquire_sync_lock()
+                    try:
+                        # Den schemalagda synken kan ha hunnit före medan vi väntade
+                        if self.is_stale(max_age):
+                            return await self._sync_async_with_resync()
+                    finally:
+                        self._sync_lock.release()
+        return self._snapshot
+
+    async def _acquire_sync_lock(self):
+        # threading.Lock tas i en tråd så att event-loopen inte blockeras medan en annan synk pågår
+        loop = asyncio.get_running_loop()
+        acquire = loop.run_in_executor(None, self._sync_lock.acquire)
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # Avbruten medan vi väntade, släpp låset när tråden väl fått det
+            acquire.add_done_callback(lambda future: future.cancelled() or self._sync_lock.release())
+            raise
+
+    def _sync_with_resync(self):
+        try:
+            return self._sync_once(self.delta_link)
+        except GraphError as e:
+            if self.delta_link and e.status_code == DELTA_EXPIRED_STATUS:
+                self.delta_link = None
+                return self._sync_once(None)
+            raise
+
+    def _sync_once(self, delta_link):
+        batch = _DeltaBatch(full=delta_link is None)
+        for items, next_delta_link in self.service.iter_delta_pages(delta_link, self.select):
+            batch.add_page(items, next_delta_link)
+        self.service.attach_detected_apps(batch.missing_apps())
+        return self._apply(batch)
+
+    async def _sync_async_with_resync(self):
+        try:
+            return await self._sync_async_once(self.delta_link)
+        except GraphError as e:
+            if self.delta_link and e.status_code == DELTA_EXPIRED_STATUS:
+                self.delta_link = None
+                return await self._sync_async_once(None)
+            raise
+
+    async def _sync_async_once(self, delta_link):
+        batch = _DeltaBatch(full=delta_link is None)
+        async for items, next_delta_link in self.async_service.iter_delta_pages(delta_link, self.select):
+            batch.add_page(items, next_delta_link)
+        await self.async_service.attach_detected_apps(batch.missing_apps())
+        # Prenumeranterna kan skriva till disk eller bygga index, det får inte blockera event-loopen
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._apply, batch)
+
+    def _apply(self, batch):
+        with self._apply_lock:
+            current = self._snapshot
+            if batch.full:
+                # Ny katalog vid full synk så att varianter som inte längre används försvinner
+                self._catalog = AppCatalog()
+            upserted = {device_id: self._catalog.compact(item) for device_id, item in batch.upserted.items()}
+            if batch.full:
+                devices = upserted
+                removed = set(current.devices) - set(devices)
+            else:
+                # Kopiera vid skrivning så att läsare av den gamla versionen inte påverkas
+                devices = dict(current.devices)
+                devices.update(upserted)
+                removed = {device_id for device_id in batch.removed if device_id in devices}
+                for device_id in removed:
+                    del devices[device_id]
+
+            changed = bool(upserted or removed) or current.last_sync is None
+            version = current.version + 1 if changed else current.version
+            self._snapshot = InventorySnapshot(devices, version, datetime.now(), current.lineage)
+            self._synced_at = time.monotonic()
+            if batch.delta_link:
+                self.delta_link = batch.delta_link
+            snapshot = self._snapshot
+            delta_link = self.delta_link
+            if changed:
+                # Tas innan _apply_lock släpps, så nästa version kan inte levereras före den här
+                self._notify_lock.acquire()
+
+        if changed:
+            try:
+                changes = InventoryChanges(upserted, removed, batch.full, version, delta_link)
+                for listener in self._listeners:
+                    # Ett fel i en prenumerant får inte hindra de andra, versionen har redan gått vidare
+                    try:
+                        listener(snapshot, changes)
+                    except Exception:
+                        logger.exception("Inventory listener %r failed for version %s", listener, version)
+            finally:
+                self._notify_lock.release()
+        return snapshot
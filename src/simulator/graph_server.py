@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import itertools
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from ..services.graph_query import DeviceQuery
+from ..utils.fleet_generator import generate_fleet, iter_fleet_file, INSTALL_STATES
+
+GRAPH_PREFIX = "/v1.0"
+# Graph lämnar som mest 1000 managedDevices per sida
+MAX_PAGE_SIZE = 1000
+MAX_CURSORS = 1000
+MAX_BATCH_REQUESTS = 20
+DETECTED_APPS_PATH = re.compile(r"^/deviceManagement/managedDevices/([^/?]+)/detectedApps$")
+DEVICE_PATH = re.compile(r"^/deviceManagement/managedDevices/([^/?]+)$")
+
+
+def _graph_error(status_code, code, message, headers=None):
+    # Samma felformat som Graph
+    body = {"error": {"code": code, "message": message, "innerError": {"request-id": uuid.uuid4().hex}}}
+    return JSONResponse(body, status_code=status_code, headers=headers)
+
+
+class GraphStandIn:
+    """Tillstånd för en lokal ersättare av Graph-API:t.
+
+    Håller en genererad flotta, utfärdade tokens, sidmarkörer och en ändringslogg
+    för delta. Fel, throttling och latens styrs av attributen och kan ändras
+    medan servern kör via /_standin/config.
+    """
+
+    def __init__(self, devices, latency_ms=0.0, jitter_ms=0.0, throttle_rate=0.0, retry_after=1,
+                 failure_rate=0.0, churn=0, delta_retention=1000, token_lifetime=3599, detached_apps=False, seed=0):
+        self.devices = OrderedDict((device["id"], device) for device in devices)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.failure_rate = failure_rate
+        self.churn = churn
+        self.delta_retention = delta_retention
+        self.token_lifetime = token_lifetime
+        # Som riktiga Graph: managedDevices utan appar, de hämtas via detectedApps
+        self.detached_apps = detached_apps
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._cursors = OrderedDict()
+        self._cursor_ids = itertools.count(1)
+        # Ändringslogg för delta: (version, device_id), en borttagen enhet saknas i self.devices.
+        # Bara de senaste delta_retention versionerna sparas, äldre deltatoken får 410.
+        self.version = 0
+        self._changes = deque()
+        self.stats = {
+            "requests": 0, "batch_requests": 0, "throttled": 0, "failed": 0,
+            "unauthorized": 0, "tokens": 0, "delta_expired": 0,
+        }
+
+    def config(self):
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "throttle_rate": self.throttle_rate,
+            "retry_after": self.retry_after,
+            "failure_rate": self.failure_rate,
+            "churn": self.churn,
+            "delta_retention": self.delta_retention,
+            "token_lifetime": self.token_lifetime,
+            "detached_apps": self.detached_apps,
+            "devices": len(self.devices),
+            "version": self.version,
+        }
+
+    def update_config(self, values):
+        for key, value in values.items():
+            if key in self.config() and key not in ("devices", "version"):
+                current = getattr(self, key)
+                if isinstance(current, bool):
+                    value = value if isinstance(value, bool) else str(value).lower() == "true"
+                setattr(self, key, type(current)(value))
+        return self.config()
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = {t: exp for t, exp in self._tokens.items() if exp > now}
+            self._tokens[token] = now + self.token_lifetime
+            self.stats["tokens"] += 1
+        return token
+
+    def token_valid(self, authorization):
+        if not authorization or not authorization.startswith("Bearer "):
+            return False
+        expires_at = self._tokens.get(authorization[len("Bearer "):])
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def fault(self):
+        # (status, headers, felkropp) att svara med i stället för det riktiga svaret, eller None
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return 429, {"Retry-After": str(self.retry_after)}, "TooManyRequests"
+        if roll < self.throttle_rate + self.failure_rate:
+            self.stats["failed"] += 1
+            return 503, None, "ServiceUnavailable"
+        return None
+
+    def public(self, item):
+        if self.detached_apps and "installedApplications" in item:
+            return {key: value for key, value in item.items() if key != "installedApplications"}
+        return item
+
+    def resolve(self, url):
+        # Delanrop i en $batch: (status, kropp) för de GET-vägar som stand-in stöder
+        path = url.split("?", 1)[0]
+        match = DETECTED_APPS_PATH.match(path)
+        if match:
+            device = self.devices.get(match.group(1))
+            if device is None:
+                return 404, {"error": {"code": "ResourceNotFound", "message": f"Device {match.group(1)} not found"}}
+            return 200, {"value": device.get("installedApplications", [])}
+        match = DEVICE_PATH.match(path)
+        if match:
+            device = self.devices.get(match.group(1))
+            if device is None:
+                return 404, {"error": {"code": "ResourceNotFound", "message": f"Device {match.group(1)} not found"}}
+            return 200, self.public(device)
+        return 400, {"error": {"code": "BadRequest", "message": f"Not supported in batch: {path}"}}
+
+    def delay(self):
+        if not self.latency_ms and not self.jitter_ms:
+            return 0.0
+        return max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def mutate(self, count):
+        # Simulerar att enheter har synkat mot Intune sedan förra deltan
+        with self._lock:
+            if not self.devices or count <= 0:
+                return self.version
+            self.version += 1
+            now = datetime.now().isoformat()
+            for device_id in self._random.sample(list(self.devices), min(count, len(self.devices))):
+                device = dict(self.devices[device_id])
+                device["lastSyncDateTime"] = now
+                if device.get("installedApplications") and self._random.random() < 0.5:
+                    apps = [dict(app) for app in device["installedApplications"]]
+                    self._random.choice(apps)["installState"] = self._random.choice(INSTALL_STATES)
+                    device["installedApplications"] = apps
+                self.devices[device_id] = device
+                self._changes.append((self.version, device_id))
+            self._trim_changes()
+            return self.version
+
+    def remove(self, device_ids):
+        with self._lock:
+            self.version += 1
+            for device_id in device_ids:
+                if self.devices.pop(device_id, None) is not None:
+                    self._changes.append((self.version, device_id))
+            self._trim_changes()
+            return self.version
+
+    def _trim_changes(self):
+        # En deltatoken äldre än version - delta_retention får 410, så de ändringarna behövs aldrig
+        oldest = self.version - self.delta_retention
+        while self._changes and self._changes[0][0] <= oldest:
+            self._changes.popleft()
+
+    def open_cursor(self, entry):
+        with self._lock:
+            cursor_id = str(next(self._cursor_ids))
+            self._cursors[cursor_id] = entry
+            while len(self._cursors) > MAX_CURSORS:
+                self._cursors.popitem(last=False)
+        return cursor_id
+
+    def cursor(self, cursor_id):
+        return self._cursors.get(cursor_id)
+
+    def changed_since(self, since):
+        # None om deltatoken är för gammal för ändringsloggen, då svarar servern 410
+        with self._lock:
+            if since > self.version or since < self.version - self.delta_retention:
+                return None
+            # Loggen är sorterad på version, läs bakifrån tills ändringarna är äldre än since
+            recent = []
+            for version, device_id in reversed(self._changes):
+                if version <= since:
+                    break
+                recent.append(device_id)
+            changed = list(dict.fromkeys(reversed(recent)))
+            return [
+                self.devices.get(device_id) or {"id": device_id, "@removed": {"reason": "deleted"}}
+                for device_id in changed
+            ]
+
+
+def create_app(standin):
+    app = FastAPI(title="Graph stand-in")
+
+    @app.middleware("http")
+    async def inject_faults(request, call_next):
+        standin.stats["requests"] += 1
+        delay = standin.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if request.url.path.startswith(GRAPH_PREFIX):
+            if not standin.token_valid(request.headers.get("Authorization")):
+                standin.stats["unauthorized"] += 1
+                return _graph_error(401, "InvalidAuthenticationToken", "Access token is missing or expired")
+            fault = standin.fault()
+            if fault is not None:
+                status_code, headers, code = fault
+                return _graph_error(status_code, code, "Injected by stand-in", headers)
+        return await call_next(request)
+
+    @app.post("/{tenant}/oauth2/v2.0/token")
+    async def token(tenant: str, request: Request):
+        form = parse_qs((await request.body()).decode("utf-8"))
+        if form.get("grant_type") != ["client_credentials"]:
+            return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+        return {"token_type": "Bearer", "expires_in": standin.token_lifetime, "access_token": standin.issue_token()}
+
+    def page(request, top, skiptoken, items=None, final=None, query=None):
+        # En sida ur items. nextLink pekar på en sparad markör så att sidorna är stabila
+        # under pagineringen, final (t.ex. deltaLink) läggs på sista sidan. query ger $select.
+        top = max(1, min(top or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+        offset = 0
+        if skiptoken:
+            cursor_id, _, offset = skiptoken.partition(".")
+            cursor = standin.cursor(cursor_id)
+            if cursor is None:
+                return _graph_error(400, "BadRequest", "Invalid or expired $skiptoken")
+            items, final, query = cursor
+            offset = int(offset or 0)
+        else:
+            cursor_id = standin.open_cursor((items, final, query))
+        body = {"value": [
+            item if query is None or "@removed" in item else standin.public(query.project(item))
+            for item in items[offset:offset + top]
+        ]}
+        if offset + top < len(items):
+            body["@odata.nextLink"] = str(request.url.include_query_params(**{"$skiptoken": f"{cursor_id}.{offset + top}"}))
+        elif final:
+            body.update(final)
+        return body
+
+    @app.get(GRAPH_PREFIX + "/deviceManagement/managedDevices")
+    async def managed_devices(request: Request):
+        params = request.query_params
+        if params.get("$skiptoken"):
+            return page(request, int(params.get("$top", 0)), params["$skiptoken"])
+        try:
+            query = DeviceQuery.from_params(params)
+        except ValueError as e:
+            return _graph_error(400, "BadRequest", str(e))
+        items = [device for device in standin.devices.values() if query.matches(device)]
+        return page(request, int(params.get("$top", 0)), None, items, query=query)
+
+    @app.get(GRAPH_PREFIX + "/deviceManagement/managedDevices/delta")
+    async def managed_devices_delta(request: Request):
+        params = request.query_params
+        top = int(params.get("$top", 0))
+        if params.get("$skiptoken"):
+            return page(request, top, params["$skiptoken"])
+
+        query = DeviceQuery(params["$select"].split(",")) if params.get("$select") else None
+        deltatoken = params.get("$deltatoken")
+        if deltatoken is None:
+            items = list(standin.devices.values())
+        else:
+            if standin.churn:
+                standin.mutate(standin.churn)
+            items = standin.changed_since(int(deltatoken))
+            if items is None:
+                standin.stats["delta_expired"] += 1
+                return _graph_error(410, "SyncStateNotFound", "The delta token has expired")
+        delta_link = request.url.remove_query_params("$deltatoken").include_query_params(**{"$deltatoken": standin.version})
+        return page(request, top, None, items, {"@odata.deltaLink": str(delta_link)}, query)
+
+    @app.get(GRAPH_PREFIX + "/deviceManagement/managedDevices/{device_id}")
+    async def managed_device(device_id: str):
+        device = standin.devices.get(device_id)
+        if device is None:
+            return _graph_error(404, "ResourceNotFound", f"Device {device_id} not found")
+        return standin.public(device)
+
+    @app.post(GRAPH_PREFIX + "/$batch")
+    async def batch(request: Request):
+        requests = (await request.json()).get("requests", [])
+        if len(requests) > MAX_BATCH_REQUESTS:
+            return _graph_error(400, "BadRequest", f"A batch can contain at most {MAX_BATCH_REQUESTS} requests")
+        responses = []
+        for sub in requests:
+            standin.stats["batch_requests"] += 1
+            # Throttling och fel slås ut per delanrop, precis som i Graph
+            fault = standin.fault()
+            if fault is not None:
+                status_code, headers, code = fault
+                body = {"error": {"code": code, "message": "Injected by stand-in"}}
+            elif sub.get("method", "GET").upper() != "GET":
+                status_code, headers, body = 405, None, {"error": {"code": "BadRequest", "message": "Only GET is supported"}}
+            else:
+                status_code, body = standin.resolve(sub.get("url", ""))
+                headers = None
+            responses.append({"id": sub.get("id"), "status": status_code, "headers": headers or {}, "body": body})
+        return {"responses": responses}
+
+    @app.get(GRAPH_PREFIX + "/deviceManagement/managedDevices/{device_id}/detectedApps")
+    async def device_detected_apps(device_id: str, request: Request):
+        device = standin.devices.get(device_id)
+        if device is None:
+            return _graph_error(404, "ResourceNotFound", f"Device {device_id} not found")
+        params = request.query_params
+        if params.get("$skiptoken"):
+            return page(request, int(params.get("$top", 0)), params["$skiptoken"])
+        return page(request, int(params.get("$top", 0)), None, device.get("installedApplications", []))
+
+    @app.get(GRAPH_PREFIX + "/deviceManagement/detectedApps")
+    async def detected_apps(request: Request):
+        params = request.query_params
+        if params.get("$skiptoken"):
+            return page(request, int(params.get("$top", 0)), params["$skiptoken"])
+        apps = {}
+        for device in list(standin.devices.values()):
+            for app in device.get("installedApplications", []):
+                key = (app["id"], app.get("version"))
+                if key not in apps:
+                    apps[key] = {
+                        "id": f"{app['id']}-{app.get('version')}",
+                        "displayName": app.get("displayName"),
+                        "version": app.get("version"),
+                        "publisher": app.get("publisher"),
+                        "deviceCount": 0,
+                    }
+                apps[key]["deviceCount"] += 1
+        return page(request, int(params.get("$top", 0)), None, list(apps.values()))
+
+    @app.get("/_standin/config")
+    async def get_config():
+        return standin.config()
+
+    @app.post("/_standin/config")
+    async def set_config(request: Request):
+        return standin.update_config(await request.json())
+
+    @app.post("/_standin/mutate")
+    async def mutate(count: int = 100):
+        return {"version": standin.mutate(count)}
+
+    @app.get("/_standin/stats")
+    async def stats():
+        return dict(standin.stats, version=standin.version, devices=len(standin.devices))
+
+    return app
+
+
+def build_standin(num_devices=1000, fleet_path=None, seed=0, **options):
+    # Flottan läses från en fil från fleet_generator eller genereras direkt
+    if fleet_path:
+        devices = [device for chunk in iter_fleet_file(fleet_path) for device in chunk]
+    else:
+        devices = generate_fleet(num_devices, seed=seed)
+    return GraphStandIn(devices, seed=seed, **options)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Lokal ersättare för Graph-API:t för offline-benchmarks")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--fleet", help="JSON Lines-fil från src.utils.fleet_generator")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--churn", type=int, default=0, help="enheter som ändras inför varje delta-anrop")
+    parser.add_argument("--detached-apps", action="store_true", help="managedDevices utan appar, som riktiga Graph")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    standin = build_standin(
+        args.devices, args.fleet, args.seed,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, failure_rate=args.failure_rate, churn=args.churn,
+        detached_apps=args.detached_apps,
+    )
+    print(f"Serving {len(standin.devices)} devices. Point the API at it with:")
+    print(f"  TOKEN_URL=http://{args.host}:{args.port}/standin/oauth2/v2.0/token")
+    print(f"  GRAPH_URL=http://{args.host}:{args.port}{GRAPH_PREFIX} DEMO_MODE=false")
+    uvicorn.run(create_app(standin), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    device_name TEXT,
+    user_display_name TEXT,
+    department TEXT,
+    operating_system TEXT,
+    os_version TEXT,
+    compliance_state TEXT,
+    last_sync TEXT,
+    data TEXT NOT NULL
+);
+-- Frågorna går mot FleetFrame i minnet, tabellerna läses bara vid varmstart
+DROP INDEX IF EXISTS idx_devices_compliance;
+DROP INDEX IF EXISTS idx_devices_department;
+
+CREATE TABLE IF NOT EXISTS apps (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    display_name TEXT,
+    publisher TEXT,
+    short_version TEXT,
+    application_key TEXT,
+    added_date TEXT,
+    entra_groups TEXT
+);
+DROP INDEX IF EXISTS idx_apps_name_lower;
+
+CREATE TABLE IF NOT EXISTS device_apps (
+    device_id TEXT NOT NULL,
+    app_id TEXT NOT NULL,
+    install_state TEXT,
+    version TEXT,
+    PRIMARY KEY (device_id, app_id)
+) WITHOUT ROWID;
+DROP INDEX IF EXISTS idx_device_apps_app;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+DEVICE_COLUMNS = {
+    "device_name": "deviceName",
+    "user_display_name": "userDisplayName",
+    "department": "department",
+    "operating_system": "operatingSystem",
+    "os_version": "osVersion",
+    "compliance_state": "complianceState",
+    "last_sync": "lastSyncDateTime",
+}
+
+
+class InventoryStore:
+    """SQLite-lagring av inventariet så att en omstart kan fortsätta med delta-synk.
+
+    Enheter, appkatalog och installationsstatus per enhet normaliseras i
+    separata tabeller. Skrivningar görs i batchar inom transaktioner och
+    kan kopplas direkt till InventorySync via apply_changes. Sökning och
+    statistik görs mot FleetFrame, här läses bara hela inventariet vid start.
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = str(path)
+        self.batch_size = batch_size
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Skrivning ---
+
+    def apply_changes(self, snapshot, changes):
+        # Lyssnare för InventorySync.subscribe
+        with self._lock, self._conn:
+            if changes.full:
+                self._conn.execute("DELETE FROM device_apps")
+                self._conn.execute("DELETE FROM devices")
+            else:
+                self._delete_devices(changes.removed)
+            self._upsert_devices(changes.upserted.values())
+            self._set_meta({
+                "version": str(snapshot.version),
+                "last_sync": snapshot.last_sync.isoformat() if snapshot.last_sync else "",
+                "delta_link": changes.delta_link or "",
+                "lineage": snapshot.lineage,
+            })
+
+    def _upsert_devices(self, devices):
+        device_rows, app_rows, install_rows, device_ids = [], {}, [], []
+        for device in devices:
+            device_ids.append(device["id"])
+            device_rows.append(self._device_row(device))
+            for app in device.get("installedApplications", []):
+                app_rows[app["id"]] = self._app_row(app)
+                install_rows.append((device["id"], app["id"], app.get("installState"), app.get("version")))
+            if len(device_rows) >= self.batch_size:
+                self._write_batch(device_ids, device_rows, app_rows, install_rows)
+                device_rows, app_rows, install_rows, device_ids = [], {}, [], []
+        if device_rows:
+            self._write_batch(device_ids, device_rows, app_rows, install_rows)
+
+    def _write_batch(self, device_ids, device_rows, app_rows, install_rows):
+        self._conn.executemany(
+            "DELETE FROM device_apps WHERE device_id = ?", ((device_id,) for device_id in device_ids)
+        )
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO devices (id, {', '.join(DEVICE_COLUMNS)}, data) "
+            f"VALUES ({', '.join('?' * (len(DEVICE_COLUMNS) + 2))})",
+            device_rows,
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO apps (id, name, display_name, publisher, short_version, "
+            "application_key, added_date, entra_groups) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            app_rows.values(),
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO device_apps (device_id, app_id, install_state, version) VALUES (?, ?, ?, ?)",
+            install_rows,
+        )
+
+    def _delete_devices(self, device_ids):
+        rows = [(device_id,) for device_id in device_ids]
+        self._conn.executemany("DELETE FROM device_apps WHERE device_id = ?", rows)
+        self._conn.executemany("DELETE FROM devices WHERE id = ?", rows)
+
+    def _set_meta(self, values):
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", values.items())
+
+    @staticmethod
+    def _device_row(device):
+        # Apparna sparas i egna tabeller, inte i enhetens JSON
+        data = {k: v for k, v in device.items() if k != "installedApplications"}
+        return (device["id"], *(device.get(key) for key in DEVICE_COLUMNS.values()), json.dumps(data))
+
+    @staticmethod
+    def _app_row(app):
+        return (
+            app["id"], app.get("name") or app.get("displayName") or "", app.get("displayName"), app.get("publisher"),
+            app.get("shortVersion"), app.get("applicationKey"), app.get("addedDate"),
+            json.dumps(app.get("entraGroups", [])),
+        )
+
+    # --- Läsning ---
+
+    def load_state(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM meta").fetchall()
+        meta = {row["key"]: row["value"] for row in rows}
+        last_sync = meta.get("last_sync")
+        return {
+            "version": int(meta.get("version") or 0),
+            "last_sync": datetime.fromisoformat(last_sync) if last_sync else None,
+            "delta_link": meta.get("delta_link") or None,
+            "lineage": meta.get("lineage"),
+        }
+
+    def load_devices(self):
+        with self._lock:
+            device_ids = [row["id"] for row in self._conn.execute("SELECT id FROM devices")]
+        return {device["id"]: device for device in self._hydrate(device_ids)}
+
+    def _hydrate(self, device_ids):
+        devices = []
+        with self._lock:
+            for start in range(0, len(device_ids), self.batch_size):
+                chunk = device_ids[start:start + self.batch_size]
+                placeholders = ", ".join("?" * len(chunk))
+                by_id = {}
+                for row in self._conn.execute(f"SELECT id, data FROM devices WHERE id IN ({placeholders})", chunk):
+                    device = json.loads(row["data"])
+                    device["installedApplications"] = []
+                    by_id[row["id"]] = device
+                for row in self._conn.execute(
+                    f"SELECT da.device_id, da.install_state, da.version, a.* FROM device_apps da "
+                    f"JOIN apps a ON a.id = da.app_id WHERE da.device_id IN ({placeholders})",
+                    chunk,
+                ):
+                    by_id[row["device_id"]]["installedApplications"].append(self._app_from_row(row))
+                devices.extend(by_id[device_id] for device_id in chunk if device_id in by_id)
+        return devices
+
+    @staticmethod
+    def _app_from_row(row):
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "displayName": row["display_name"],
+            "version": row["version"],
+            "publisher": row["publisher"],
+            "shortVersion": row["short_version"],
+            "installState": row["install_state"],
+            "applicationKey": row["application_key"],
+            "addedDate": row["added_date"],
+            "entraGroups": json.loads(row["entra_groups"] or "[]"),
+        }
@@ -0,0 +1,233 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_labels (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE (kind, value)
+);
+
+CREATE TABLE IF NOT EXISTS history_samples (
+    resolution INTEGER NOT NULL,
+    app INTEGER NOT NULL,
+    scope INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (resolution, app, scope, bucket, state)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_history_bucket ON history_samples(resolution, bucket);
+"""
+
+# Upplösningar: varje synk, senaste värdet per timme och senaste värdet per dygn
+RAW, HOURLY, DAILY = 0, 1, 2
+RESOLUTIONS = {"raw": RAW, "hourly": HOURLY, "daily": DAILY}
+BUCKET_SECONDS = {RAW: 60, HOURLY: 3600, DAILY: 86400}
+# scope 0 är hela flottan, annars en etikett för avdelning eller OS
+OVERALL = 0
+SCOPES = ("department", "operatingSystem")
+# Hur länge en skrivning väntar på en annan process, t.ex. skanningsimporten, innan "database is locked"
+BUSY_TIMEOUT_MS = 30000
+
+
+def connect(path):
+    # Anslutning till historikdatabasen, delas av RolloutHistory och ScanArchive i samma process
+    path = str(path)
+    if path != ":memory:":
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _epoch(moment):
+    return int((moment - datetime(1970, 1, 1)).total_seconds())
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class RolloutHistory:
+    """Tidsserier med installationsstatus per app, totalt och per avdelning och OS.
+
+    Varje ny inventarieversion lägger till ett mätvärde per (app, grupp,
+    status). Samma värden skrivs samtidigt till tim- och dygnsnivån, där
+    senaste mätningen i intervallet gäller, så nedsamplingen sker redan vid
+    skrivning. Råvärden och timvärden rensas efter raw_hours respektive
+    hourly_days, dygnsvärdena sparas. Appar, grupper och statusar lagras som
+    heltal via history_labels så att raderna blir små och en app över 90
+    dagar läses som ett sammanhängande intervall i primärnyckeln.
+    """
+
+    def __init__(self, path, analytics=None, raw_hours=48, hourly_days=14):
+        self.path = str(path)
+        self.analytics = analytics
+        self.raw_hours = raw_hours
+        self.hourly_days = hourly_days
+        self._conn = connect(self.path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._labels = {
+                (kind, value): label_id
+                for label_id, kind, value in self._conn.execute("SELECT id, kind, value FROM history_labels")
+            }
+        self._names = {label_id: value for (_, value), label_id in self._labels.items()}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def connection(self):
+        # (anslutning, lås) för andra tabeller i samma databas, så att skrivningarna turas om
+        return self._conn, self._lock
+
+    # --- Skrivning ---
+
+    def apply_changes(self, snapshot, changes):
+        # Lyssnare för InventorySync.subscribe, räknar ur FleetFrame för den nya versionen
+        self.record_frame(self.analytics.frame(snapshot))
+
+    def record_frame(self, frame, at=None):
+        counts = [(app, OVERALL, None, state, count) for (app, state), count in frame.install_counts().items()]
+        for scope in SCOPES:
+            counts.extend(
+                (app, scope, value, state, count)
+                for (app, value, state), count in frame.install_counts(scope).items()
+            )
+        self.record(counts, at)
+
+    def record(self, counts, at=None):
+        """Sparar ett mätvärde. counts är (app-ID, grupptyp eller OVERALL, gruppvärde, status, antal)."""
+        at = _epoch(at or _utc_now())
+        with self._lock, self._conn:
+            rows = []
+            for app, scope, value, state, count in counts:
+                if not count:
+                    continue
+                scope_id = OVERALL if scope == OVERALL else self._label(scope, value)
+                rows.append((self._label("app", app), scope_id, self._label("state", state), int(count)))
+
+            for resolution, seconds in BUCKET_SECONDS.items():
+                bucket = at - at % seconds
+                # Ett mätvärde beskriver hela flottan, så ett tidigare värde i samma intervall ersätts helt
+                self._conn.execute(
+                    "DELETE FROM history_samples WHERE resolution = ? AND bucket = ?", (resolution, bucket)
+                )
+                self._conn.executemany(
+                    "INSERT INTO history_samples (resolution, app, scope, bucket, state, count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ((resolution, app, scope, bucket, state, count) for app, scope, state, count in rows),
+                )
+            self._prune(at)
+
+    def _prune(self, now):
+        self._conn.execute(
+            "DELETE FROM history_samples WHERE resolution = ? AND bucket < ?", (RAW, now - self.raw_hours * 3600)
+        )
+        self._conn.execute(
+            "DELETE FROM history_samples WHERE resolution = ? AND bucket < ?",
+            (HOURLY, now - self.hourly_days * 86400),
+        )
+
+    def _label(self, kind, value):
+        value = "" if value is None else str(value)
+        label_id = self._labels.get((kind, value))
+        if label_id is None:
+            label_id = self._conn.execute(
+                "INSERT INTO history_labels (kind, value) VALUES (?, ?)", (kind, value)
+            ).lastrowid
+            self._labels[(kind, value)] = label_id
+            self._names[label_id] = value
+        return label_id
+
+    # --- Läsning ---
+
+    def resolution_for(self, days):
+        # Finaste upplösningen som fortfarande finns kvar för hela perioden
+        if days * 24 <= self.raw_hours:
+            return "raw"
+        if days <= self.hourly_days:
+            return "hourly"
+        return "daily"
+
+    def series(self, app_id, days=90, by=None, resolution=None, now=None):
+        """Installationsstatus för en app över de senaste days dagarna.
+
+        by är None för hela flottan, annars department eller operatingSystem.
+        Tim- och dygnsserier fylls framåt så att intervall utan ny synk
+        visar senaste kända värde.
+        """
+        if by is not None and by not in SCOPES:
+            return {"error": f"Unknown group '{by}', use one of: {', '.join(SCOPES)}"}
+        resolution = resolution or self.resolution_for(days)
+        if resolution not in RESOLUTIONS:
+            return {"error": f"Unknown resolution '{resolution}', use one of: {', '.join(RESOLUTIONS)}"}
+        level = RESOLUTIONS[resolution]
+        end = _epoch(now or _utc_now())
+        since = end - int(days * 86400)
+        since -= since % BUCKET_SECONDS[level]
+        result = {"app_id": app_id, "resolution": resolution, "by": by, "since": _isoformat(since), "series": {}}
+
+        with self._lock:
+            app = self._labels.get(("app", str(app_id)))
+            if app is None:
+                return result
+            if by is None:
+                rows = self._conn.execute(
+                    "SELECT scope, bucket, state, count FROM history_samples "
+                    "WHERE resolution = ? AND app = ? AND scope = ? AND bucket >= ? ORDER BY scope, bucket",
+                    (level, app, OVERALL, since),
+                ).fetchall()
+            else:
+                scopes = [label_id for (kind, _), label_id in self._labels.items() if kind == by]
+                placeholders = ", ".join("?" * len(scopes)) or "NULL"
+                rows = self._conn.execute(
+                    f"SELECT scope, bucket, state, count FROM history_samples "
+                    f"WHERE resolution = ? AND app = ? AND scope IN ({placeholders}) AND bucket >= ? "
+                    f"ORDER BY scope, bucket",
+                    (level, app, *scopes, since),
+                ).fetchall()
+
+        points = {}
+        for scope, bucket, state, count in rows:
+            name = "all" if scope == OVERALL else self._names[scope]
+            points.setdefault(name, {}).setdefault(bucket, {})[self._names[state]] = count
+        for name, buckets in points.items():
+            if level != RAW:
+                buckets = _fill_forward(buckets, BUCKET_SECONDS[level], end)
+            result["series"][name] = [
+                {"time": _isoformat(bucket), "total": sum(counts.values()), "counts": counts}
+                for bucket, counts in sorted(buckets.items())
+            ]
+        return result
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT resolution, COUNT(*), COUNT(DISTINCT bucket) FROM history_samples GROUP BY resolution"
+            ).fetchall()
+        names = {level: name for name, level in RESOLUTIONS.items()}
+        return {names[level]: {"rows": count, "buckets": buckets} for level, count, buckets in rows}
+
+
+def _fill_forward(buckets, seconds, end):
+    # Intervall utan mätvärde får föregående värde, från första mätvärdet fram till end
+    filled = {}
+    bucket, last = min(buckets), None
+    while bucket <= end:
+        last = buckets.get(bucket, last)
+        filled[bucket] = last
+        bucket += seconds
+    return filled
+
+
+def _isoformat(seconds):
+    return (datetime(1970, 1, 1) + timedelta(seconds=seconds)).isoformat()
@@ -0,0 +1,354 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from ..reports.rollout_scan import read_scan
+from .rollout_history import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    sha1 TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    product TEXT,
+    app_id TEXT,
+    name TEXT,
+    package TEXT,
+    entra_group TEXT,
+    created TEXT,
+    tickets TEXT,
+    grand_total INTEGER,
+    error_count INTEGER,
+    comments TEXT,
+    imported_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_app ON scans(app_id);
+
+CREATE TABLE IF NOT EXISTS scan_upgrades (
+    scan_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    app_id TEXT NOT NULL,
+    name TEXT,
+    entra_group TEXT,
+    retired INTEGER NOT NULL,
+    PRIMARY KEY (scan_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_scan_upgrades_app ON scan_upgrades(app_id);
+
+CREATE TABLE IF NOT EXISTS scan_versions (
+    scan_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    release TEXT,
+    version TEXT NOT NULL,
+    devices INTEGER NOT NULL,
+    app_id TEXT,
+    source TEXT NOT NULL,
+    PRIMARY KEY (scan_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_scan_versions_app ON scan_versions(app_id);
+
+CREATE TABLE IF NOT EXISTS scan_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    scan_id INTEGER,
+    error TEXT
+);
+"""
+
+SCAN_COLUMNS = (
+    "id", "file_name", "product", "app_id", "name", "package", "entra_group", "created",
+    "tickets", "grand_total", "error_count", "comments", "imported_at",
+)
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScanArchive:
+    """Arkiv över importerade utrullningsskanningar (Documentation/*App Scan*.csv).
+
+    Varje fil läses rad för rad och skrivs i omgångar om batch_size
+    versionsrader, så en hel katalog med gamla skanningar importeras utan att
+    hållas i minnet och en avbruten import fortsätter där den slutade. Filer
+    som redan är importerade känns igen på sökväg, storlek och ändringstid,
+    kopior av samma fil på innehållet (sha1), och läses aldrig om.
+
+    Med history används RolloutHistorys anslutning och lås, så att import
+    och historikskrivning i samma process turas om i stället för att
+    krocka. Andra processer, som importen från kommandoraden, väntar via
+    busy_timeout.
+    """
+
+    def __init__(self, path=None, batch_size=1000, history=None):
+        self.batch_size = batch_size
+        self._owns_connection = history is None
+        if history is not None:
+            self.path = history.path
+            self._conn, self._lock = history.connection()
+        else:
+            self.path = str(path)
+            self._conn = connect(self.path)
+            self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        # En delad anslutning stängs av RolloutHistory
+        if self._owns_connection:
+            with self._lock:
+                self._conn.close()
+
+    # --- Import ---
+
+    def import_directory(self, directory, pattern="*.csv"):
+        # Alla skanningar under katalogen, även i undermappar, äldst först efter filnamn
+        return self.import_paths(sorted(Path(directory).rglob(pattern)))
+
+    def import_paths(self, paths):
+        result = {"imported": 0, "unchanged": 0, "duplicates": 0, "failed": [], "versions": 0}
+        pending, pending_rows, seen = [], 0, set()
+        for path in paths:
+            path = Path(path)
+            try:
+                stat = path.stat()
+            except OSError as e:
+                result["failed"].append({"file": str(path), "error": str(e)})
+                continue
+            entry = {"path": str(path.resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            with self._lock:
+                known = self._conn.execute(
+                    "SELECT size, mtime_ns FROM scan_files WHERE path = ?", (entry["path"],)
+                ).fetchone()
+            if known == (entry["size"], entry["mtime_ns"]):
+                result["unchanged"] += 1
+                continue
+
+            entry["sha1"] = _sha1(path)
+            with self._lock:
+                existing = self._conn.execute("SELECT id FROM scans WHERE sha1 = ?", (entry["sha1"],)).fetchone()
+            if existing or entry["sha1"] in seen:
+                # Samma innehåll under ett annat namn, koppla filen till den redan importerade skanningen
+                pending.append((entry, None))
+                result["duplicates"] += 1
+                continue
+            try:
+                scan = read_scan(path)
+            except (OSError, ValueError, csv.Error) as e:
+                entry["error"] = str(e)
+                pending.append((entry, None))
+                result["failed"].append({"file": str(path), "error": str(e)})
+                continue
+
+            seen.add(entry["sha1"])
+            pending.append((entry, scan))
+            pending_rows += len(scan["versions"]) + 1
+            result["imported"] += 1
+            result["versions"] += len(scan["versions"])
+            if pending_rows >= self.batch_size:
+                self._write(pending)
+                pending, pending_rows = [], 0
+        if pending:
+            self._write(pending)
+        return result
+
+    def _write(self, pending):
+        imported_at = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            upgrades, versions, files = [], [], []
+            for entry, scan in pending:
+                scan_id = None
+                if scan is not None:
+                    scan_id = self._conn.execute(
+                        "INSERT INTO scans (sha1, file_name, product, app_id, name, package, entra_group, created, "
+                        "tickets, grand_total, error_count, comments, imported_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            entry["sha1"], Path(entry["path"]).name, scan["product"], scan["app_id"], scan["name"],
+                            scan["package"], scan["entra_group"], scan["created"], ",".join(scan["tickets"]),
+                            scan["grand_total"], scan["error_count"], "\n\n".join(scan["comments"]), imported_at,
+                        ),
+                    ).lastrowid
+                    upgrades.extend(
+                        (scan_id, position, upgrade["app_id"], upgrade["name"], upgrade["entra_group"], int(upgrade["retired"]))
+                        for position, upgrade in enumerate(scan["upgrades"])
+                    )
+                    versions.extend(
+                        (scan_id, position, row["release"], row["version"], row["devices"], row["app_id"], row["source"])
+                        for position, row in enumerate(scan["versions"])
+                    )
+                elif "error" not in entry:
+                    scan_id = self._conn.execute("SELECT id FROM scans WHERE sha1 = ?", (entry["sha1"],)).fetchone()[0]
+                files.append((entry["path"], entry["size"], entry["mtime_ns"], entry["sha1"], scan_id, entry.get("error")))
+
+            self._conn.executemany(
+                "INSERT INTO scan_upgrades (scan_id, position, app_id, name, entra_group, retired) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                upgrades,
+            )
+            self._conn.executemany(
+                "INSERT INTO scan_versions (scan_id, position, release, version, devices, app_id, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                versions,
+            )
+            # En ändrad fil blir en ny skanning, den gamla ligger kvar som historik
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scan_files (path, size, mtime_ns, sha1, scan_id, error) VALUES (?, ?, ?, ?, ?, ?)",
+                files,
+            )
+
+    # --- Läsning ---
+
+    def scans(self, app_id=None, entra_group=None, product=None):
+        """Importerade skanningar, nyaste först.
+
+        app_id matchar både APPID:t som rullades ut och APPID:n i
+        uppgraderingsblocket. entra_group matchar del av gruppnamnet och
+        product hela namnet, båda skiftlägesokänsliga.
+        """
+        where, params = [], []
+        if app_id:
+            where.append("(app_id = ? OR id IN (SELECT scan_id FROM scan_upgrades WHERE app_id = ?))")
+            params += [str(app_id), str(app_id)]
+        if entra_group:
+            # Skanningar kan ange flera grupper, "All Users, Office Users", så en grupp räcker för träff
+            where.append(
+                "(instr(lower(entra_group), lower(?)) > 0 "
+                "OR id IN (SELECT scan_id FROM scan_upgrades WHERE instr(lower(entra_group), lower(?)) > 0))"
+            )
+            params += [entra_group, entra_group]
+        if product:
+            where.append("product = ? COLLATE NOCASE")
+            params.append(product)
+        query = f"SELECT {', '.join(SCAN_COLUMNS)} FROM scans"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created DESC, id DESC", params).fetchall()
+        return [self._scan_row(row) for row in rows]
+
+    def scan(self, scan_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(SCAN_COLUMNS)} FROM scans WHERE id = ?", (scan_id,)).fetchone()
+            if row is None:
+                return None
+            upgrades = self._conn.execute(
+                "SELECT app_id, name, entra_group, retired FROM scan_upgrades WHERE scan_id = ? ORDER BY position",
+                (scan_id,),
+            ).fetchall()
+            versions = self._conn.execute(
+                "SELECT release, version, devices, app_id, source FROM scan_versions WHERE scan_id = ? ORDER BY position",
+                (scan_id,),
+            ).fetchall()
+        scan = self._scan_row(row)
+        scan["upgrades"] = [
+            {"app_id": app_id, "name": name, "entra_group": group, "retired": bool(retired)}
+            for app_id, name, group, retired in upgrades
+        ]
+        scan["versions"] = [
+            {"release": release, "version": version, "devices": devices, "app_id": app_id, "source": source}
+            for release, version, devices, app_id, source in versions
+        ]
+        return scan
+
+    def _scan_row(self, row):
+        scan = dict(zip(SCAN_COLUMNS, row))
+        scan["tickets"] = scan["tickets"].split(",") if scan["tickets"] else []
+        return scan
+
+    def stats(self):
+        with self._lock:
+            scans, versions = self._conn.execute(
+                "SELECT COUNT(*), (SELECT COUNT(*) FROM scan_versions) FROM scans"
+            ).fetchone()
+            failed = self._conn.execute("SELECT COUNT(*) FROM scan_files WHERE error IS NOT NULL").fetchone()[0]
+        return {"scans": scans, "versions": versions, "failed_files": failed}
+
+
+def compare_scan(scan, distribution):
+    """Ställer en importerad skanning mot versionsfördelningen i Intune just nu.
+
+    Per version antal enheter i skanningen och nu, och per APPID i
+    skanningen (utrullningen och uppgraderingsblocket) hur många enheter
+    som har den versionen APPID:t rullar ut idag.
+    """
+    live_versions = {}
+    for section in (distribution or {}).get("sections", []):
+        for row in section["versions"]:
+            live_versions[row["version"]] = {"release": section["release"], "devices": row["devices"], "source": row["source"]}
+
+    versions, scanned = [], set()
+    for row in scan["versions"]:
+        scanned.add(row["version"])
+        live = live_versions.get(row["version"], {})
+        versions.append({
+            "release": row["release"], "version": row["version"],
+            "scanned": row["devices"], "live": live.get("devices", 0),
+            "delta": live.get("devices", 0) - row["devices"],
+            "scanned_source": row["source"], "live_source": live.get("source"),
+        })
+    for version, live in live_versions.items():
+        if version not in scanned:
+            versions.append({
+                "release": live["release"], "version": version, "scanned": 0, "live": live["devices"],
+                "delta": live["devices"], "scanned_source": None, "live_source": live["source"],
+            })
+
+    live_apps = {app["app_id"]: app for app in (distribution or {}).get("applications", [])}
+    applications = []
+    for role, app_id, group, retired in (
+        [("rollout", scan["app_id"], scan["entra_group"], False)]
+        + [("upgrade", upgrade["app_id"], upgrade["entra_group"], upgrade["retired"]) for upgrade in scan["upgrades"]]
+    ):
+        if not app_id:
+            continue
+        live = live_apps.get(app_id)
+        applications.append({
+            "app_id": app_id, "role": role, "entra_group": group, "retired": retired,
+            "scanned": sum(row["devices"] for row in scan["versions"] if row["app_id"] == app_id),
+            "live": live["devices"] if live else 0,
+            "live_entraGroups": live["entraGroups"] if live else [],
+        })
+
+    live_total = (distribution or {}).get("grand_total", 0)
+    return {
+        "scan_id": scan["id"],
+        "product": scan["product"],
+        "created": scan["created"],
+        "scanned_total": scan["grand_total"],
+        "live_total": live_total,
+        "delta": live_total - (scan["grand_total"] or 0),
+        "applications": applications,
+        "versions": versions,
+    }
+
+
+if __name__ == "__main__":
+    from ..core.config import settings
+
+    parser = argparse.ArgumentParser(description="Importerar utrullningsskanningar (*App Scan*.csv) till historikdatabasen")
+    parser.add_argument("directories", nargs="+", help="Kataloger eller enskilda filer att importera")
+    parser.add_argument("--db", default=settings.HISTORY_DB, help="SQLite-fil (standard: HISTORY_DB)")
+    parser.add_argument("--pattern", default="*.csv", help="Filmönster i katalogerna")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Versionsrader per skrivning")
+    args = parser.parse_args()
+
+    archive = ScanArchive(args.db, batch_size=args.batch_size)
+    for target in args.directories:
+        if os.path.isdir(target):
+            result = archive.import_directory(target, args.pattern)
+        else:
+            result = archive.import_paths([target])
+        print(f"{target}: {json.dumps(result, ensure_ascii=False)}")
+    print(json.dumps(archive.stats()))
+    archive.close()
@@ -0,0 +1,75 @@
+import threading
+import requests
+
+API_URL = "http://localhost:8000"
+# Antal sparade svar, äldsta kastas först
+MAX_CACHED_RESPONSES = 256
+
+_lock = threading.Lock()
+_cache = {}
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"API Error: {status_code}")
+        self.status_code = status_code
+
+
+def get_json(path, params=None):
+    """GET mot API:t som återanvänder förra svaret när servern svarar 304.
+
+    Returnerar (data, headers). Streamlit kör om sidorna vid varje klick,
+    så oförändrade listor laddas varken ner eller tolkas igen.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    with _lock:
+        cached = _cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = requests.get(f"{API_URL}{path}", params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1], cached[2]
+    if response.status_code != 200:
+        raise ApiError(response.status_code)
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        with _lock:
+            _cache.pop(key, None)
+            _cache[key] = (etag, data, response.headers)
+            while len(_cache) > MAX_CACHED_RESPONSES:
+                _cache.pop(next(iter(_cache)))
+    return data, response.headers
+
+
+def get_all_pages(path, params, page_size=2000):
+    # Bläddrar igenom en paginerad lista via X-Next-Cursor
+    items = []
+    params = {**params, "limit": page_size}
+    while True:
+        page, headers = get_json(path, params)
+        if not isinstance(page, list):
+            return page
+        items.extend(page)
+        next_cursor = headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return items
+        params = {**params, "cursor": next_cursor}
+
+
+def get_page(path, params, cursor=None, limit=100):
+    # En sida ur en paginerad lista: (rader, cursor till nästa sida, totalt antal)
+    params = {**params, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    page, headers = get_json(path, params)
+    if not isinstance(page, list):
+        return [], None, 0
+    return page, headers.get("X-Next-Cursor"), int(headers.get("X-Total-Count", len(page)))
+
+
+def get_bytes(path, params=None):
+    # Hela svaret som bytes, för filer som skickas vidare till en nedladdningsknapp
+    response = requests.get(f"{API_URL}{path}", params=params)
+    if response.status_code != 200:
+        raise ApiError(response.status_code)
+    return response.content
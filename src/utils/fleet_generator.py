@@ -0,0 +1,256 @@
+import argparse
+import gzip
+import json
+from datetime import datetime, timedelta
+import numpy as np
+
+INSTALL_STATES = ["Installed", "Failed", "Installing", "Uninstall Failed", "Error"]
+# Samma grundfördelning som mock_data: 70% lyckade, resten fördelat på fel och pågående
+INSTALL_WEIGHTS = [0.7, 0.15, 0.05, 0.05, 0.05]
+
+COMPLIANCE_STATES = ["compliant", "noncompliant", "unknown"]
+DEPARTMENTS = ["IT", "HR", "Sales", "Marketing", "Engineering", "Finance", "Support", "Legal"]
+MODELS = ["Surface Laptop 4", "MacBook Pro 16", "ThinkPad X1", "Dell XPS 13", "HP EliteBook"]
+
+# (osVersion, operatingSystem, osDescription, skuFamily, andel av flottan)
+OPERATING_SYSTEMS = [
+    ("Windows 11", "Windows", "Microsoft Windows 11 Enterprise", "Windows 11 Enterprise", 0.45),
+    ("Windows 10", "Windows", "Microsoft Windows 10 Enterprise", "Windows 10 Enterprise", 0.35),
+    ("macOS 13", "macOS", "macOS Ventura", "macOS Enterprise", 0.12),
+    ("macOS 12", "macOS", "macOS Monterey", "macOS Enterprise", 0.08),
+]
+
+# (produkt, utgivare, applicationKey, grupper, major, minor) som katalogen byggs av.
+# Större kataloger får fler releaser av samma produkter, som Citrix Workspace 2203/2402/2409.
+PRODUCTS = [
+    ("Microsoft 365 Apps for Enterprise", "Microsoft Corporation", "O365ProPlus", ["All Users", "Office Users"], 16, 0),
+    ("Microsoft Teams", "Microsoft Corporation", "MSTeams", ["All Users", "Teams Users"], 1, 6),
+    ("Adobe Acrobat Reader DC", "Adobe Inc.", "AdobeReader", ["All Users", "Office Users"], 23, 3),
+    ("Adobe Creative Cloud", "Adobe Inc.", "CreativeCloud", ["Creative Workers"], 5, 9),
+    ("Google Chrome", "Google LLC", "Chrome", ["All Users"], 114, 0),
+    ("Mozilla Firefox", "Mozilla Corporation", "Firefox", ["All Users"], 115, 0),
+    ("Zoom Client for Meetings", "Zoom Video Communications, Inc.", "ZoomClient", ["Zoom Users"], 5, 15),
+    ("Slack", "Slack Technologies, Inc.", "Slack", ["Slack Users"], 4, 33),
+    ("Citrix Workspace", "Citrix Systems, Inc.", "CitrixWorkspace", ["Citrix Users"], 24, 2),
+    ("7-Zip", "Igor Pavlov", "7Zip", ["All Users"], 23, 1),
+    ("Notepad++", "Notepad++ Team", "NotepadPlusPlus", ["Developers"], 8, 5),
+    ("Visual Studio Code", "Microsoft Corporation", "VSCode", ["Developers"], 1, 80),
+    ("Cisco AnyConnect", "Cisco Systems, Inc.", "AnyConnect", ["All Users", "VPN Users"], 4, 10),
+    ("VLC media player", "VideoLAN", "VLC", ["All Users"], 3, 0),
+    ("Python", "Python Software Foundation", "Python", ["Developers"], 3, 11),
+    ("Java Runtime Environment", "Oracle Corporation", "JRE", ["All Users"], 8, 0),
+]
+
+# Andel installationer per version: målversionen, föregående release och manuella installationer
+VERSION_SPREAD = [0.9, 0.07, 0.03]
+# Spridning (sigma för lognormal) på felstatusarna mellan avdelningar, 0 ger samma fördelning överallt
+DEPARTMENT_SKEW = 0.5
+
+
+def _distribution(name, weights, size):
+    # Vikterna normeras, fel antal eller negativa vikter ger ValueError
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (size,) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError(f"{name} must be {size} non-negative weights")
+    return weights / weights.sum()
+
+
+def generate_app_catalog(num_apps=50, seed=0, now=None, version_spread=VERSION_SPREAD):
+    """Skapar num_apps appar med metadata, popularitet och versioner.
+
+    Varje app har en målversion (den som rullas ut via APPID), en äldre
+    release och ett antal manuellt installerade byggen runt omkring.
+    version_spread är andelen installationer av de tre och sparas per app.
+    """
+    version_spread = _distribution("version_spread", version_spread, 3).tolist()
+    rng = np.random.default_rng([seed, 0])
+    now = now or datetime.now()
+    catalog = []
+    for i in range(num_apps):
+        name, publisher, key, groups, major, minor = PRODUCTS[i % len(PRODUCTS)]
+        release = i // len(PRODUCTS)
+        major += release
+        build = int(rng.integers(1000, 9000))
+        version = f"{major}.{minor}.{build}.{int(rng.integers(1, 999))}"
+        display_name = f"{name} {major}.{minor}" if release else name
+        catalog.append({
+            "meta": {
+                "id": str(17000 + i),
+                "name": display_name,
+                "displayName": display_name,
+                "publisher": publisher,
+                "shortVersion": f"{major}.{minor}",
+                "applicationKey": f"{key}{major}" if release else key,
+                "addedDate": (now - timedelta(days=int(rng.integers(1, 365)))).isoformat(),
+                "entraGroups": list(groups),
+            },
+            "version": version,
+            "previous_version": f"{major - 1}.{minor}.{int(rng.integers(1000, 9000))}.{int(rng.integers(1, 999))}",
+            "manual_versions": [
+                f"{major}.{minor}.{build + int(rng.integers(-500, 500))}.{int(rng.integers(1, 99))}"
+                for _ in range(int(rng.integers(1, 5)))
+            ],
+            "version_spread": version_spread,
+            # "All Users"-appar finns på nästan alla enheter, övriga på en mindre del
+            "popularity": float(rng.beta(8, 1) if "All Users" in groups else rng.beta(1.5, 5)),
+        })
+    return catalog
+
+
+def _state_probabilities(rng, num_apps, install_weights, department_skew, concentration=50.0):
+    # Per app: en Dirichlet-dragning runt grundfördelningen, per avdelning: en faktor på felstatusarna
+    per_app = rng.dirichlet(install_weights * concentration, size=num_apps)
+    department_factor = rng.lognormal(0.0, department_skew, size=len(DEPARTMENTS))
+    probabilities = np.repeat(per_app[:, None, :], len(DEPARTMENTS), axis=1)
+    probabilities[:, :, 1:] *= department_factor[None, :, None]
+    probabilities /= probabilities.sum(axis=2, keepdims=True)
+    return probabilities.cumsum(axis=2)
+
+
+def _draw(rng, cumulative, size):
+    # Vektoriserad dragning ur en kumulativ fördelning
+    return np.searchsorted(cumulative, rng.random(size), side="right").clip(0, len(cumulative) - 1)
+
+
+def iter_fleet_chunks(num_devices, num_apps=50, seed=0, chunk_size=10000, now=None, catalog=None,
+                      install_weights=INSTALL_WEIGHTS, version_spread=VERSION_SPREAD, department_skew=DEPARTMENT_SKEW):
+    """Genererar en syntetisk flotta som listor med Graph-lika enhetsdictar.
+
+    Samma seed, chunk_size, now och fördelningar ger alltid samma flotta.
+    install_weights är grundfördelningen över INSTALL_STATES, version_spread
+    används när katalogen skapas här (en given katalog har sin egen) och
+    department_skew styr hur mycket felstatusarna skiljer mellan avdelningar.
+    Slumpdragningarna görs med numpy för en hel chunk i taget, bara dictarna
+    byggs per enhet.
+    """
+    install_weights = _distribution("install_weights", install_weights, len(INSTALL_STATES))
+    if department_skew < 0:
+        raise ValueError("department_skew must be non-negative")
+    now = now or datetime.now()
+    catalog = catalog or generate_app_catalog(num_apps, seed, now, version_spread)
+    num_apps = len(catalog)
+    rng = np.random.default_rng([seed, 1])
+    state_cumulative = _state_probabilities(rng, num_apps, install_weights, department_skew)
+    popularity = np.array([app["popularity"] for app in catalog])
+    os_cumulative = np.cumsum([os_info[-1] for os_info in OPERATING_SYSTEMS])
+    version_cumulative = np.cumsum([app["version_spread"] for app in catalog], axis=1)
+
+    for start in range(0, num_devices, chunk_size):
+        count = min(chunk_size, num_devices - start)
+        chunk_rng = np.random.default_rng([seed, 2, start])
+
+        department = chunk_rng.integers(0, len(DEPARTMENTS), count)
+        os_index = _draw(chunk_rng, os_cumulative, count)
+        model = chunk_rng.integers(0, len(MODELS), count)
+        serial = chunk_rng.integers(100000, 999999, count)
+
+        # Synkförskjutning: de flesta har synkat senaste dygnet, en svans har inte synkat på veckor
+        hours = chunk_rng.lognormal(1.5, 1.0, count)
+        stale = chunk_rng.random(count) < 0.05
+        hours[stale] = chunk_rng.uniform(24 * 7, 24 * 60, stale.sum())
+        # Enheter som inte synkat på länge är oftare noncompliant eller unknown
+        compliance_p = np.where(hours > 72, 0.35, 0.8)
+        compliance_roll = chunk_rng.random(count)
+        compliance = np.where(compliance_roll < compliance_p, 0, np.where(compliance_roll < compliance_p + (1 - compliance_p) * 0.7, 1, 2))
+
+        installed = chunk_rng.random((count, num_apps)) < popularity[None, :]
+        device_index, app_index = np.nonzero(installed)
+        cumulative = state_cumulative[app_index, department[device_index]]
+        states = (chunk_rng.random(len(app_index))[:, None] > cumulative).sum(axis=1).clip(0, len(INSTALL_STATES) - 1)
+        spread = (chunk_rng.random(len(app_index))[:, None] > version_cumulative[app_index]).sum(axis=1).clip(0, 2)
+        manual_pick = chunk_rng.integers(0, 1 << 16, len(app_index))
+
+        device_apps = [[] for _ in range(count)]
+        for device, app, state, kind, pick in zip(device_index.tolist(), app_index.tolist(), states.tolist(), spread.tolist(), manual_pick.tolist()):
+            entry = catalog[app]
+            if kind == 0:
+                version = entry["version"]
+            elif kind == 1:
+                version = entry["previous_version"]
+            else:
+                version = entry["manual_versions"][pick % len(entry["manual_versions"])]
+            device_apps[device].append({**entry["meta"], "version": version, "installState": INSTALL_STATES[state]})
+
+        devices = []
+        for i in range(count):
+            number = start + i
+            user_id = f"user{number:06d}"
+            os_version, operating_system, os_description, sku_family, _ = OPERATING_SYSTEMS[os_index[i]]
+            devices.append({
+                "id": f"device_{number}",
+                "deviceName": f"DEVICE-{number:06d}",
+                "osVersion": os_version,
+                "lastSyncDateTime": (now - timedelta(hours=float(hours[i]))).isoformat(),
+                "complianceState": COMPLIANCE_STATES[compliance[i]],
+                "managementAgent": "MDM",
+                "operatingSystem": operating_system,
+                "installedApplications": device_apps[i],
+                "userDisplayName": f"User {user_id}",
+                "mailNickname": user_id,
+                "department": DEPARTMENTS[department[i]],
+                "model": MODELS[model[i]],
+                "serialNumber": f"SN{serial[i]}",
+                "skuFamily": sku_family,
+                "platform": operating_system,
+                "osDescription": os_description,
+                "userPrincipalName": f"{user_id}@company.com",
+            })
+        yield devices
+
+
+def generate_fleet(num_devices, **options):
+    # Hela flottan som en lista, för små flottor och tester. options som för iter_fleet_chunks,
+    # t.ex. install_weights, version_spread och department_skew
+    return [device for chunk in iter_fleet_chunks(num_devices, **options) for device in chunk]
+
+
+def write_fleet(path, num_devices, **options):
+    """Skriver flottan som JSON Lines, en enhet per rad, chunk för chunk.
+
+    Slutar sökvägen på .gz komprimeras filen. Returnerar antal skrivna enheter.
+    """
+    if str(path).endswith(".gz"):
+        # Låg komprimeringsnivå, annars blir gzip flaskhalsen för stora flottor
+        f = gzip.open(path, "wt", encoding="utf-8", compresslevel=1)
+    else:
+        f = open(path, "w", encoding="utf-8")
+    written = 0
+    with f:
+        for chunk in iter_fleet_chunks(num_devices, **options):
+            f.write("".join(json.dumps(device) + "\n" for device in chunk))
+            written += len(chunk)
+    return written
+
+
+def iter_fleet_file(path, chunk_size=10000):
+    # Läser tillbaka en fil från write_fleet i chunkar
+    opener = gzip.open if str(path).endswith(".gz") else open
+    chunk = []
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genererar en syntetisk Intune-flotta som JSON Lines")
+    parser.add_argument("path")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--apps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--install-weights", type=float, nargs=len(INSTALL_STATES), default=INSTALL_WEIGHTS,
+                        help=f"Vikter för {', '.join(INSTALL_STATES)}")
+    parser.add_argument("--version-spread", type=float, nargs=3, default=VERSION_SPREAD,
+                        help="Vikter för målversion, föregående release och manuella installationer")
+    parser.add_argument("--department-skew", type=float, default=DEPARTMENT_SKEW)
+    args = parser.parse_args()
+    count = write_fleet(
+        args.path, args.devices, num_apps=args.apps, seed=args.seed, chunk_size=args.chunk_size,
+        install_weights=args.install_weights, version_spread=args.version_spread, department_skew=args.department_skew,
+    )
+    print(f"Wrote {count} devices to {args.path}")
@@ -0,0 +1,31 @@
+import streamlit as st
+from .api_client import get_page
+
+
+def paged_table(key, path, params, to_rows=None, page_size=100):
+    """Visar en paginerad API-lista som tabell med föregående/nästa-knappar.
+
+    Cursorerna för sidorna som visats sparas i session_state under key, så
+    bara den aktuella sidan hämtas. En ny sökning (andra params) börjar om
+    från första sidan. Returnerar raderna på sidan.
+    """
+    state = st.session_state.setdefault(key, {"params": None, "cursors": [None]})
+    if state["params"] != params:
+        state["params"], state["cursors"] = dict(params), [None]
+
+    items, next_cursor, total = get_page(path, params, state["cursors"][-1], page_size)
+    rows = to_rows(items) if to_rows else items
+    st.dataframe(rows)
+
+    # Knapparnas callbacks körs före nästa omkörning, så sidan byts direkt
+    page = len(state["cursors"])
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if page > 1:
+            st.button("Previous page", key=f"{key}_prev", on_click=state["cursors"].pop)
+    with col_info:
+        st.caption(f"Page {page} of {max(1, -(-total // page_size))} ({total} devices)")
+    with col_next:
+        if next_cursor:
+            st.button("Next page", key=f"{key}_next", on_click=state["cursors"].append, args=(next_cursor,))
+    return rows
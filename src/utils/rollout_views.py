@@ -0,0 +1,79 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from datetime import datetime
+from .api_client import ApiError, get_bytes, get_json
+
+# session_state-nyckeln för den senast hämtade skanningen
+SCAN_STATE_KEY = "version_scan_csv"
+
+
+def fetch_history(app_id, days=90):
+    # Installationsstatus över tid, sparas av servern vid varje ny inventarieversion
+    try:
+        history, _ = get_json(f"/api/history/applications/{app_id}", {"days": days})
+        return history
+    except ApiError as e:
+        return {"error": str(e)}
+
+
+def rollout_trend(app_id, days=90):
+    # Utrullningen över tid
+    st.subheader("Rollout Trend")
+    history = fetch_history(app_id, days)
+    trend = history.get("series", {}).get("all", [])
+    if not trend:
+        st.info("No rollout history recorded yet")
+        return
+    df_trend = pd.DataFrame([
+        {'Time': point['time'], 'Status': state, 'Devices': count}
+        for point in trend
+        for state, count in point['counts'].items()
+    ])
+    fig_trend = px.line(df_trend, x='Time', y='Devices', color='Status',
+                        title=f'Installation Status, Last {days} Days')
+    st.plotly_chart(fig_trend, use_container_width=True)
+
+
+def _load_scan(key, app_id):
+    # Körs från knappen, bara den senaste skanningen sparas
+    try:
+        st.session_state[SCAN_STATE_KEY] = {key: get_bytes("/api/versions/scan", {"app_id": app_id, "format": "csv"})}
+    except ApiError as e:
+        st.session_state[SCAN_STATE_KEY] = {key: e}
+
+
+def version_scan(app_id):
+    """Versionsfördelningen i samma uppställning som de manuella skanningarna.
+
+    CSV-filen hämtas först när användaren ber om den och sparas per app och
+    inventarieversion (ETag), så omkörningar av sidan hämtar den inte igen.
+    """
+    st.subheader("Version Scan")
+    try:
+        distribution, headers = get_json("/api/versions/distribution", {"app_id": app_id})
+    except ApiError:
+        return
+    if "error" in distribution:
+        return
+    st.dataframe(pd.DataFrame([
+        {'Release': section['release'], 'Version': version['version'],
+         'Device Count': version['devices'], 'APPID': version['source']}
+        for section in distribution['sections']
+        for version in section['versions']
+    ]))
+    st.caption(f"Grand Total: {distribution['grand_total']}")
+
+    key = (app_id, headers.get("ETag"))
+    scan = st.session_state.get(SCAN_STATE_KEY, {}).get(key)
+    if not isinstance(scan, bytes):
+        if scan is not None:
+            st.error(f"Could not fetch version scan: {scan}")
+        st.button("Prepare Version Scan (CSV)", key=f"version_scan_{app_id}", on_click=_load_scan, args=(key, app_id))
+    else:
+        st.download_button(
+            label="Download Version Scan (CSV)",
+            data=scan,
+            file_name=f"{distribution['product'].replace(' ', '')} App Scan_{datetime.now().strftime('%Y-%m-%d')}.csv",
+            mime="text/csv"
+        )
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Testerna importerar src.* från repots rot, som när appen startas med uvicorn main:app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,48 @@
+import threading
+import time
+from src.core.auth import TokenProvider
+
+
+class CountingProvider(TokenProvider):
+    """TokenProvider utan nätverk, räknar anropen mot token-endpointen."""
+
+    def __init__(self, expires_in=3600, delay=0.0, **kwargs):
+        super().__init__(token_url="http://token", client_id="id", client_secret="secret", scope="scope", **kwargs)
+        self.expires_in = expires_in
+        self.delay = delay
+        self.fetches = 0
+
+    def _fetch(self):
+        self.fetches += 1
+        time.sleep(self.delay)
+        return f"token-{self.fetches}", self.expires_in
+
+
+def test_concurrent_callers_share_one_fetch():
+    provider = CountingProvider(delay=0.1, refresh_margin=0)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(provider.get_token())) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert provider.fetches == 1
+    assert tokens == ["token-1"] * 10
+
+
+def test_cached_token_is_reused_and_peek_is_not_a_hit():
+    provider = CountingProvider(refresh_margin=0)
+    assert provider.get_token() == provider.get_token() == "token-1"
+    assert provider.peek() == "token-1"
+    stats = provider.stats()
+    assert (stats["hits"], stats["misses"], stats["peeks"]) == (1, 1, 1)
+
+
+def test_invalidate_only_drops_the_rejected_token():
+    provider = CountingProvider(refresh_margin=0)
+    provider.get_token()
+    provider.invalidate("some-older-token")
+    assert provider.get_token() == "token-1"
+    provider.invalidate("token-1")
+    assert provider.get_token() == "token-2"
@@ -0,0 +1,12 @@
+import pandas as pd
+from src.reports.deployment_report import REPORT_COLUMNS, deployment_rows
+
+
+def test_last_check_in_keeps_the_utc_marker():
+    table = pd.DataFrame([{field: None for _, field in REPORT_COLUMNS}] * 2)
+    table["lastSyncDateTime"] = pd.to_datetime(
+        ["2026-10-18T08:15:00Z", None], utc=True
+    ).tz_localize(None)
+
+    column = [title for title, _ in REPORT_COLUMNS].index("Last Check-in")
+    assert [row[column] for row in deployment_rows(table, chunk_size=1)] == ["2026-10-18T08:15:00Z", None]
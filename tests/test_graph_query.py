@@ -0,0 +1,38 @@
+from src.services.graph_query import DeviceQuery, ProjectionCache
+
+
+class RecordingService:
+    """Tjänst utan nätverk, sparar parametrarna som skulle ha skickats till Graph."""
+
+    def __init__(self):
+        self.sent = []
+
+    def query_devices(self, query):
+        self.sent.append(query.params(page_size=100))
+        return [{"id": str(len(self.sent))}]
+
+
+def test_filters_and_top_are_sent_to_graph():
+    service = RecordingService()
+    cache = ProjectionCache(service)
+    cache.get(DeviceQuery(["id", "deviceName"], {"department": "IT", "complianceState": "compliant"}, top=5))
+
+    assert service.sent == [{
+        "$select": "deviceName,id",
+        "$filter": "department eq 'IT' and complianceState eq 'compliant'",
+        "$top": 5,
+    }]
+
+
+def test_each_query_gets_its_own_entry():
+    service = RecordingService()
+    cache = ProjectionCache(service, max_entries=2)
+    it = DeviceQuery(filters={"department": "IT"})
+    hr = DeviceQuery(filters={"department": "HR"})
+
+    assert cache.get(it) == cache.get(it) == [{"id": "1"}]
+    assert cache.get(hr) == [{"id": "2"}]
+    cache.get(DeviceQuery(top=1))
+    # Tre frågor men plats för två, den äldsta (IT) kastas
+    assert cache.get(it) == [{"id": "4"}]
+    assert cache.stats()["projections"] == 2
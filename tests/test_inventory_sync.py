@@ -0,0 +1,66 @@
+from src.services.intune_service import GraphError
+from src.services.inventory_sync import DELTA_EXPIRED_STATUS, InventorySync
+
+
+class FakeService:
+    """Graph-ersättare: full synk ger alla enheter, en utgången deltaLink ger 410."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.calls = []
+        self.expired = False
+
+    def iter_delta_pages(self, delta_link=None, select=None):
+        self.calls.append(delta_link)
+        if delta_link and self.expired:
+            raise GraphError("Delta token expired", status_code=DELTA_EXPIRED_STATUS)
+        if delta_link:
+            yield [], "delta-2"
+            return
+        yield [dict(device, installedApplications=[]) for device in self.devices], "delta-1"
+
+    def attach_detected_apps(self, devices):
+        pass
+
+
+def test_expired_delta_link_falls_back_to_full_sync():
+    service = FakeService([{"id": "a"}, {"id": "b"}])
+    inventory = InventorySync(service)
+    inventory.sync()
+    assert inventory.delta_link == "delta-1"
+
+    service.devices = [{"id": "b"}, {"id": "c"}]
+    service.expired = True
+    changes = []
+    inventory.subscribe(lambda snapshot, change: changes.append(change))
+    snapshot = inventory.sync()
+
+    assert service.calls == [None, "delta-1", None]
+    assert set(snapshot.devices) == {"b", "c"}
+    assert changes[-1].full and changes[-1].removed == {"a"}
+    assert snapshot.version == 2
+
+
+def test_unchanged_delta_keeps_version():
+    service = FakeService([{"id": "a"}])
+    inventory = InventorySync(service)
+    first = inventory.sync()
+    second = inventory.sync()
+    assert service.calls == [None, "delta-1"]
+    assert second.version == first.version
+    assert inventory.delta_link == "delta-2"
+
+
+def test_failing_listener_does_not_starve_the_others(caplog):
+    inventory = InventorySync(FakeService([{"id": "a"}]))
+    seen = []
+
+    def broken(snapshot, changes):
+        raise RuntimeError("boom")
+
+    inventory.subscribe(broken)
+    inventory.subscribe(lambda snapshot, changes: seen.append(changes.version))
+    snapshot = inventory.sync()
+
+    assert seen == [snapshot.version]
+    assert "boom" in caplog.text
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from src.reports.report_catalog import CATALOG_FILE, ReportCatalog, report_key
+
+
+def add_report(catalog, report_id, size):
+    return catalog.add(report_id, f"{report_id}.xlsx", lambda path: path.write_bytes(b"x" * size))
+
+
+def test_report_key_is_stable_and_case_insensitive():
+    assert report_key({"app_name": "Chrome", "app_id": None}, "l-1") == report_key({"app_name": "chrome"}, "l-1")
+    assert report_key({"app_name": "chrome"}, "l-1") != report_key({"app_name": "chrome"}, "l-2")
+
+
+def test_app_ids_differing_in_case_get_different_keys():
+    # AppIndex matchar app_id exakt, ABC och abc kan ge olika rapporter
+    assert report_key({"app_id": "ABC"}, "l-1") != report_key({"app_id": "abc"}, "l-1")
+
+
+def test_oldest_reports_are_evicted_over_max_bytes(tmp_path):
+    catalog = ReportCatalog(tmp_path, max_bytes=250)
+    for report_id in ("first", "second", "third"):
+        add_report(catalog, report_id, 100)
+        time.sleep(0.01)
+
+    assert catalog.lookup("first") is None
+    assert not (tmp_path / "first.xlsx").exists()
+    assert {entry["id"] for entry in catalog.list()} == {"second", "third"}
+
+
+def test_latest_report_is_kept_even_if_too_large(tmp_path):
+    catalog = ReportCatalog(tmp_path, max_bytes=10)
+    add_report(catalog, "big", 100)
+    assert catalog.lookup("big") is not None
+
+
+def test_expired_reports_are_evicted(tmp_path):
+    catalog = ReportCatalog(tmp_path, max_age=3600)
+    add_report(catalog, "old", 10)
+    add_report(catalog, "new", 10)
+    entries = json.loads((tmp_path / CATALOG_FILE).read_text(encoding="utf-8"))
+    for entry in entries:
+        if entry["id"] == "old":
+            entry["created"] = "2000-01-01T00:00:00"
+    (tmp_path / CATALOG_FILE).write_text(json.dumps(entries), encoding="utf-8")
+
+    catalog = ReportCatalog(tmp_path, max_age=3600)
+    assert catalog.evict() == ["old"]
+    assert not (tmp_path / "old.xlsx").exists()
+    assert catalog.lookup("new") is not None
+
+
+def test_report_deleted_outside_catalog_is_forgotten(tmp_path):
+    catalog = ReportCatalog(tmp_path)
+    add_report(catalog, "gone", 10)
+    os.remove(tmp_path / "gone.xlsx")
+    assert catalog.lookup("gone") is None
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+import pytest
+from src.api.responses import decode_cursor, encode_cursor, etag_matches, page_ids
+
+
+def request(if_none_match=None):
+    return SimpleNamespace(headers={"if-none-match": if_none_match} if if_none_match else {})
+
+
+@pytest.mark.parametrize("key", ["device_1", (1700000000.0, "device_2"), (float("-inf"), "x")])
+def test_cursor_round_trip(key):
+    assert decode_cursor(encode_cursor(key)) == key
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "e30", "not base64 at all", encode_cursor("a")[:-2] + "*"])
+def test_tampered_cursor_is_rejected(cursor):
+    keys = ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        page_ids(keys, cursor, limit=1)
+
+
+def test_pages_follow_cursor_to_the_end():
+    keys = [f"device_{i:03d}" for i in range(7)]
+    seen, cursor = [], None
+    while True:
+        page, cursor = page_ids(keys, cursor, limit=3)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert seen == keys
+
+
+def test_cursor_from_another_list_is_rejected():
+    cursor = encode_cursor((1.0, "device_1"))
+    with pytest.raises(ValueError):
+        page_ids(["device_1", "device_2"], cursor)
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"other", W/"abc"', True),
+    ('"other"', False),
+    ("*", True),
+])
+def test_etag_matches_weakly(header, matches):
+    assert etag_matches(request(header), 'W/"abc"') is matches
@@ -0,0 +1,64 @@
+import csv
+import io
+from pathlib import Path
+from src.reports.rollout_scan import iter_scan_csv, parse_scan, read_scan
+
+SAMPLE = Path(__file__).resolve().parent.parent / "Documentation" / "CitrixWorkspace App Scan_2025-02-07.csv"
+
+
+def test_parse_documented_scan():
+    scan = read_scan(SAMPLE)
+
+    assert scan["product"] == "Citrix Workspace"
+    assert scan["app_id"] == "17492"
+    assert scan["package"] == "COM-Citrix-CitrixWorkspaceCU1-x86-2402-MUI"
+    assert scan["entra_group"].endswith("_appid_17492_av")
+    assert scan["created"] == "2025-02-07"
+    assert scan["tickets"] == ["CRQ000000295025", "INC000008758203"]
+    assert scan["upgrades"] == [{
+        "app_id": "16742",
+        "name": "Citrix Workspace 2203",
+        "entra_group": "z_azu_app_com_citrix_citrixworkspace_x86_22.0.3_mui_appid_16742_av_RETIRED",
+        "retired": True,
+    }]
+    assert scan["grand_total"] == 533
+    assert sum(row["devices"] for row in scan["versions"]) == 533
+    assert scan["error_count"] == 11
+    assert len(scan["comments"]) == 1
+
+
+def test_version_rows_keep_section_and_source():
+    versions = {row["version"]: row for row in read_scan(SAMPLE)["versions"]}
+
+    assert versions["24.2.1000.1016"] == {
+        "release": "Citrix Workspace 2402", "version": "24.2.1000.1016",
+        "devices": 514, "app_id": "17492", "source": "APPID:17492",
+    }
+    assert versions["22.3.5000.5107"]["app_id"] == "16742"
+    assert versions["19.12.7000.10"]["app_id"] is None
+    assert versions["19.12.7000.10"]["source"] == "Manual Install"
+
+
+def test_exported_scan_parses_back():
+    distribution = {
+        "product": "Google Chrome",
+        "target": {"app_id": "12349", "name": "Google Chrome", "entraGroups": ["All Users"], "version": "120.0.1"},
+        "applications": [{"app_id": "12349", "name": "Google Chrome", "entraGroups": ["All Users"],
+                          "version": "120.0.1", "devices": 3}],
+        "sections": [{"release": "Google Chrome 120.0", "devices": 4, "versions": [
+            {"version": "120.0.1", "devices": 3, "source": "APPID:12349"},
+            {"version": "120.0.2", "devices": 1, "source": "Manual Install"},
+        ]}],
+        "grand_total": 4,
+    }
+    text = "".join(
+        chunk.decode("utf-8-sig") if isinstance(chunk, bytes) else chunk for chunk in iter_scan_csv(distribution)
+    )
+    scan = parse_scan(csv.reader(io.StringIO(text), delimiter=";"))
+
+    assert scan["app_id"] == "12349"
+    assert scan["entra_group"] == "All Users"
+    assert scan["grand_total"] == 4
+    assert [(row["version"], row["devices"], row["app_id"]) for row in scan["versions"]] == [
+        ("120.0.1", 3, "12349"), ("120.0.2", 1, None),
+    ]
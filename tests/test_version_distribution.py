@@ -0,0 +1,26 @@
+import pytest
+from src.analytics.version_distribution import product_name, release_label, version_key
+
+
+@pytest.mark.parametrize("name, product", [
+    ("Citrix Workspace 2402", "Citrix Workspace"),
+    ("Citrix Workspace 25.2", "Citrix Workspace"),
+    ("Google Chrome 120.0.6099.130", "Google Chrome"),
+    ("Notepad++ v8.6", "Notepad++"),
+    ("Microsoft Office 365", "Microsoft Office 365"),
+    ("Microsoft 365", "Microsoft 365"),
+    ("Office 2019", "Office 2019"),
+    ("7-Zip", "7-Zip"),
+    ("", ""),
+])
+def test_product_name_strips_only_versions(name, product):
+    assert product_name(name) == product
+
+
+def test_release_label_uses_product_format():
+    assert release_label("Citrix Workspace", "24.2.1000.1016") == "Citrix Workspace 2402"
+    assert release_label("Google Chrome", "120.0.6099.130") == "Google Chrome 120.0"
+
+
+def test_version_key_orders_numerically():
+    assert version_key("19.12.1000.1063") > version_key("19.9.0.1")